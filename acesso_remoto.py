@@ -0,0 +1,327 @@
+import http.client
+import json
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from agenda import Agenda
+from operacoes import LEITURA, OPERACOES
+from relatorios import escrever_relatorio
+from repositorio import Cliente, Repositorio
+from tecnicos import EscalaTecnicos
+from veiculos import chave_placa
+
+# Validade das leituras guardadas pelo cliente (s)
+TTL_LEITURA = 2.0
+
+# Limite de espera por uma resposta do servidor (s)
+TEMPO_LIMITE = 30
+
+
+class ErroServidor(Exception):
+    """Erro informado pelo servidor ao executar uma operação"""
+
+    def __init__(self, tipo, mensagem):
+        super().__init__(mensagem)
+        self.tipo = tipo
+
+
+class BackendRemoto:
+    """Mesma interface de BackendLocal, falando com servidor.py por HTTP/JSON
+
+    Leituras repetidas dentro de TTL_LEITURA são respondidas da memória;
+    qualquer gravação feita por esta estação limpa esse cache. Métodos
+    que precisam de várias operações mandam todas em uma só requisição.
+    """
+
+    remoto = True
+    conn = None
+
+    def __init__(self, endereco, ttl=TTL_LEITURA):
+        partes = urlsplit(endereco if '://' in endereco else f"http://{endereco}")
+        self.host = partes.hostname
+        self.porta = partes.port or 80
+        self.ttl = ttl
+        self._http = None
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.repositorio = Repositorio(
+            lambda tabela, ids: self.lote(('ler_registros', (tabela, list(ids))), cache=False)[0],
+            lambda tabela, campos: self._gravar('inserir_registro', tabela, campos),
+            lambda tabela, registro_id, campos: self._gravar('gravar_campos', tabela, registro_id, campos),
+        )
+
+    # Transporte
+
+    def _conexao(self):
+        if self._http is None:
+            self._http = http.client.HTTPConnection(self.host, self.porta, timeout=TEMPO_LIMITE)
+        return self._http
+
+    def _enviar(self, chamadas):
+        """Mandar as chamadas ao servidor; retorna a lista de resultados
+
+        Se a conexão mantida aberta caiu, o lote é reenviado uma vez em
+        conexão nova só quando é seguro: lotes de leitura sempre, lotes
+        com gravação só se o pedido nem chegou a ser enviado (depois
+        disso o servidor pode já ter confirmado, e repetir gravaria duas
+        vezes).
+        """
+        corpo = json.dumps({'chamadas': chamadas}).encode('utf-8')
+        cabecalhos = {'Content-Type': 'application/json'}
+        so_leitura = all(OPERACOES.get(nome, (None, None))[1] == LEITURA for nome, _ in chamadas)
+        for tentativa in range(2):
+            enviado = False
+            try:
+                conexao = self._conexao()
+                conexao.request('POST', '/chamar', corpo, cabecalhos)
+                enviado = True
+                resposta = conexao.getresponse()
+                dados = json.loads(resposta.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.fechar()
+                if tentativa or (enviado and not so_leitura):
+                    raise
+        if 'erro' in dados:
+            raise ErroServidor(dados['erro']['tipo'], dados['erro']['mensagem'])
+        return dados['resultados']
+
+    def lote(self, *chamadas, cache=True):
+        """Executar várias operações em uma requisição; retorna os resultados
+
+        Cada chamada é (nome, args). Com `cache`, as já respondidas há
+        menos de TTL_LEITURA não vão ao servidor.
+        """
+        agora = time.monotonic()
+        chaves = [json.dumps([nome, list(args)]) for nome, args in chamadas]
+        resultados = [None] * len(chamadas)
+        faltando = []
+        with self._lock:
+            for i, chave in enumerate(chaves):
+                guardado = self._cache.get(chave) if cache else None
+                if guardado is not None and agora - guardado[0] < self.ttl:
+                    resultados[i] = guardado[1]
+                else:
+                    faltando.append(i)
+        if faltando:
+            respostas = self._enviar([[chamadas[i][0], list(chamadas[i][1])] for i in faltando])
+            with self._lock:
+                for i, resposta in zip(faltando, respostas):
+                    resultados[i] = resposta
+                    if cache:
+                        self._cache[chaves[i]] = (agora, resposta)
+        return resultados
+
+    def _ler(self, nome, *args):
+        return self.lote((nome, args))[0]
+
+    def _gravar(self, nome, *args):
+        with self._lock:
+            self._cache.clear()
+        return self.lote((nome, args), cache=False)[0]
+
+    def limpar_caches(self):
+        with self._lock:
+            self._cache.clear()
+        self.repositorio.limpar()
+
+    def fechar(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    # Dashboard e agenda
+
+    def dados_dashboard(self):
+        resumo, agendamentos = self.lote(('ler_resumo', ()), ('agendamentos_do_dia', ()))
+        return resumo, agendamentos
+
+    def carregar_agenda(self):
+        duracoes, agendamentos = self.lote(('ocupacao_agenda', ()), cache=False)[0]
+        return Agenda.montar(duracoes, agendamentos)
+
+    def agendamentos_por_id(self, ids):
+        return self.lote(('agendamentos_por_id', (list(ids),)), cache=False)[0]
+
+    # Escala dos técnicos
+
+    def carregar_escala(self, inicio, fim):
+        tecnicos, duracoes, linhas = self.lote(('ocupacao_tecnicos', (inicio, fim)), cache=False)[0]
+        return EscalaTecnicos.montar(tecnicos, duracoes, linhas, inicio, fim)
+
+    def escala_por_id(self, agendamento_ids, ordem_ids):
+        return self.lote(('escala_por_id', (list(agendamento_ids), list(ordem_ids))), cache=False)[0]
+
+    def atribuir_tecnicos(self, atribuicoes):
+        return self._gravar('atribuir_tecnicos', [list(atribuicao) for atribuicao in atribuicoes])
+
+    # Registro de alterações (nunca do cache: é o que invalida o cache)
+
+    def ultima_sequencia(self):
+        return self.lote(('ultima_sequencia', ()), cache=False)[0]
+
+    def alteracoes_desde(self, seq, limite):
+        eventos = self.lote(('alteracoes_desde', (seq, limite)), cache=False)[0]
+        if eventos:
+            # Alterações de outras estações tornam as leituras guardadas suspeitas
+            with self._lock:
+                self._cache.clear()
+        self.repositorio.aplicar_alteracoes(eventos if eventos is None or len(eventos) < limite else None)
+        return eventos
+
+    # Lista de clientes (interface de paginador da ListaVirtual)
+
+    def primeira_pagina(self, limite):
+        return self.repositorio.incorporar(Cliente, self._ler('clientes_primeira_pagina', limite))
+
+    def apos(self, nome, cliente_id, limite):
+        return self.repositorio.incorporar(Cliente, self._ler('clientes_apos', nome, cliente_id, limite))
+
+    def antes(self, nome, cliente_id, limite):
+        return self.repositorio.incorporar(Cliente, self._ler('clientes_antes', nome, cliente_id, limite))
+
+    def linha(self, cliente_id):
+        row = self._ler('cliente_linha', cliente_id)
+        return self.repositorio.incorporar(Cliente, [row])[0] if row is not None else None
+
+    # Clientes
+
+    def pesquisar_clientes(self, termo, apos=None):
+        linhas, ha_mais = self._ler('pesquisar_clientes', termo, list(apos) if apos else None)
+        return self.repositorio.incorporar(Cliente, linhas), ha_mais
+
+    def invalidar_busca(self):
+        with self._lock:
+            self._cache.clear()
+
+    def ler_cliente(self, cliente_id):
+        return self.repositorio.obter_um(Cliente, cliente_id)
+
+    def salvar_cliente(self, cliente, dados):
+        return self.repositorio.salvar(cliente, dados)
+
+    def apagar_cliente(self, cliente_id):
+        self._gravar('apagar_cliente', cliente_id)
+        self.repositorio.esquecer(Cliente, cliente_id)
+
+    # Clientes duplicados
+
+    def procurar_duplicados(self):
+        return [(pontuacao, tuple(a), tuple(b)) for pontuacao, a, b in self.lote(('procurar_duplicados', ()), cache=False)[0]]
+
+    def possiveis_duplicados(self, nome, telefone, email, ignorar_id=None):
+        sugestoes = self.lote(('possiveis_duplicados', (nome, telefone, email, ignorar_id)), cache=False)[0]
+        return [(pontuacao, tuple(cliente)) for pontuacao, cliente in sugestoes]
+
+    def mesclar_clientes(self, manter_id, remover_ids):
+        resultado = tuple(self._gravar('mesclar_clientes', manter_id, list(remover_ids)))
+        for cliente_id in [manter_id, *remover_ids]:
+            self.repositorio.esquecer(Cliente, cliente_id)
+        return resultado
+
+    def marcar_distintos(self, cliente_a, cliente_b):
+        return self._gravar('marcar_distintos', cliente_a, cliente_b)
+
+    # Serviços e agendamentos
+
+    def listar_servicos(self):
+        return self._ler('listar_servicos')
+
+    def gravar_agendamento(self, dados):
+        return self._gravar('gravar_agendamento', list(dados))
+
+    # Veículos
+
+    def ficha_em_cache(self, placa):
+        guardado = self._cache.get(('ficha', chave_placa(placa)))
+        if guardado is not None and time.monotonic() - guardado[0] < self.ttl:
+            return guardado[1]
+        return None
+
+    def ficha_veiculo(self, placa):
+        ficha = self.lote(('ficha_veiculo', (placa,)), cache=False)[0]
+        if ficha is not None:
+            with self._lock:
+                self._cache[('ficha', chave_placa(placa))] = (time.monotonic(), ficha)
+        return ficha
+
+    def historico_veiculo(self, veiculo_id, antes=None):
+        return self._ler('historico_veiculo', veiculo_id, list(antes) if antes else None)
+
+    def historico_arquivado(self, veiculo_id, antes=None):
+        return self._ler('historico_arquivado', veiculo_id, list(antes) if antes else None)
+
+    def gravar_veiculo(self, veiculo_id, dados):
+        return self._gravar('gravar_veiculo', veiculo_id, list(dados))
+
+    def salvar_veiculo(self, veiculo, dados):
+        return self.repositorio.salvar(veiculo, dados)
+
+    # Ordens de serviço e estoque de peças
+
+    def abrir_ordem(self, agendamento_id, tecnico=None, dia=None):
+        return self._gravar('abrir_ordem', agendamento_id, tecnico, dia)
+
+    def adicionar_mao_de_obra(self, ordem_id, descricao, horas, valor_hora):
+        return self._gravar('adicionar_mao_de_obra', ordem_id, descricao, horas, valor_hora)
+
+    def adicionar_peca(self, ordem_id, peca_id, quantidade=1, preco=None):
+        return self._gravar('adicionar_peca', ordem_id, peca_id, quantidade, preco)
+
+    def alterar_quantidade(self, item_id, quantidade):
+        return self._gravar('alterar_quantidade', item_id, quantidade)
+
+    def remover_item(self, item_id):
+        return self._gravar('remover_item', item_id)
+
+    def concluir_ordem(self, ordem_id, dia=None):
+        return self._gravar('concluir_ordem', ordem_id, dia)
+
+    def fechar_dia(self, dia=None):
+        return self._gravar('fechar_dia', dia)
+
+    def ler_ordem(self, ordem_id):
+        ordem, itens = self.lote(('ler_ordem', (ordem_id,)), cache=False)[0]
+        return (tuple(ordem) if ordem is not None else None), [tuple(item) for item in itens]
+
+    def cadastrar_peca(self, codigo, descricao, preco, estoque=0, estoque_minimo=0):
+        return self._gravar('cadastrar_peca', codigo, descricao, preco, estoque, estoque_minimo)
+
+    def repor_estoque(self, peca_id, quantidade):
+        return self._gravar('repor_estoque', peca_id, quantidade)
+
+    def pecas_em_falta(self):
+        return [tuple(peca) for peca in self.lote(('pecas_em_falta', ()), cache=False)[0]]
+
+    # Relatórios
+
+    def relatorio_tela(self, tipo):
+        return self.lote(('relatorio_tela', (tipo,)), cache=False)[0]
+
+    def exportar_relatorio(self, tipo, caminho):
+        self.lote(('atualizar_agregados', ()), cache=False)
+        return escrever_relatorio(tipo, self._linhas_relatorio(tipo), caminho)
+
+    def _linhas_relatorio(self, tipo):
+        """Linhas do relatório gravadas à medida que chegam do servidor
+
+        GET /relatorio/<tipo> responde uma linha JSON por linha do
+        relatório, de uma só consulta no servidor. Usa conexão própria
+        para não prender a das demais chamadas durante a exportação.
+        """
+        conexao = http.client.HTTPConnection(self.host, self.porta, timeout=TEMPO_LIMITE)
+        try:
+            conexao.request('GET', f'/relatorio/{quote(tipo)}')
+            resposta = conexao.getresponse()
+            if resposta.status != 200:
+                erro = json.loads(resposta.read())['erro']
+                raise ErroServidor(erro['tipo'], erro['mensagem'])
+            for linha in resposta:
+                registro = json.loads(linha)
+                # Falha no meio da resposta vem como objeto de erro no lugar da linha
+                if isinstance(registro, dict):
+                    raise ErroServidor(registro['erro']['tipo'], registro['erro']['mensagem'])
+                yield registro
+        finally:
+            conexao.close()
@@ -0,0 +1,254 @@
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+from config import (DIAS_FUNCIONAMENTO, HORARIO_ABERTURA, HORARIO_FECHAMENTO,
+                    INTERVALO_AGENDA_MIN, NUMERO_BOXES)
+
+STATUS_AGENDADO = 'Agendado'
+STATUS_NAO_COMPARECEU = 'Não Compareceu'
+
+# Agendamentos com estes status não ocupam horário
+STATUS_LIVRES = ('Cancelado', STATUS_NAO_COMPARECEU)
+
+# Duração usada quando o serviço não informa tempo_estimado
+DURACAO_PADRAO_MIN = 60
+
+
+class ConflitoAgendamento(ValueError):
+    """Horário indisponível para o agendamento"""
+
+
+def para_minutos(horario):
+    """'HH:MM' (ou 'HH:MM:SS') em minutos desde a meia-noite"""
+    horas, minutos = horario.split(':')[:2]
+    return int(horas) * 60 + int(minutos)
+
+
+def para_horario(minutos):
+    """Minutos desde a meia-noite em 'HH:MM'"""
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def ocupacao(conn, a_partir=None):
+    """Durações dos serviços e agendamentos que ocupam horário a partir de uma data"""
+    duracoes = conn.execute("SELECT id, tempo_estimado FROM servicos").fetchall()
+    return duracoes, agendamentos_ocupados(conn, a_partir)
+
+
+def agendamentos_ocupados(conn, a_partir=None):
+    """(id, data, horario, servico_id) dos agendamentos que ocupam horário a partir de uma data"""
+    a_partir = a_partir or date.today().isoformat()
+    cursor = conn.cursor()
+    marcadores = ', '.join('?' for _ in STATUS_LIVRES)
+    cursor.execute(f"""
+        SELECT id, data_agendamento, horario, servico_id
+        FROM agendamentos
+        WHERE data_agendamento >= ? AND horario IS NOT NULL
+          AND status NOT IN ({marcadores})
+        ORDER BY data_agendamento, horario
+    """, (a_partir,) + STATUS_LIVRES)
+    return cursor.fetchall()
+
+
+def verificar_horario(conn, data, horario, servico_id, boxes=NUMERO_BOXES):
+    """Levantar ConflitoAgendamento se todos os boxes já estão ocupados no horário
+
+    Confere contra os agendamentos gravados, dentro da unidade de trabalho
+    que grava o novo (executor local ou escritor do servidor): duas
+    estações que reservaram o mesmo horário cada uma na sua agenda, antes
+    de verem a reserva da outra, não conseguem gravar as duas.
+    """
+    cursor = conn.cursor()
+    row = cursor.execute("SELECT tempo_estimado FROM servicos WHERE id = ?", (servico_id,)).fetchone()
+    inicio = para_minutos(horario)
+    fim = inicio + ((row[0] if row else None) or DURACAO_PADRAO_MIN)
+    marcadores = ', '.join('?' for _ in STATUS_LIVRES)
+    cursor.execute(f"""
+        SELECT a.horario, s.tempo_estimado
+        FROM agendamentos a LEFT JOIN servicos s ON s.id = a.servico_id
+        WHERE a.data_agendamento = ? AND a.horario IS NOT NULL AND a.status NOT IN ({marcadores})
+    """, (data,) + STATUS_LIVRES)
+
+    # Quantos agendamentos se sobrepõem ao mesmo tempo dentro de [inicio, fim)
+    eventos = []
+    for outro_horario, tempo_estimado in cursor:
+        outro_inicio = para_minutos(outro_horario)
+        outro_fim = outro_inicio + (tempo_estimado or DURACAO_PADRAO_MIN)
+        if outro_inicio < fim and outro_fim > inicio:
+            eventos += [(max(outro_inicio, inicio), 1), (min(outro_fim, fim), -1)]
+    ocupados = 0
+    for _, variacao in sorted(eventos):
+        ocupados += variacao
+        if ocupados >= boxes:
+            raise ConflitoAgendamento(f"Nenhum box livre em {data} às {horario}")
+
+
+class Agenda:
+    """Índice de horários ocupados por dia e por box
+
+    Cada box de cada dia guarda uma lista ordenada de intervalos
+    (inicio, fim, agendamento_id) que nunca se sobrepõem; verificar um
+    conflito é uma busca binária nos vizinhos do novo intervalo.
+    """
+
+    def __init__(self, duracoes=None, boxes=NUMERO_BOXES, abertura=HORARIO_ABERTURA,
+                 fechamento=HORARIO_FECHAMENTO, passo=INTERVALO_AGENDA_MIN,
+                 dias_funcionamento=DIAS_FUNCIONAMENTO):
+        self.duracoes = dict(duracoes or {})
+        self.boxes = boxes
+        self.abertura = para_minutos(abertura)
+        self.fechamento = para_minutos(fechamento)
+        self.passo = passo
+        self.dias_funcionamento = tuple(dias_funcionamento)
+        self._dias = {}
+        self._reservas = {}
+        # Agendamentos carregados do banco que se sobrepõem a outros
+        self.conflitos = []
+
+    @classmethod
+    def carregar(cls, conn, a_partir=None, **opcoes):
+        """Montar a agenda com os agendamentos a partir de uma data"""
+        duracoes, agendamentos = ocupacao(conn, a_partir)
+        return cls.montar(duracoes, agendamentos, **opcoes)
+
+    @classmethod
+    def montar(cls, duracoes, agendamentos, **opcoes):
+        """Montar a agenda a partir do resultado de ocupacao()"""
+        agenda = cls(duracoes=duracoes, **opcoes)
+        for agendamento_id, data, horario, servico_id in agendamentos:
+            try:
+                agenda.reservar(agendamento_id, data, horario, agenda.duracao(servico_id),
+                                validar_expediente=False)
+            except ConflitoAgendamento:
+                agenda.conflitos.append(agendamento_id)
+        return agenda
+
+    def duracao(self, servico_id):
+        """Duração estimada de um serviço em minutos"""
+        return self.duracoes.get(servico_id) or DURACAO_PADRAO_MIN
+
+    def _boxes_do_dia(self, data):
+        boxes = self._dias.get(data)
+        if boxes is None:
+            boxes = self._dias[data] = [[] for _ in range(self.boxes)]
+        return boxes
+
+    @staticmethod
+    def _livre(intervalos, inicio, fim):
+        """Verificar se [inicio, fim) cabe entre os vizinhos na lista ordenada"""
+        i = bisect_left(intervalos, (inicio,))
+        if i > 0 and intervalos[i - 1][1] > inicio:
+            return False
+        if i < len(intervalos) and intervalos[i][0] < fim:
+            return False
+        return True
+
+    def _no_expediente(self, data, inicio, fim):
+        dia_semana = date.fromisoformat(data).weekday()
+        return (dia_semana in self.dias_funcionamento
+                and inicio >= self.abertura and fim <= self.fechamento)
+
+    def esta_livre(self, data, horario, duracao):
+        """Verificar se algum box comporta o horário"""
+        inicio = para_minutos(horario)
+        fim = inicio + duracao
+        if not self._no_expediente(data, inicio, fim):
+            return False
+        boxes = self._dias.get(data)
+        return boxes is None or any(self._livre(box, inicio, fim) for box in boxes)
+
+    def reservar(self, agendamento_id, data, horario, duracao, validar_expediente=True):
+        """Ocupar o primeiro box livre; retorna o número do box"""
+        inicio = para_minutos(horario)
+        fim = inicio + duracao
+        if validar_expediente and not self._no_expediente(data, inicio, fim):
+            raise ConflitoAgendamento(f"{data} {horario} está fora do horário de funcionamento")
+
+        for numero, box in enumerate(self._boxes_do_dia(data)):
+            if self._livre(box, inicio, fim):
+                insort(box, (inicio, fim, agendamento_id))
+                self._reservas[agendamento_id] = (data, numero, inicio, fim)
+                return numero
+        raise ConflitoAgendamento(f"Nenhum box livre em {data} às {horario}")
+
+    def liberar(self, agendamento_id):
+        """Remover um agendamento da agenda (cancelamento ou remarcação)"""
+        reserva = self._reservas.pop(agendamento_id, None)
+        if reserva is None:
+            return
+        data, numero, inicio, fim = reserva
+        box = self._dias[data][numero]
+        del box[bisect_left(box, (inicio, fim, agendamento_id))]
+
+    def renomear(self, id_antigo, id_novo, data=None, horario=None, duracao=None):
+        """Trocar o id de uma reserva provisória pelo id gravado no banco
+
+        Agenda recarregada depois da reserva provisória não a tem: então
+        reserva o id gravado em `data`/`horario`, se a carga ainda não o
+        trouxe do banco.
+        """
+        reserva = self._reservas.pop(id_antigo, None)
+        if reserva is None:
+            if id_novo not in self._reservas and data is not None:
+                try:
+                    self.reservar(id_novo, data, horario, duracao, validar_expediente=False)
+                except ConflitoAgendamento:
+                    self.conflitos.append(id_novo)
+            return
+        data, numero, inicio, fim = reserva
+        box = self._dias[data][numero]
+        box[bisect_left(box, (inicio, fim, id_antigo))] = (inicio, fim, id_novo)
+        self._reservas[id_novo] = (data, numero, inicio, fim)
+
+    def atualizar(self, agendamento_id, linha, a_partir=None):
+        """Refletir um agendamento alterado em outra estação
+
+        `linha` é (data, horario, servico_id, status), ou None se foi excluído.
+        """
+        self.liberar(agendamento_id)
+        if linha is None:
+            return
+        data, horario, servico_id, status = linha
+        a_partir = a_partir or date.today().isoformat()
+        if data is None or horario is None or data < a_partir or status in STATUS_LIVRES:
+            return
+        try:
+            self.reservar(agendamento_id, data, horario, self.duracao(servico_id), validar_expediente=False)
+        except ConflitoAgendamento:
+            self.conflitos.append(agendamento_id)
+
+    def horarios_livres(self, data, duracao, a_partir_minuto=0):
+        """Horários de início livres em um dia, em ordem"""
+        if date.fromisoformat(data).weekday() not in self.dias_funcionamento:
+            return []
+
+        primeiro = max(self.abertura, a_partir_minuto)
+        # Alinhar ao passo da agenda contado a partir da abertura
+        primeiro = self.abertura + -(-(primeiro - self.abertura) // self.passo) * self.passo
+        boxes = self._dias.get(data) or [[]]
+
+        inicios = set()
+        for box in boxes:
+            livre_desde = self.abertura
+            for inicio, fim, _ in box + [(self.fechamento, self.fechamento, None)]:
+                t = max(livre_desde, primeiro)
+                t = self.abertura + -(-(t - self.abertura) // self.passo) * self.passo
+                while t + duracao <= min(inicio, self.fechamento):
+                    inicios.add(t)
+                    t += self.passo
+                livre_desde = max(livre_desde, fim)
+        return [para_horario(t) for t in sorted(inicios)]
+
+    def proximos_horarios(self, duracao, quantidade=5, a_partir=None, dias_maximo=60):
+        """Próximos `quantidade` horários livres como (data, horario)"""
+        a_partir = a_partir or datetime.now()
+        resultado = []
+        dia = a_partir.date()
+        for deslocamento in range(dias_maximo):
+            data = (dia + timedelta(days=deslocamento)).isoformat()
+            minuto = a_partir.hour * 60 + a_partir.minute if deslocamento == 0 else 0
+            for horario in self.horarios_livres(data, duracao, minuto):
+                resultado.append((data, horario))
+                if len(resultado) == quantidade:
+                    return resultado
+        return resultado
@@ -0,0 +1,237 @@
+import os
+import sqlite3
+
+from config import DATABASE_PATH, SERVICOS_PADRAO
+from busca_clientes import criar_indice_busca
+from estatisticas import criar_resumo_diario
+from relatorios import criar_correcao_agendamentos, criar_tabelas_relatorios
+from veiculos import criar_indices_veiculos, criar_resumo_veiculos
+from notificacoes import criar_registro_alteracoes
+from catalogo import criar_historico_precos
+from duplicados import criar_chaves_duplicados
+from ordens import criar_itens_e_estoque
+
+# Ajustes aplicados a toda conexão aberta pelo sistema
+PRAGMAS_CONEXAO = (
+    # Só vale em banco novo (antes do WAL e da primeira tabela); bancos
+    # antigos mudam de modo no próximo VACUUM completo (manutencao.compactar)
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def conectar(caminho=DATABASE_PATH, check_same_thread=False, factory=sqlite3.Connection):
+    """Abrir conexão com o banco já configurada"""
+    if caminho != ':memory:' and os.path.dirname(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    conn = sqlite3.connect(caminho, check_same_thread=check_same_thread, factory=factory)
+    for pragma in PRAGMAS_CONEXAO:
+        conn.execute(pragma)
+    return conn
+
+
+def _criar_tabelas(conn):
+    """Tabelas principais do sistema"""
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            telefone TEXT,
+            email TEXT,
+            endereco TEXT,
+            data_cadastro DATE
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS veiculos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente_id INTEGER,
+            marca TEXT NOT NULL,
+            modelo TEXT NOT NULL,
+            ano INTEGER,
+            placa TEXT UNIQUE,
+            quilometragem INTEGER,
+            FOREIGN KEY (cliente_id) REFERENCES clientes (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS servicos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            descricao TEXT,
+            preco REAL,
+            tempo_estimado INTEGER
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agendamentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente_id INTEGER,
+            veiculo_id INTEGER,
+            servico_id INTEGER,
+            data_agendamento DATE,
+            horario TIME,
+            status TEXT DEFAULT 'Agendado',
+            observacoes TEXT,
+            FOREIGN KEY (cliente_id) REFERENCES clientes (id),
+            FOREIGN KEY (veiculo_id) REFERENCES veiculos (id),
+            FOREIGN KEY (servico_id) REFERENCES servicos (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ordens_servico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agendamento_id INTEGER,
+            tecnico TEXT,
+            data_inicio DATE,
+            data_conclusao DATE,
+            custo_total REAL,
+            observacoes TEXT,
+            FOREIGN KEY (agendamento_id) REFERENCES agendamentos (id)
+        )
+    ''')
+
+    # Inserir serviços padrão se a tabela estiver vazia
+    cursor.execute("SELECT COUNT(*) FROM servicos")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT INTO servicos (nome, descricao, preco, tempo_estimado) VALUES (?, ?, ?, ?)",
+            SERVICOS_PADRAO
+        )
+
+
+def _criar_indices_relacionamentos(conn):
+    """Índices das chaves estrangeiras usadas em junções e filtros"""
+    cursor = conn.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_cliente ON agendamentos (cliente_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_veiculo ON agendamentos (veiculo_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_veiculos_cliente ON veiculos (cliente_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ordens_agendamento ON ordens_servico (agendamento_id)")
+    # idx_agendamentos_data (data_agendamento, horario) é criado com o resumo diário
+    # e trocado por idx_agendamentos_data_status na fila de lembretes
+    cursor.execute("ANALYZE")
+
+
+def _criar_controle_manutencao(conn):
+    """Última execução de cada tarefa de manutenção (manutencao.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS manutencao (
+            tarefa TEXT PRIMARY KEY,
+            executada_em TEXT NOT NULL,
+            resultado TEXT
+        )
+    ''')
+
+
+def _criar_fila_lembretes(conn):
+    """Fila de lembretes de agendamento (lembretes.py) e índice da varredura por horário"""
+    cursor = conn.cursor()
+    # Mesmas consultas de idx_agendamentos_data; com o status, a varredura de
+    # lembretes e faltas não precisa ler a tabela
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_data_status ON agendamentos (data_agendamento, horario, status)")
+    cursor.execute("DROP INDEX IF EXISTS idx_agendamentos_data")
+
+    # `chave` identifica o lembrete de um agendamento em uma data/horário:
+    # enfileirar de novo é ignorado e o remetente descarta chaves já entregues
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS lembretes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chave TEXT NOT NULL UNIQUE,
+            agendamento_id INTEGER NOT NULL,
+            destino TEXT NOT NULL,
+            mensagem TEXT NOT NULL,
+            situacao TEXT NOT NULL DEFAULT 'pendente'
+                CHECK (situacao IN ('pendente', 'enviado', 'falhou', 'cancelado')),
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            proxima_tentativa TEXT NOT NULL,
+            criado_em TEXT NOT NULL,
+            enviado_em TEXT,
+            erro TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lembretes_pendentes ON lembretes (proxima_tentativa) WHERE situacao = 'pendente'")
+    cursor.execute("ANALYZE agendamentos")
+
+
+def _criar_indices_catalogo(conn):
+    """Índices para as varreduras apontadas pelo catálogo de SQL (catalogo_sql.py)"""
+    # Mesclagem de clientes move os agregados por cliente_id, fora do início da chave (mes, cliente_id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rel_faturamento_cliente_cliente ON rel_faturamento_cliente (cliente_id)")
+
+
+def _criar_mapa_importacao(conn):
+    """Id que cada cliente importado tinha na oficina de origem (importacao.py)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clientes_importados (
+            origem TEXT NOT NULL,
+            id_origem INTEGER NOT NULL,
+            cliente_id INTEGER NOT NULL,
+            PRIMARY KEY (origem, id_origem)
+        ) WITHOUT ROWID
+    ''')
+    # Mesclagem de clientes repassa o mapa para o cadastro mantido
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clientes_importados_cliente ON clientes_importados (cliente_id)")
+
+
+# Migrações em ordem: (versão, descrição, função)
+MIGRACOES = [
+    (1, "Tabelas principais e serviços padrão", _criar_tabelas),
+    (2, "Índice de busca de clientes (FTS5)", criar_indice_busca),
+    (3, "Resumo diário do dashboard", criar_resumo_diario),
+    (4, "Índices de relacionamentos", _criar_indices_relacionamentos),
+    (5, "Agregados de relatórios", criar_tabelas_relatorios),
+    (6, "Chave normalizada de placas", criar_indices_veiculos),
+    (7, "Histórico e resumo por veículo", criar_resumo_veiculos),
+    (8, "Registro de alterações", criar_registro_alteracoes),
+    (9, "Histórico de preços dos serviços", criar_historico_precos),
+    (10, "Controle de manutenção", _criar_controle_manutencao),
+    (11, "Chaves de detecção de clientes duplicados", criar_chaves_duplicados),
+    (12, "Fila de lembretes de agendamento", _criar_fila_lembretes),
+    (13, "Itens das ordens de serviço e estoque de peças", criar_itens_e_estoque),
+    (14, "Índices apontados pelo catálogo de SQL", _criar_indices_catalogo),
+    (15, "Correção dos agregados ao mudar serviço ou cliente do agendamento", criar_correcao_agendamentos),
+    (16, "Mapa de ids dos clientes importados", _criar_mapa_importacao),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+
+def versao_schema(conn):
+    """Versão do schema gravada no banco (PRAGMA user_version)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def preparar_banco(conn):
+    """Aplicar as migrações pendentes; retorna as descrições aplicadas
+
+    Quando o banco já está na versão atual nenhum DDL é executado.
+    """
+    versao = versao_schema(conn)
+    if versao >= VERSAO_ATUAL:
+        return []
+
+    aplicadas = []
+    for numero, descricao, migrar in MIGRACOES:
+        if numero <= versao:
+            continue
+        try:
+            migrar(conn)
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas.append(descricao)
+    return aplicadas
@@ -0,0 +1,362 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from functools import partial
+from itertools import count, islice
+from unittest import mock
+
+from config import SERVICOS_PADRAO
+from banco import conectar, preparar_banco
+from busca_clientes import BuscaClientes
+from lista_virtual import PaginadorClientes
+from estatisticas import agendamentos_do_dia, ler_resumo
+from agenda import Agenda
+from relatorios import atualizar_agregados, consultar_relatorio
+from veiculos import RegistroVeiculos
+from repositorio import Cliente
+from executor_db import ExecutorSincrono
+from unidade_trabalho import UnidadeTrabalho, gravar
+from operacoes import BackendLocal
+from servidor import ServidorOficina
+from acesso_remoto import BackendRemoto
+
+# Escalas pré-definidas: número de clientes
+ESCALAS = {
+    'pequena': 10_000,
+    'media': 100_000,
+    'grande': 1_000_000,
+}
+
+# Proporções usadas pelo gerador de dados
+VEICULOS_POR_CLIENTE = 1.3
+AGENDAMENTOS_POR_DIA = 40
+
+# Regressão: tempo médio acima de base * (1 + tolerância)
+TOLERANCIA_PADRAO = 0.25
+
+TAMANHO_LOTE = 10_000
+
+CAMINHO_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface.py')
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+         'Isabela', 'João', 'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Olívia', 'Paulo',
+         'Queila', 'Rafael', 'Sofia', 'Thiago', 'Úrsula', 'Vinícius', 'Washington', 'Yasmin')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves',
+              'Pereira', 'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida')
+VEICULOS = (('Volkswagen', 'Gol'), ('Chevrolet', 'Onix'), ('Fiat', 'Argo'), ('Hyundai', 'HB20'),
+            ('Toyota', 'Corolla'), ('Honda', 'Civic'), ('Renault', 'Kwid'), ('Jeep', 'Compass'))
+TECNICOS = ('Carlos', 'Marcos', 'Renata', 'Sérgio', 'Tatiane')
+STATUS = ('Agendado', 'Em Andamento', 'Concluído', 'Cancelado')
+
+
+def _em_lotes(linhas, tamanho=TAMANHO_LOTE):
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def _placa(indice):
+    """Placa única no formato Mercosul derivada do índice"""
+    indice, final = divmod(indice, 100)
+    indice, letra = divmod(indice, 26)
+    indice, digito = divmod(indice, 10)
+    letras = ''
+    for _ in range(3):
+        indice, resto = divmod(indice, 26)
+        letras += chr(ord('A') + resto)
+    return f"{letras}{digito}{chr(ord('A') + letra)}{final:02d}"
+
+
+def gerar_dados(conn, clientes, anos=3, semente=42):
+    """Popular o banco com dados sintéticos realistas"""
+    aleatorio = random.Random(semente)
+    hoje = date.today()
+    cursor = conn.cursor()
+
+    def gerar_clientes():
+        for i in range(clientes):
+            nome = f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}"
+            telefone = f"({aleatorio.randint(11, 99)}) 9{aleatorio.randint(1000, 9999)}-{aleatorio.randint(1000, 9999)}"
+            email = f"{nome.split()[0].lower()}.{i}@exemplo.com.br"
+            cadastro = (hoje - timedelta(days=aleatorio.randint(0, anos * 365))).isoformat()
+            yield (nome, telefone, email, f"Rua {aleatorio.randint(1, 999)}", cadastro)
+
+    for lote in _em_lotes(gerar_clientes()):
+        cursor.executemany(
+            "INSERT INTO clientes (nome, telefone, email, endereco, data_cadastro) VALUES (?, ?, ?, ?, ?)", lote)
+        conn.commit()
+
+    total_veiculos = int(clientes * VEICULOS_POR_CLIENTE)
+
+    def gerar_veiculos():
+        for i in range(total_veiculos):
+            marca, modelo = aleatorio.choice(VEICULOS)
+            yield (aleatorio.randint(1, clientes), marca, modelo, aleatorio.randint(2005, hoje.year),
+                   _placa(i), aleatorio.randint(0, 250_000))
+
+    for lote in _em_lotes(gerar_veiculos()):
+        cursor.executemany(
+            "INSERT INTO veiculos (cliente_id, marca, modelo, ano, placa, quilometragem) VALUES (?, ?, ?, ?, ?, ?)", lote)
+        conn.commit()
+
+    servicos = len(SERVICOS_PADRAO)
+    dias = anos * 365
+
+    def gerar_agendamentos():
+        for deslocamento in range(-dias, 30):
+            dia = hoje + timedelta(days=deslocamento)
+            if dia.weekday() == 6:
+                continue
+            for _ in range(AGENDAMENTOS_POR_DIA):
+                veiculo = aleatorio.randint(1, total_veiculos)
+                if deslocamento < 0:
+                    status = aleatorio.choices(STATUS, (1, 1, 20, 2))[0]
+                else:
+                    status = 'Agendado'
+                yield (aleatorio.randint(1, clientes), veiculo, aleatorio.randint(1, servicos), dia.isoformat(),
+                       f"{aleatorio.randint(8, 17):02d}:{aleatorio.choice(('00', '15', '30', '45'))}", status)
+
+    for lote in _em_lotes(gerar_agendamentos()):
+        cursor.executemany(
+            "INSERT INTO agendamentos (cliente_id, veiculo_id, servico_id, data_agendamento, horario, status) "
+            "VALUES (?, ?, ?, ?, ?, ?)", lote)
+        conn.commit()
+
+    # Uma ordem de serviço para cada agendamento concluído
+    cursor.execute('''
+        INSERT INTO ordens_servico (agendamento_id, tecnico, data_inicio, data_conclusao, custo_total)
+        SELECT a.id, NULL, a.data_agendamento, a.data_agendamento, s.preco
+        FROM agendamentos a JOIN servicos s ON s.id = a.servico_id
+        WHERE a.status = 'Concluído'
+    ''')
+    cursor.executemany("UPDATE ordens_servico SET tecnico = ? WHERE id % ? = ?",
+                       [(tecnico, len(TECNICOS), i) for i, tecnico in enumerate(TECNICOS)])
+    conn.commit()
+    cursor.execute("ANALYZE")
+    conn.commit()
+
+
+def _contar(conn):
+    return {tabela: conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+            for tabela in ('clientes', 'veiculos', 'agendamentos', 'ordens_servico')}
+
+
+def medir(funcao, repeticoes, depois=None):
+    """Executar funcao() `repeticoes` vezes e resumir os tempos em ms
+
+    `depois(resultado)`, se informado, roda após cada medição sem ser cronometrado.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        if depois:
+            depois(resultado)
+    tempos.sort()
+    return {
+        'repeticoes': repeticoes,
+        'media_ms': round(statistics.fmean(tempos), 4),
+        'p50_ms': round(tempos[len(tempos) // 2], 4),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 4),
+        'min_ms': round(tempos[0], 4),
+        'max_ms': round(tempos[-1], 4),
+    }
+
+
+def _carregar_app(mockar_tk):
+    """Importar interface.py (com tkinter simulado, se pedido)"""
+    modulos = {}
+    if mockar_tk:
+        tk = mock.MagicMock(name='tkinter')
+        modulos = {'tkinter': tk, 'tkinter.ttk': tk.ttk, 'tkinter.messagebox': tk.messagebox,
+                   'tkinter.scrolledtext': tk.scrolledtext, 'tkinter.filedialog': tk.filedialog}
+    with mock.patch.dict(sys.modules, modulos):
+        spec = importlib.util.spec_from_file_location('oficina_app', CAMINHO_APP)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+    return modulo
+
+
+def executar(caminho, repeticoes, mockar_tk):
+    """Medir os caminhos reais do sistema sobre o banco em `caminho`"""
+    app = _carregar_app(mockar_tk)
+    conn = conectar(caminho)
+    resultados = {}
+
+    # Inicialização completa de OficinaApp
+    def iniciar():
+        if mockar_tk:
+            root = mock.MagicMock(name='root')
+        else:
+            root = app.tk.Tk()
+            root.withdraw()
+        with mock.patch.object(app, 'conectar', partial(conectar, caminho)):
+            return app.OficinaApp(root, None)
+    resultados['inicializacao_app'] = medir(iniciar, max(1, repeticoes // 10), lambda instancia: instancia.fechar())
+
+    # Lista de clientes: primeira página e rolagem por chave
+    paginador = PaginadorClientes(conn)
+    resultados['carregar_clientes_primeira_pagina'] = medir(lambda: paginador.primeira_pagina(200), repeticoes)
+    meio = conn.execute(
+        "SELECT nome, id FROM clientes ORDER BY nome COLLATE NOCASE, id LIMIT 1 OFFSET "
+        "(SELECT COUNT(*) / 2 FROM clientes)").fetchone()
+    resultados['carregar_clientes_rolagem'] = medir(lambda: paginador.apos(meio[0], meio[1], 100), repeticoes)
+
+    # Pesquisa: termo curto, termo completo e digitação caractere a caractere
+    exemplo = conn.execute("SELECT nome, telefone FROM clientes WHERE id = 1").fetchone()
+    sobrenome = exemplo[0].split()[1].lower()
+    telefone = ''.join(ch for ch in exemplo[1] if ch.isdigit())[-6:]
+    resultados['pesquisar_clientes_curta'] = medir(lambda: BuscaClientes(conn).pesquisar(sobrenome[:2]), repeticoes)
+    resultados['pesquisar_clientes_nome'] = medir(lambda: BuscaClientes(conn).pesquisar(sobrenome), repeticoes)
+    resultados['pesquisar_clientes_telefone'] = medir(lambda: BuscaClientes(conn).pesquisar(telefone), repeticoes)
+
+    def digitar():
+        busca = BuscaClientes(conn)
+        for tamanho in range(1, len(exemplo[0]) + 1):
+            busca.pesquisar(exemplo[0][:tamanho])
+    resultados['pesquisar_clientes_digitacao'] = medir(digitar, max(1, repeticoes // 10))
+
+    # Gravação e exclusão de clientes pelos métodos do aplicativo
+    backend = BackendLocal(conn)
+    executor = ExecutorSincrono(conn)
+    gravados = []
+    dados = {'nome': 'Cliente Benchmark', 'telefone': '(11) 90000-0000', 'email': 'benchmark@exemplo.com.br',
+             'endereco': 'Rua Teste', 'data_cadastro': date.today().isoformat()}
+    resultados['salvar_cliente_novo'] = medir(
+        lambda: executor.gravar(backend.salvar_cliente, Cliente(), dados,
+                                ao_concluir=gravados.append), repeticoes)
+
+    # Edição de um campo: o UPDATE grava só o telefone
+    sequencia = count()
+    def novo_telefone():
+        return {'telefone': f"(11) 9{next(sequencia) % 10000:04d}-0000"}
+    resultados['salvar_cliente_edicao'] = medir(
+        lambda: executor.gravar(backend.salvar_cliente, gravados[0], novo_telefone()), repeticoes)
+
+    # Rajada de edições confirmadas em um único commit
+    def rajada():
+        unidade = UnidadeTrabalho()
+        for cliente in gravados[:50]:
+            unidade.adicionar(backend.salvar_cliente, cliente, novo_telefone())
+        gravar(conn, unidade)
+    resultados['salvar_clientes_rajada_50'] = medir(rajada, max(1, repeticoes // 10))
+
+    fila = [cliente.id for cliente in gravados]
+    resultados['excluir_cliente'] = medir(lambda: executor.gravar(backend.apagar_cliente, fila.pop()), repeticoes)
+
+    # Ficha do veículo por placa: consulta ao banco e acerto no cache
+    placa = conn.execute(
+        "SELECT placa FROM veiculos LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM veiculos)").fetchone()[0]
+    sem_cache = RegistroVeiculos(conn, capacidade=0)
+    resultados['buscar_veiculo_placa'] = medir(lambda: sem_cache.buscar_ficha(placa.lower()), repeticoes)
+    registro = RegistroVeiculos(conn)
+    registro.buscar_ficha(placa)
+    resultados['buscar_veiculo_placa_cache'] = medir(lambda: registro.em_cache(placa), repeticoes)
+
+    # Dashboard, agenda e relatórios
+    resultados['dashboard_resumo'] = medir(lambda: ler_resumo(conn), repeticoes)
+    resultados['dashboard_agendamentos_dia'] = medir(lambda: agendamentos_do_dia(conn), repeticoes)
+    resultados['agenda_carregar'] = medir(lambda: Agenda.carregar(conn), max(1, repeticoes // 10))
+    resultados['relatorio_atualizar_agregados'] = medir(lambda: atualizar_agregados(conn), 1)
+    resultados['relatorio_por_cliente'] = medir(
+        lambda: consultar_relatorio(conn, 'cliente', 500).fetchall(), max(1, repeticoes // 10))
+
+    # Modo multiestação: mesmas operações por HTTP em localhost
+    servidor = ServidorOficina(caminho, porta=0).iniciar()
+    try:
+        remoto = BackendRemoto(servidor.endereco, ttl=0)
+        resultados['servidor_dashboard'] = medir(remoto.dados_dashboard, repeticoes)
+        resultados['servidor_pesquisar_clientes'] = medir(lambda: remoto.pesquisar_clientes(sobrenome), repeticoes)
+        novo = remoto.salvar_cliente(Cliente(), dados)
+        resultados['servidor_salvar_cliente'] = medir(lambda: remoto.salvar_cliente(novo, novo_telefone()), repeticoes)
+        remoto.apagar_cliente(novo.id)
+        remoto.fechar()
+    finally:
+        servidor.encerrar()
+
+    conn.close()
+    return resultados
+
+
+def comparar(atual, base, tolerancia):
+    """Listar medições mais lentas que a base além da tolerância"""
+    regressoes = []
+    for nome, medicao in atual['resultados'].items():
+        anterior = base.get('resultados', {}).get(nome)
+        if anterior and medicao['media_ms'] > anterior['media_ms'] * (1 + tolerancia):
+            regressoes.append({
+                'medicao': nome,
+                'base_ms': anterior['media_ms'],
+                'atual_ms': medicao['media_ms'],
+                'variacao': round(medicao['media_ms'] / anterior['media_ms'] - 1, 4),
+            })
+    return regressoes
+
+
+def main():
+    """Linha de comando do benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos principais do sistema")
+    parser.add_argument('--escala', choices=tuple(ESCALAS), default='pequena')
+    parser.add_argument('--clientes', type=int, help="Número de clientes (substitui --escala)")
+    parser.add_argument('--anos', type=int, default=3, help="Anos de histórico de agendamentos")
+    parser.add_argument('--banco', help="Banco a usar/gerar (padrão: benchmark_<escala>.db)")
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--saida', help="Arquivo JSON de resultado (padrão: saída padrão)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO)
+    parser.add_argument('--tk-real', action='store_true', help="Usar Tk de verdade (requer display)")
+    args = parser.parse_args()
+
+    clientes = args.clientes or ESCALAS[args.escala]
+    caminho = args.banco or f"benchmark_{clientes}.db"
+
+    conn = conectar(caminho)
+    preparar_banco(conn)
+    geracao_s = None
+    if conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0] == 0:
+        inicio = time.perf_counter()
+        gerar_dados(conn, clientes, args.anos)
+        geracao_s = round(time.perf_counter() - inicio, 2)
+    contagens = _contar(conn)
+    conn.close()
+
+    relatorio = {
+        'data': date.today().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'banco': caminho,
+        'contagens': contagens,
+        'geracao_s': geracao_s,
+        'resultados': executar(caminho, args.repeticoes, not args.tk_real),
+    }
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            relatorio['regressoes'] = comparar(relatorio, json.load(arquivo), args.tolerancia)
+        codigo = 1 if relatorio['regressoes'] else 0
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+    else:
+        print(texto)
+    sys.exit(codigo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+from bisect import bisect_right
+
+# Quantidade de linhas exibidas por página de resultados
+TAMANHO_PAGINA = 200
+
+# Conjuntos de resultados até este tamanho ficam em memória para refinamento
+LIMITE_REFINO = 5000
+
+# O tokenizador trigram só indexa termos com pelo menos 3 caracteres
+TAMANHO_MINIMO_FTS = 3
+
+# Mesma ordem de repositorio.Cliente; a lista exibe só as cinco primeiras
+COLUNAS_CLIENTE = "c.id, c.nome, c.telefone, c.email, c.data_cadastro, c.endereco"
+
+
+def criar_indice_busca(conn):
+    """Criar índice FTS5 de clientes e triggers de sincronização"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clientes_fts'")
+    existia = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+            nome, telefone, email,
+            content='clientes', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+
+    # Manter o índice sincronizado com a tabela de clientes
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+            INSERT INTO clientes_fts (rowid, nome, telefone, email)
+            VALUES (new.id, new.nome, new.telefone, new.email);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, nome, telefone, email)
+            VALUES ('delete', old.id, old.nome, old.telefone, old.email);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE OF nome, telefone, email ON clientes BEGIN
+            INSERT INTO clientes_fts (clientes_fts, rowid, nome, telefone, email)
+            VALUES ('delete', old.id, old.nome, old.telefone, old.email);
+            INSERT INTO clientes_fts (rowid, nome, telefone, email)
+            VALUES (new.id, new.nome, new.telefone, new.email);
+        END
+    ''')
+
+    # Índice por nome usado nas buscas curtas e na ordenação
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nome ON clientes (nome COLLATE NOCASE, id)")
+
+    # Bancos antigos já possuem clientes: popular o índice uma única vez
+    if not existia:
+        cursor.execute("INSERT INTO clientes_fts (clientes_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def chave_nocase(nome, cliente_id):
+    """Chave de ordenação equivalente a (nome COLLATE NOCASE, id) no SQLite"""
+    # NOCASE do SQLite só ignora maiúsculas/minúsculas em ASCII
+    return (''.join(ch.lower() if 'A' <= ch <= 'Z' else ch for ch in nome or ''), cliente_id)
+
+
+def _escapar_like(termo):
+    """Escapar curingas do LIKE"""
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _expressao_fts(termo):
+    """Montar expressão MATCH que busca o termo como substring"""
+    return '"' + termo.replace('"', '""') + '"'
+
+
+def _contem(linha, termo):
+    """Verificar se o termo aparece em nome, telefone ou e-mail"""
+    return any(termo in (campo or '').lower() for campo in linha[1:4])
+
+
+class BuscaClientes:
+    """Motor de busca incremental de clientes"""
+
+    def __init__(self, conn, tamanho_pagina=TAMANHO_PAGINA):
+        self.conn = conn
+        self.tamanho_pagina = tamanho_pagina
+        # Último termo pesquisado e seu conjunto completo de resultados
+        self._ultimo_termo = None
+        self._ultimos_resultados = None
+        # Chaves chave_nocase desses resultados, calculadas na primeira página seguinte
+        self._ultimas_chaves = None
+        # Último termo com mais de LIMITE_REFINO resultados (paginado no banco)
+        self._termo_grande = None
+
+    def invalidar(self):
+        """Descartar resultados em memória após alterações nos clientes"""
+        self._ultimo_termo = None
+        self._ultimos_resultados = None
+        self._ultimas_chaves = None
+        self._termo_grande = None
+
+    def pesquisar(self, termo, apos=None):
+        """Retornar (linhas, ha_mais) para uma página de resultados
+
+        `apos` é a chave (nome, id) da última linha já exibida: as páginas
+        seguem pela chave, como PaginadorClientes, e um cliente inserido
+        entre uma página e outra não repete linhas já entregues.
+        """
+        termo = termo.strip().lower()
+        if not termo:
+            self.invalidar()
+            return [], False
+
+        resultados = self._resultados_em_memoria(termo)
+        if resultados is None and termo != self._termo_grande:
+            # Contar só os ids, sem ordenar: conjunto grande não é lido inteiro
+            if self._contar(termo, LIMITE_REFINO + 1) <= LIMITE_REFINO:
+                resultados = self._consultar(termo, LIMITE_REFINO)
+                self._ultimo_termo = termo
+                self._ultimos_resultados = resultados
+                self._ultimas_chaves = None
+            else:
+                self.invalidar()
+                self._termo_grande = termo
+        if resultados is None:
+            # Conjunto grande demais: paginar direto no banco
+            linhas = self._consultar(termo, self.tamanho_pagina + 1, apos)
+            return linhas[:self.tamanho_pagina], len(linhas) > self.tamanho_pagina
+
+        inicio = 0
+        if apos is not None:
+            # bisect com key= só existe a partir do Python 3.10
+            if self._ultimas_chaves is None:
+                self._ultimas_chaves = [chave_nocase(linha[1], linha[0]) for linha in resultados]
+            inicio = bisect_right(self._ultimas_chaves, chave_nocase(*apos))
+        pagina = resultados[inicio:inicio + self.tamanho_pagina]
+        return pagina, inicio + self.tamanho_pagina < len(resultados)
+
+    def _resultados_em_memoria(self, termo):
+        """Refinar o conjunto anterior quando o termo apenas foi estendido"""
+        if self._ultimo_termo is None:
+            return None
+        if termo == self._ultimo_termo:
+            return self._ultimos_resultados
+        if not termo.startswith(self._ultimo_termo):
+            return None
+        # Termos curtos buscam só o prefixo do nome; não servem de base
+        if len(self._ultimo_termo) < TAMANHO_MINIMO_FTS:
+            return None
+
+        resultados = [linha for linha in self._ultimos_resultados if _contem(linha, termo)]
+        self._ultimo_termo = termo
+        self._ultimos_resultados = resultados
+        self._ultimas_chaves = None
+        return resultados
+
+    def _contar(self, termo, limite):
+        """Quantidade de resultados do termo, contando no máximo até `limite`"""
+        cursor = self.conn.cursor()
+        if len(termo) < TAMANHO_MINIMO_FTS:
+            cursor.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM clientes c WHERE c.nome LIKE ? ESCAPE '\\' LIMIT ?
+                )
+            """, (_escapar_like(termo) + '%', limite))
+        else:
+            cursor.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM clientes_fts WHERE clientes_fts MATCH ? LIMIT ?
+                )
+            """, (_expressao_fts(termo), limite))
+        return cursor.fetchone()[0]
+
+    def _consultar(self, termo, limite, apos=None):
+        """Executar a consulta no banco, a partir da chave `apos` se houver"""
+        filtro_chave = ""
+        parametros_chave = ()
+        if apos is not None:
+            filtro_chave = "AND c.nome COLLATE NOCASE >= ? AND (c.nome COLLATE NOCASE > ? OR c.id > ?)"
+            parametros_chave = (apos[0], apos[0], apos[1])
+        cursor = self.conn.cursor()
+        if len(termo) < TAMANHO_MINIMO_FTS:
+            # Poucos caracteres: prefixo do nome pelo índice idx_clientes_nome
+            cursor.execute(f"""
+                SELECT {COLUNAS_CLIENTE}
+                FROM clientes c
+                WHERE c.nome LIKE ? ESCAPE '\\' {filtro_chave}
+                ORDER BY c.nome COLLATE NOCASE, c.id
+                LIMIT ?
+            """, (_escapar_like(termo) + '%', *parametros_chave, limite))
+        else:
+            cursor.execute(f"""
+                SELECT {COLUNAS_CLIENTE}
+                FROM clientes_fts f
+                JOIN clientes c ON c.id = f.rowid
+                WHERE clientes_fts MATCH ? {filtro_chave}
+                ORDER BY c.nome COLLATE NOCASE, c.id
+                LIMIT ?
+            """, (_expressao_fts(termo), *parametros_chave, limite))
+        return cursor.fetchall()
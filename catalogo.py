@@ -0,0 +1,155 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+# Versão de preço vigente de um serviço (subconsulta SQL)
+SQL_PRECO_VIGENTE = "SELECT MAX(id) FROM precos_servicos WHERE servico_id = {servico}"
+
+# Serviço do catálogo; preco_id é a versão de preço vigente
+Servico = namedtuple('Servico', 'id nome descricao preco tempo_estimado preco_id')
+
+
+def criar_historico_precos(conn):
+    """Criar o histórico de preços dos serviços e o contador de versão do catálogo
+
+    Cada alteração de preço vira uma nova linha em precos_servicos; o
+    agendamento guarda a versão vigente quando foi marcado (preco_id) e a
+    ordem de serviço sem valor informado recebe esse preço. Agendamentos
+    anteriores ao histórico ficam com preco_id nulo e usam a primeira
+    versão do serviço.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS precos_servicos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            servico_id INTEGER NOT NULL REFERENCES servicos (id),
+            preco REAL,
+            vigente_desde TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_precos_servico ON precos_servicos (servico_id, id)")
+    cursor.execute('''
+        INSERT INTO precos_servicos (servico_id, preco, vigente_desde)
+        SELECT id, preco, '0001-01-01 00:00:00' FROM servicos
+        WHERE id NOT IN (SELECT servico_id FROM precos_servicos)
+    ''')
+
+    colunas = [row[1] for row in cursor.execute("PRAGMA table_info(agendamentos)")]
+    if 'preco_id' not in colunas:
+        cursor.execute("ALTER TABLE agendamentos ADD COLUMN preco_id INTEGER REFERENCES precos_servicos (id)")
+
+    # Versão do catálogo: muda a cada gravação em servicos
+    cursor.execute("CREATE TABLE IF NOT EXISTS catalogo_versao (versao INTEGER NOT NULL)")
+    cursor.execute("INSERT INTO catalogo_versao (versao) SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM catalogo_versao)")
+    for sufixo, evento in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS catalogo_servicos_{sufixo} AFTER {evento} ON servicos BEGIN
+                UPDATE catalogo_versao SET versao = versao + 1;
+            END
+        ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS precos_servicos_ai AFTER INSERT ON servicos BEGIN
+            INSERT INTO precos_servicos (servico_id, preco, vigente_desde)
+            VALUES (new.id, new.preco, datetime('now', 'localtime'));
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS precos_servicos_au AFTER UPDATE OF preco ON servicos
+        WHEN new.preco IS NOT old.preco BEGIN
+            INSERT INTO precos_servicos (servico_id, preco, vigente_desde)
+            VALUES (new.id, new.preco, datetime('now', 'localtime'));
+        END
+    ''')
+
+    # Quem grava sem informar preco_id (importação, scripts) fica com o preço vigente
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS agendamentos_preco_ai AFTER INSERT ON agendamentos
+        WHEN new.preco_id IS NULL AND new.servico_id IS NOT NULL BEGIN
+            UPDATE agendamentos SET preco_id = ({SQL_PRECO_VIGENTE.format(servico='new.servico_id')})
+            WHERE id = new.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS ordens_preco_ai AFTER INSERT ON ordens_servico
+        WHEN new.custo_total IS NULL AND new.agendamento_id IS NOT NULL BEGIN
+            UPDATE ordens_servico SET custo_total = (
+                SELECT p.preco FROM agendamentos a
+                JOIN precos_servicos p ON p.id = COALESCE(
+                    a.preco_id, (SELECT MIN(id) FROM precos_servicos WHERE servico_id = a.servico_id))
+                WHERE a.id = new.agendamento_id
+            )
+            WHERE id = new.id;
+        END
+    ''')
+    conn.commit()
+
+
+class Catalogo:
+    """Fotografia imutável do catálogo de serviços e do histórico de preços"""
+
+    def __init__(self, versao, servicos, precos):
+        self.versao = versao
+        self.servicos = MappingProxyType({servico.id: servico for servico in servicos})
+        # id da versão de preço -> (servico_id, preco, vigente_desde)
+        self.precos = MappingProxyType(dict(precos))
+        primeiras = {}
+        for preco_id, (servico_id, _, _) in sorted(precos.items()):
+            primeiras.setdefault(servico_id, preco_id)
+        self._primeira_versao = primeiras
+        self.por_nome = tuple(sorted(self.servicos.values(), key=lambda servico: servico.nome))
+
+    def nome(self, servico_id):
+        servico = self.servicos.get(servico_id)
+        return servico.nome if servico is not None else None
+
+    def duracoes(self):
+        """[(servico_id, tempo_estimado)] no formato usado pela agenda"""
+        return [(servico.id, servico.tempo_estimado) for servico in self.servicos.values()]
+
+    def preco_agendado(self, servico_id, preco_id):
+        """Preço que vale para um agendamento (o vigente quando foi marcado)"""
+        if preco_id is None:
+            preco_id = self._primeira_versao.get(servico_id)
+        versao = self.precos.get(preco_id)
+        return versao[1] if versao is not None else None
+
+    def historico_precos(self, servico_id):
+        """[(vigente_desde, preco)] de um serviço, do mais antigo ao atual"""
+        return [(vigente_desde, preco) for _, (sid, preco, vigente_desde) in sorted(self.precos.items())
+                if sid == servico_id]
+
+
+class CatalogoServicos:
+    """Carrega o catálogo uma vez e só relê quando a versão no banco muda
+
+    atual() custa uma leitura de uma linha (catalogo_versao); a fotografia
+    devolvida nunca é alterada, então pode ser usada por qualquer thread.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._catalogo = None
+        self._lock = threading.Lock()
+
+    def atual(self):
+        versao = self.conn.execute("SELECT versao FROM catalogo_versao").fetchone()[0]
+        catalogo = self._catalogo
+        if catalogo is not None and catalogo.versao == versao:
+            return catalogo
+        with self._lock:
+            if self._catalogo is None or self._catalogo.versao != versao:
+                self._catalogo = self._carregar(versao)
+            return self._catalogo
+
+    def _carregar(self, versao):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT s.id, s.nome, s.descricao, s.preco, s.tempo_estimado,
+                   (SELECT MAX(p.id) FROM precos_servicos p WHERE p.servico_id = s.id)
+            FROM servicos s
+        ''')
+        servicos = [Servico._make(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT id, servico_id, preco, vigente_desde FROM precos_servicos")
+        precos = {preco_id: (servico_id, preco, vigente_desde) for preco_id, servico_id, preco, vigente_desde in cursor}
+        return Catalogo(versao, servicos, precos)
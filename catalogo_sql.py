@@ -0,0 +1,426 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from banco import conectar, preparar_banco
+from diagnostico import normalizar_sql
+from duplicados import sincronizar_chaves
+from importacao import Exportador, Importador
+from lembretes import ProcessadorLembretes, RemetenteArquivo, situacao_fila
+from manutencao import anexar_arquivo, executar_tarefa, tarefas_pendentes
+from operacoes import BackendLocal
+from relatorios import RELATORIOS
+from repositorio import Cliente, Veiculo
+from tecnicos import semana
+
+# Tabelas com pelo menos estas linhas no banco sintético não podem ser varridas por inteiro
+LINHAS_TABELA_GRANDE = 1000
+
+# Clientes do banco sintético (os demais volumes seguem as proporções do benchmark)
+CLIENTES_PADRAO = 5000
+
+# Regressão de custo: acima de base * (1 + tolerância) e de base + CUSTO_FOLGA instruções
+TOLERANCIA_PADRAO = 0.5
+CUSTO_FOLGA = 2000
+
+# Instruções da máquina virtual do SQLite entre chamadas do contador de custo
+PASSO_CUSTO = 100
+
+# Base versionada com o repositório: varreduras aceitas e custos de referência
+BASE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalogo_sql.json')
+
+# Comandos com plano de execução; os demais (DDL, PRAGMA, transações) ficam fora do catálogo
+COMANDOS_COM_PLANO = ('SELECT', 'WITH', 'INSERT', 'REPLACE', 'UPDATE', 'DELETE')
+
+# Módulos que só repassam o SQL: a origem registrada é quem os chamou
+MODULOS_INTERMEDIARIOS = (__name__, 'unidade_trabalho', 'executor_db', 'sqlite3')
+
+# Leitura da tabela inteira, direto ou em toda a extensão de um índice;
+# tabelas virtuais (json_each, FTS) e subconsultas não contam
+_VARREDURA = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$')
+_ORIGEM_TABELA = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_PALAVRAS_RESERVADAS = {'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'USING', 'ORDER', 'GROUP', 'LIMIT',
+                        'SET', 'VALUES', 'SELECT', 'DEFAULT', 'WITH', 'UNION', 'HAVING', 'AS', 'INDEXED', 'NOT'}
+
+
+class Instrucao:
+    """Comando SQL do catálogo: um exemplo de parâmetros e quem o executou"""
+
+    __slots__ = ('sql', 'parametros', 'origem', 'chamadas')
+
+    def __init__(self, sql, parametros, origem):
+        self.sql = sql
+        self.parametros = parametros
+        self.origem = origem
+        self.chamadas = 0
+
+
+class CatalogoSQL:
+    """Registro de todos os comandos SQL executados pelas conexões catalogadas
+
+    A chave é o texto normalizado: o mesmo comando com outros parâmetros
+    conta como outra chamada, não como outra instrução.
+    """
+
+    def __init__(self):
+        self.instrucoes = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, sql, parametros=()):
+        texto = normalizar_sql(sql)
+        if texto.split(' ', 1)[0].upper() not in COMANDOS_COM_PLANO:
+            return
+        with self._lock:
+            instrucao = self.instrucoes.get(texto)
+            if instrucao is None:
+                instrucao = self.instrucoes[texto] = Instrucao(texto, parametros, _origem())
+            instrucao.chamadas += 1
+
+    def __len__(self):
+        return len(self.instrucoes)
+
+    def __iter__(self):
+        return iter(sorted(self.instrucoes.values(), key=lambda instrucao: (instrucao.origem, instrucao.sql)))
+
+
+def _origem(profundidade=3):
+    """modulo.funcao de quem executou o comando"""
+    quadro = sys._getframe(profundidade)
+    while quadro is not None and quadro.f_globals.get('__name__') in MODULOS_INTERMEDIARIOS:
+        quadro = quadro.f_back
+    if quadro is None:
+        return '?'
+    return f"{quadro.f_globals.get('__name__')}.{quadro.f_code.co_name}"
+
+
+class CursorCatalogado(sqlite3.Cursor):
+    catalogo = None
+
+    def execute(self, sql, parametros=()):
+        self.catalogo.registrar(sql, parametros)
+        return super().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        sequencia = list(sequencia)
+        if sequencia:
+            self.catalogo.registrar(sql, sequencia[0])
+        return super().executemany(sql, sequencia)
+
+
+class ConexaoCatalogada(sqlite3.Connection):
+    """Conexão que registra no catálogo cada comando dos seus cursores
+
+    Usada como `factory` de sqlite3.connect, como diagnostico.ConexaoMedida.
+    """
+
+    catalogo = None
+
+    def cursor(self, factory=None):
+        if self.catalogo is None:
+            return super().cursor(factory or sqlite3.Cursor)
+        cursor = super().cursor(factory or CursorCatalogado)
+        cursor.catalogo = self.catalogo
+        return cursor
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+
+# Percurso pelas operações do sistema
+
+def percorrer(conn, pasta):
+    """Executar as operações de tela, servidor e rotinas de fundo sobre `conn`
+
+    Os ids e valores de exemplo vêm de uma conexão separada, para que só
+    o SQL do sistema entre no catálogo. Grava no banco: use uma cópia.
+    """
+    caminho = conn.execute("PRAGMA database_list").fetchone()[2]
+    apoio = conectar(caminho)
+    hoje = date.today().isoformat()
+    backend = BackendLocal(conn)
+    # Como na abertura do sistema e do servidor
+    sincronizar_chaves(conn)
+
+    # Dashboard, agenda e escala
+    backend.dados_dashboard()
+    backend.carregar_agenda()
+    backend.carregar_escala(*semana(hoje))
+    proximos = [row[0] for row in apoio.execute(
+        "SELECT id FROM agendamentos WHERE data_agendamento >= ? ORDER BY data_agendamento LIMIT 3", (hoje,))]
+    backend.agendamentos_por_id(proximos)
+    backend.atribuir_tecnicos([(proximos[0], 'Carlos')])
+    backend.escala_por_id(proximos, [])
+
+    # Lista, pesquisa e cadastro de clientes
+    pagina = backend.primeira_pagina(100)
+    backend.apos(pagina[-1].nome, pagina[-1].id, 100)
+    backend.antes(pagina[-1].nome, pagina[-1].id, 100)
+    backend.linha(pagina[0].id)
+    nome, telefone, email = apoio.execute("SELECT nome, telefone, email FROM clientes WHERE id = 1").fetchone()
+    for termo in (nome.split()[1], nome.split()[1][:2], telefone[-6:], email.split('@')[0], nome):
+        backend.invalidar_busca()
+        primeira, _ = backend.pesquisar_clientes(termo)
+        if primeira:
+            backend.pesquisar_clientes(termo, (primeira[-1].nome, primeira[-1].id))
+    backend.limpar_caches()
+    backend.ler_cliente(pagina[0].id)
+    novo = backend.salvar_cliente(Cliente(), {'nome': nome, 'telefone': telefone, 'email': email,
+                                              'data_cadastro': hoje})
+    repetido = backend.salvar_cliente(Cliente(), {'nome': nome, 'data_cadastro': hoje})
+    backend.salvar_cliente(novo, {'endereco': 'Rua do Catálogo, 1'})
+    backend.possiveis_duplicados(nome, telefone, email, novo.id)
+    backend.procurar_duplicados()
+    backend.marcar_distintos(novo.id, 1)
+    backend.mesclar_clientes(novo.id, [repetido.id])
+
+    # Veículos
+    placa, veiculo_id = apoio.execute("SELECT placa, id FROM veiculos WHERE id = 1").fetchone()
+    ficha = backend.ficha_veiculo(placa)
+    historico, _ = backend.historico_veiculo(veiculo_id)
+    if historico:
+        backend.historico_veiculo(veiculo_id, (historico[-1][0], historico[-1][1]))
+    backend.salvar_veiculo(Veiculo(), {'cliente_id': novo.id, 'marca': 'Fiat', 'modelo': 'Uno', 'placa': 'CAT1A23'})
+    backend.gravar_veiculo(ficha['veiculo']['id'], (novo.id, 'Fiat', 'Uno', 2010, placa, 1000))
+
+    # Agendamentos, ordens de serviço e estoque
+    servico_id = backend.listar_servicos()[0][0]
+    agendamento_id = backend.gravar_agendamento((novo.id, servico_id, hoje, '08:00', ''))
+    ordem_id = backend.abrir_ordem(agendamento_id, 'Carlos')
+    peca_id = backend.cadastrar_peca('CAT-1', 'Filtro de óleo', 35.0, 10, 5)
+    backend.repor_estoque(peca_id, 2)
+    item_id = backend.adicionar_peca(ordem_id, peca_id, 2)
+    backend.adicionar_mao_de_obra(ordem_id, 'Diagnóstico', 0.5, 120.0)
+    backend.alterar_quantidade(item_id, 3)
+    backend.remover_item(item_id)
+    backend.ler_ordem(ordem_id)
+    backend.pecas_em_falta()
+    backend.concluir_ordem(ordem_id)
+    backend.abrir_ordem(proximos[1])
+    backend.fechar_dia(hoje)
+    backend.apagar_cliente(repetido.id)
+    conn.commit()
+
+    # Registro de alterações
+    backend.alteracoes_desde(max(0, backend.ultima_sequencia() - 50), 500)
+
+    # Relatórios, importação e exportação
+    for tipo in RELATORIOS:
+        backend.relatorio_tela(tipo)
+    backend.exportar_relatorio('mes', os.path.join(pasta, 'relatorio.csv'))
+    for tabela in ('clientes', 'veiculos'):
+        arquivo = os.path.join(pasta, f'{tabela}.jsonl')
+        Exportador(conn, tabela, arquivo).exportar_tudo()
+        # Importar só o começo: os clientes entram com ids novos e o resto do
+        # percurso não deve ver a tabela dobrada
+        amostra = os.path.join(pasta, f'{tabela}_amostra.jsonl')
+        with open(arquivo, encoding='utf-8') as origem, open(amostra, 'w', encoding='utf-8') as destino:
+            destino.writelines(islice(origem, 100))
+        Importador(conn, tabela, amostra).importar_tudo()
+
+    # Rotinas de fundo: lembretes e manutenção
+    lembretes = ProcessadorLembretes(caminho, RemetenteArquivo(os.path.join(pasta, 'lembretes.jsonl')),
+                                     envios_por_minuto=10 ** 6)
+    lembretes.rodada(conn)
+    situacao_fila(conn)
+    tarefas_pendentes(conn)
+    for tarefa in ('sincronizar_chaves', 'completar_resumos', 'arquivar', 'podar_alteracoes', 'otimizar'):
+        executar_tarefa(conn, tarefa)
+    antigo = apoio.execute("SELECT veiculo_id FROM agendamentos WHERE data_agendamento < ? LIMIT 1",
+                           ((date.today() - timedelta(days=400)).isoformat(),)).fetchone()
+    backend.historico_arquivado(antigo[0] if antigo else veiculo_id)
+    apoio.close()
+
+
+# Planos e custos
+
+def tabelas_citadas(sql):
+    """{nome ou apelido: tabela} das tabelas do comando"""
+    tabelas = {}
+    for tabela, apelido in _ORIGEM_TABELA.findall(sql):
+        tabelas[tabela] = tabela
+        if apelido and apelido.upper() not in _PALAVRAS_RESERVADAS:
+            tabelas[apelido] = tabela
+    return tabelas
+
+
+def plano(conn, instrucao):
+    """Linhas de EXPLAIN QUERY PLAN do comando com os parâmetros de exemplo"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {instrucao.sql}", instrucao.parametros)]
+
+
+def varreduras(instrucao, detalhes, linhas_por_tabela, limite=LINHAS_TABELA_GRANDE):
+    """Tabelas grandes lidas por inteiro
+
+    Inclui a leitura de um índice inteiro: com LIMIT pode ser o plano
+    certo (primeira página da lista), e então fica aceita na base.
+    """
+    tabelas = tabelas_citadas(instrucao.sql)
+    encontradas = set()
+    for detalhe in detalhes:
+        varredura = _VARREDURA.match(detalhe)
+        if varredura is None:
+            continue
+        tabela = tabelas.get(varredura.group(1), varredura.group(1))
+        if linhas_por_tabela.get(tabela, 0) >= limite:
+            encontradas.add(tabela)
+    return sorted(encontradas)
+
+
+def custo(conn, instrucao):
+    """Instruções da máquina virtual gastas pelo comando (incluindo triggers)
+
+    Gravações rodam em um savepoint desfeito em seguida. Ao contrário do
+    tempo, a contagem não depende da carga da máquina: serve de base.
+    """
+    passos = 0
+
+    def contar():
+        nonlocal passos
+        passos += 1
+        return 0
+
+    conn.execute("SAVEPOINT catalogo_custo")
+    conn.set_progress_handler(contar, PASSO_CUSTO)
+    try:
+        conn.execute(instrucao.sql, instrucao.parametros).fetchall()
+    finally:
+        conn.set_progress_handler(None, 0)
+        conn.execute("ROLLBACK TO catalogo_custo")
+        conn.execute("RELEASE catalogo_custo")
+    return passos * PASSO_CUSTO
+
+
+def _contar_linhas(conn):
+    tabelas = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    contagens = {}
+    for tabela in tabelas:
+        try:
+            contagens[tabela] = conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+        except sqlite3.Error:
+            # Tabelas-sombra de índices FTS não aceitam contagem direta em todas as versões
+            continue
+    return contagens
+
+
+def analisar(caminho, catalogo):
+    """{sql: {origem, chamadas, plano, varreduras, custo}} das instruções do catálogo"""
+    conn = conectar(caminho)
+    linhas_por_tabela = _contar_linhas(conn)
+    resultado = {}
+    with anexar_arquivo(conn):
+        for instrucao in catalogo:
+            dados = {'origem': instrucao.origem, 'chamadas': instrucao.chamadas}
+            try:
+                detalhes = plano(conn, instrucao)
+                dados['plano'] = detalhes
+                dados['varreduras'] = varreduras(instrucao, detalhes, linhas_por_tabela)
+                dados['custo'] = custo(conn, instrucao)
+            except sqlite3.Error as e:
+                # Ex.: o exemplo gravado já não é válido (chave única usada pela própria execução)
+                dados.setdefault('varreduras', [])
+                dados['erro'] = str(e)
+            resultado[instrucao.sql] = dados
+    conn.close()
+    return resultado
+
+
+def comparar(atual, base, tolerancia=TOLERANCIA_PADRAO):
+    """Problemas de `atual` em relação à base: varreduras e custos novos
+
+    Uma varredura de tabela grande só é aceita se a base já a registrava
+    para o mesmo comando; sem base, todas são problemas.
+    """
+    problemas = []
+    for sql, dados in atual.items():
+        anterior = base.get(sql, {})
+        novas = sorted(set(dados['varreduras']) - set(anterior.get('varreduras', ())))
+        if novas:
+            problemas.append({'tipo': 'varredura', 'sql': sql, 'origem': dados['origem'],
+                              'tabelas': novas, 'plano': dados.get('plano', [])})
+        custo_base = anterior.get('custo')
+        custo_atual = dados.get('custo')
+        if custo_base is not None and custo_atual is not None and \
+                custo_atual > custo_base * (1 + tolerancia) and custo_atual > custo_base + CUSTO_FOLGA:
+            problemas.append({'tipo': 'custo', 'sql': sql, 'origem': dados['origem'],
+                              'base': custo_base, 'atual': custo_atual})
+    return problemas
+
+
+def montar_catalogo(caminho, clientes=CLIENTES_PADRAO):
+    """Gerar (se preciso) o banco sintético em `caminho`, percorrer o sistema e analisar"""
+    # Gerador de dados do benchmark, carregado só aqui
+    from benchmark import gerar_dados
+
+    conn = conectar(caminho)
+    preparar_banco(conn)
+    if conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0] == 0:
+        gerar_dados(conn, clientes, anos=1)
+    conn.close()
+
+    catalogo = CatalogoSQL()
+    conn = conectar(caminho, factory=ConexaoCatalogada)
+    conn.catalogo = catalogo
+    with tempfile.TemporaryDirectory() as pasta:
+        try:
+            percorrer(conn, pasta)
+        finally:
+            conn.close()
+    return analisar(caminho, catalogo)
+
+
+def main():
+    """Linha de comando: catálogo do SQL do sistema e verificação dos planos contra a base"""
+    parser = argparse.ArgumentParser(description="Planos de execução de todos os comandos SQL do sistema")
+    parser.add_argument('--clientes', type=int, default=CLIENTES_PADRAO, help="clientes do banco sintético")
+    parser.add_argument('--banco', help="banco sintético a usar/gerar (padrão: temporário); é alterado")
+    parser.add_argument('--base', default=BASE_PADRAO, help="JSON de base gravado antes com --gravar ('' para nenhuma)")
+    parser.add_argument('--gravar', help="gravar o catálogo atual como base neste arquivo")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = args.banco or os.path.join(pasta, 'catalogo.db')
+        atual = montar_catalogo(caminho, args.clientes)
+
+    base = {}
+    if args.base and os.path.exists(args.base):
+        with open(args.base, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)['instrucoes']
+    problemas = comparar(atual, base, args.tolerancia)
+
+    if args.gravar:
+        with open(args.gravar, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'gerado_em': datetime.now().isoformat(timespec='seconds'),
+                'sqlite': sqlite3.sqlite_version,
+                'clientes': args.clientes,
+                'instrucoes': atual,
+            }, arquivo, ensure_ascii=False, indent=2)
+            arquivo.write('\n')
+
+    novas = sorted(set(atual) - set(base)) if base else []
+    print(f"{len(atual)} comandos no catálogo, {len(novas)} novos em relação à base, {len(problemas)} problemas")
+    for sql in novas:
+        print(f"  novo: [{atual[sql]['origem']}] {sql[:120]}")
+    for problema in problemas:
+        if problema['tipo'] == 'varredura':
+            print(f"  VARREDURA de {', '.join(problema['tabelas'])} [{problema['origem']}]: {problema['sql'][:160]}")
+        else:
+            print(f"  CUSTO {problema['base']} -> {problema['atual']} [{problema['origem']}]: {problema['sql'][:160]}")
+    sys.exit(1 if problemas and not args.gravar else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
-```python
 import os
 
 # Configurações do sistema
-DATABASE_PATH = os.path.join('database', 'oficina.db')
+# Banco único usado pela interface e pelos scripts, relativo à pasta do projeto
+DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'oficina.db')
 SERVICOS_PADRAO = [
     ('Troca de Óleo', 'Troca de óleo e filtro', 120.0, 60),
     ('Alinhamento', 'Alinhamento e balanceamento', 80.0, 90),
@@ -12,3 +12,29 @@ SERVICOS_PADRAO = [
     ('Troca de Correia', 'Troca de correia dentada', 300.0, 180),
     ('Revisão Elétrica', 'Verificação do sistema elétrico', 150.0, 120)
 ]
+
+# Expediente da oficina usado pela agenda
+HORARIO_ABERTURA = '08:00'
+HORARIO_FECHAMENTO = '18:00'
+DIAS_FUNCIONAMENTO = (0, 1, 2, 3, 4, 5)  # segunda a sábado
+NUMERO_BOXES = 3
+INTERVALO_AGENDA_MIN = 15
+# Técnicos da oficina; os que aparecem em ordens de serviço recentes entram automaticamente
+TECNICOS = ()
+
+# Manutenção: backups guardados e idade (dias) a partir da qual agendamentos
+# encerrados e suas ordens de serviço vão para o banco de arquivados
+BACKUPS_MANTIDOS = 7
+IDADE_ARQUIVAMENTO_DIAS = 730
+
+# Lembretes: antecedência do envio (horas), envios por minuto e tolerância
+# (minutos após o horário) para um agendamento passar a "Não Compareceu"
+ANTECEDENCIA_LEMBRETE_H = 24
+ENVIOS_POR_MINUTO = 30
+TOLERANCIA_FALTA_MIN = 60
+
+# Modo multiestação: servidor que centraliza o banco (servidor.py)
+SERVIDOR_HOST = '127.0.0.1'
+SERVIDOR_PORTA = 8765
+# Endereço do servidor usado pela interface; vazio = banco local
+SERVIDOR_URL = os.environ.get('OFICINA_SERVIDOR', '')
@@ -0,0 +1,304 @@
+import cProfile
+import io
+import json
+import pstats
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Amostras guardadas por medição para o cálculo dos percentis
+AMOSTRAS_MAXIMAS = 1000
+
+# Verificação do loop do Tk: intervalo da sondagem e atraso que conta como travamento (ms)
+INTERVALO_LOOP_MS = 50
+LIMITE_TRAVAMENTO_MS = 150
+
+# Travamentos guardados para exibição
+TRAVAMENTOS_MAXIMOS = 200
+
+# Funções listadas no relatório do perfil
+LINHAS_PERFIL = 40
+
+# Categorias de medição
+SQL = 'sql'
+INTERVALO = 'intervalo'
+EXECUTOR = 'executor'
+CALLBACK = 'callback'
+LOOP_TK = 'loop_tk'
+
+
+def normalizar_sql(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+class Estatistica:
+    """Contagem, tempo total, linhas e amostras recentes de uma medição"""
+
+    __slots__ = ('chamadas', 'total_ms', 'maximo_ms', 'linhas', 'amostras')
+
+    def __init__(self):
+        self.chamadas = 0
+        self.total_ms = 0.0
+        self.maximo_ms = 0.0
+        self.linhas = 0
+        self.amostras = deque(maxlen=AMOSTRAS_MAXIMAS)
+
+    def adicionar(self, ms, linhas=0):
+        self.chamadas += 1
+        self.total_ms += ms
+        self.linhas += linhas
+        if ms > self.maximo_ms:
+            self.maximo_ms = ms
+        self.amostras.append(ms)
+
+    def como_dict(self):
+        ordenadas = sorted(self.amostras)
+        return {
+            'chamadas': self.chamadas,
+            'total_ms': round(self.total_ms, 3),
+            'p50_ms': round(_percentil(ordenadas, 50), 3),
+            'p95_ms': round(_percentil(ordenadas, 95), 3),
+            'p99_ms': round(_percentil(ordenadas, 99), 3),
+            'maximo_ms': round(self.maximo_ms, 3),
+            'linhas': self.linhas,
+        }
+
+
+class Medidor:
+    """Medições agrupadas por categoria e nome, de qualquer thread"""
+
+    def __init__(self):
+        self._medicoes = {}
+        self._lock = threading.Lock()
+        self.travamentos = deque(maxlen=TRAVAMENTOS_MAXIMOS)
+
+    def registrar(self, categoria, nome, ms, linhas=0):
+        with self._lock:
+            estatistica = self._medicoes.get((categoria, nome))
+            if estatistica is None:
+                estatistica = self._medicoes[(categoria, nome)] = Estatistica()
+            estatistica.adicionar(ms, linhas)
+
+    @contextmanager
+    def intervalo(self, nome):
+        """Medir o bloco de código como um intervalo nomeado"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(INTERVALO, nome, (time.perf_counter() - inicio) * 1000)
+
+    def cronometrar(self, nome, callback=None):
+        """Callback que registra o tempo desde agora até o fim da sua execução
+
+        Para operações assíncronas: o pedido sai agora e a tela é preenchida
+        quando o executor entrega o resultado.
+        """
+        inicio = time.perf_counter()
+
+        def concluir(*args):
+            try:
+                if callback is not None:
+                    return callback(*args)
+            finally:
+                self.registrar(INTERVALO, nome, (time.perf_counter() - inicio) * 1000)
+        return concluir
+
+    def registrar_travamento(self, ms):
+        with self._lock:
+            self.travamentos.append((datetime.now().isoformat(timespec='seconds'), round(ms, 1)))
+
+    def resumo(self):
+        """Lista de (categoria, nome, dict da estatística), mais lentos primeiro"""
+        with self._lock:
+            itens = [(categoria, nome, estatistica.como_dict())
+                     for (categoria, nome), estatistica in self._medicoes.items()]
+        itens.sort(key=lambda item: item[2]['total_ms'], reverse=True)
+        return itens
+
+    def zerar(self):
+        with self._lock:
+            self._medicoes.clear()
+            self.travamentos.clear()
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mede cada comando, incluindo a leitura das linhas"""
+
+    medidor = None
+    _nome = None
+    _ms = 0.0
+    _linhas = 0
+
+    def _encerrar(self):
+        if self._nome is not None:
+            self.medidor.registrar(SQL, self._nome, self._ms, self._linhas)
+            self._nome = None
+
+    def _medir(self, metodo, sql, *args):
+        self._encerrar()
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, sql, *args)
+        finally:
+            self._nome = normalizar_sql(sql)
+            self._ms = (time.perf_counter() - inicio) * 1000
+            self._linhas = 0
+
+    def execute(self, sql, *args):
+        return self._medir(sqlite3.Cursor.execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._medir(sqlite3.Cursor.executemany, sql, *args)
+
+    def _ler(self, metodo, *args):
+        inicio = time.perf_counter()
+        resultado = metodo(self, *args)
+        self._ms += (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def fetchone(self):
+        row = self._ler(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._encerrar()
+        else:
+            self._linhas += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._ler(sqlite3.Cursor.fetchmany, *args)
+        self._linhas += len(rows)
+        if not rows:
+            self._encerrar()
+        return rows
+
+    def fetchall(self):
+        rows = self._ler(sqlite3.Cursor.fetchall)
+        self._linhas += len(rows)
+        self._encerrar()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._ler(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._encerrar()
+            raise
+        self._linhas += 1
+        return row
+
+    def close(self):
+        self._encerrar()
+        super().close()
+
+    def __del__(self):
+        if self._nome is not None and self.medidor is not None:
+            self._encerrar()
+
+
+class ConexaoMedida(sqlite3.Connection):
+    """Conexão cujos cursores registram tempo e linhas por comando SQL
+
+    Usada como `factory` de sqlite3.connect; sem medidor atribuído os
+    cursores são os comuns.
+    """
+
+    medidor = None
+
+    def cursor(self, factory=None):
+        if self.medidor is None:
+            return super().cursor(factory or sqlite3.Cursor)
+        cursor = super().cursor(factory or CursorMedido)
+        cursor.medidor = self.medidor
+        return cursor
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+
+class DetectorTravamentos:
+    """Mede o atraso do loop do Tk e registra os travamentos
+
+    Uma chamada agendada a cada INTERVALO_LOOP_MS compara a hora em que
+    rodou com a esperada; a diferença é o tempo em que o loop ficou preso.
+    """
+
+    def __init__(self, root, medidor, intervalo=INTERVALO_LOOP_MS, limite=LIMITE_TRAVAMENTO_MS):
+        self.root = root
+        self.medidor = medidor
+        self.intervalo = intervalo
+        self.limite = limite
+        self._agendada = None
+        self._esperado = None
+
+    def iniciar(self):
+        self._esperado = time.perf_counter() + self.intervalo / 1000
+        self._agendada = self.root.after(self.intervalo, self._verificar)
+
+    def _verificar(self):
+        atraso = max(0.0, (time.perf_counter() - self._esperado) * 1000)
+        self.medidor.registrar(LOOP_TK, 'atraso', atraso)
+        if atraso >= self.limite:
+            self.medidor.registrar_travamento(atraso)
+        self.iniciar()
+
+    def parar(self):
+        if self._agendada is not None:
+            self.root.after_cancel(self._agendada)
+            self._agendada = None
+
+
+class Perfilador:
+    """Captura do cProfile ligada e desligada em tempo de execução
+
+    Mede só a thread que a ligou (a do Tk); o tempo gasto no banco
+    aparece nas medições do executor e do SQL.
+    """
+
+    def __init__(self):
+        self._perfil = None
+        self.relatorio = ''
+
+    @property
+    def ativo(self):
+        return self._perfil is not None
+
+    def alternar(self):
+        """Ligar ou desligar a captura; retorna se ficou ligada"""
+        if self._perfil is None:
+            self._perfil = cProfile.Profile()
+            self._perfil.enable()
+            return True
+        self._perfil.disable()
+        saida = io.StringIO()
+        pstats.Stats(self._perfil, stream=saida).sort_stats('cumulative').print_stats(LINHAS_PERFIL)
+        self.relatorio = saida.getvalue()
+        self._perfil = None
+        return False
+
+
+def exportar_diagnostico(caminho, medidor, perfilador=None, extras=None):
+    """Gravar medições, travamentos e o último perfil em JSON"""
+    dados = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'medicoes': [dict(categoria=categoria, nome=nome, **valores)
+                     for categoria, nome, valores in medidor.resumo()],
+        'travamentos': [{'momento': momento, 'ms': ms} for momento, ms in medidor.travamentos],
+        'perfil': perfilador.relatorio if perfilador is not None else '',
+    }
+    dados.update(extras or {})
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, ensure_ascii=False, indent=2)
@@ -0,0 +1,396 @@
+import json
+import re
+import unicodedata
+
+from notificacoes import ultima_sequencia
+
+# Pontuação a partir da qual dois cadastros são apresentados como duplicados
+LIMIAR_DUPLICADO = 0.8
+
+# Durante a digitação basta um nome parecido para avisar
+LIMIAR_AVISO = 0.75
+
+# Grupos de bloqueio maiores que isto (nomes muito comuns, telefone
+# genérico) não geram pares: seriam comparações demais e pouco úteis
+BLOCO_MAXIMO = 30
+
+# Pares devolvidos por busca e sugestões durante a digitação
+LIMITE_PARES = 500
+LIMITE_SUGESTOES = 3
+
+# Clientes lidos por lote ao reconstruir as chaves
+LOTE_CHAVES = 5000
+
+# Partículas ignoradas na comparação de nomes
+PARTICULAS = frozenset(('da', 'das', 'de', 'di', 'do', 'dos', 'du', 'e'))
+
+# Grafias de mesmo som, aplicadas em ordem na chave fonética
+SUBSTITUICOES_FONETICAS = (
+    (r'ç', 's'), (r'ph', 'f'), (r'th', 't'), (r'sch', 'x'), (r'[cs]h', 'x'), (r'lh', 'l'), (r'nh', 'n'),
+    (r'qu', 'k'), (r'gu(?=[ei])', 'g'), (r'sc(?=[ei])', 's'), (r'c(?=[ei])', 's'), (r'g(?=[ei])', 'j'),
+    (r'c', 'k'), (r'y', 'i'), (r'w', 'v'), (r'z', 's'), (r'h', ''), (r'm$', 'n'),
+)
+
+
+def criar_chaves_duplicados(conn):
+    """Criar as chaves de bloqueio de clientes e os pares marcados como distintos
+
+    As chaves são calculadas em Python (normalização e fonética) e
+    acompanham os clientes pelo registro de alterações; -1 na marca
+    pede a reconstrução completa no primeiro uso.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clientes_chaves (
+            chave TEXT NOT NULL,
+            cliente_id INTEGER NOT NULL,
+            PRIMARY KEY (chave, cliente_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_chaves_cliente ON clientes_chaves (cliente_id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chaves_controle (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultima_seq INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO chaves_controle (id, ultima_seq) VALUES (1, -1)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clientes_distintos (
+            cliente_a INTEGER NOT NULL,
+            cliente_b INTEGER NOT NULL,
+            PRIMARY KEY (cliente_a, cliente_b)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+
+# Normalização
+
+def _sem_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+
+def normalizar_nome(nome):
+    """Nome em minúsculas, sem acentos, pontuação nem partículas"""
+    palavras = re.sub(r'[^a-z ]', ' ', _sem_acentos((nome or '').lower())).split()
+    return ' '.join(palavra for palavra in palavras if palavra not in PARTICULAS)
+
+
+def normalizar_telefone(telefone):
+    """Últimos 8 dígitos do telefone (ignora DDD, DDI e o nono dígito), ou ''"""
+    digitos = re.sub(r'\D', '', telefone or '')
+    return digitos[-8:] if len(digitos) >= 8 and len(set(digitos[-8:])) > 1 else ''
+
+
+def normalizar_email(email):
+    """E-mail em minúsculas, sem o sufixo +etiqueta, ou ''"""
+    email = (email or '').strip().lower()
+    if '@' not in email:
+        return ''
+    usuario, dominio = email.rsplit('@', 1)
+    return f"{usuario.split('+', 1)[0]}@{dominio}"
+
+
+def chave_fonetica(palavra):
+    """Código fonético simplificado do português (Luiz/Luis, Souza/Sousa, Thiago/Tiago)"""
+    palavra = palavra.lower()
+    for padrao, troca in SUBSTITUICOES_FONETICAS:
+        palavra = re.sub(padrao, troca, palavra)
+    palavra = re.sub(r'[^a-z]', '', _sem_acentos(palavra))
+    if not palavra:
+        return ''
+    codigo = palavra[0] + re.sub(r'[aeiou]', '', palavra[1:])
+    return re.sub(r'(.)\1+', r'\1', codigo)
+
+
+def chaves_cliente(nome, telefone, email):
+    """Chaves de bloqueio de um cadastro: telefone, e-mail e primeiro+último nome fonéticos"""
+    chaves = set()
+    telefone = normalizar_telefone(telefone)
+    if telefone:
+        chaves.add('tel:' + telefone)
+    email = normalizar_email(email)
+    if email:
+        chaves.add('email:' + email)
+    palavras = normalizar_nome(nome).split()
+    if palavras:
+        extremos = (palavras[0], palavras[-1]) if len(palavras) > 1 else palavras
+        chaves.add('nome:' + ' '.join(chave_fonetica(palavra) for palavra in extremos))
+    return chaves
+
+
+# Semelhança
+
+def jaro_winkler(a, b):
+    """Semelhança de Jaro-Winkler entre duas strings (0 a 1)"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    alcance = max(len(a), len(b)) // 2 - 1
+    usados_b = [False] * len(b)
+    casados_a = []
+    for i, letra in enumerate(a):
+        for j in range(max(0, i - alcance), min(len(b), i + alcance + 1)):
+            if not usados_b[j] and b[j] == letra:
+                usados_b[j] = True
+                casados_a.append(letra)
+                break
+    if not casados_a:
+        return 0.0
+    casados_b = [letra for letra, usado in zip(b, usados_b) if usado]
+    transposicoes = sum(x != y for x, y in zip(casados_a, casados_b)) / 2
+    m = len(casados_a)
+    jaro = (m / len(a) + m / len(b) + (m - transposicoes) / m) / 3
+    prefixo = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefixo += 1
+    return jaro + prefixo * 0.1 * (1 - jaro)
+
+
+def normalizar(nome, telefone, email):
+    """(nome, telefone, email) normalizados para a pontuação"""
+    return normalizar_nome(nome), normalizar_telefone(telefone), normalizar_email(email)
+
+
+def pontuar(normalizado_a, normalizado_b, limiar=0.0):
+    """Pontuação de duplicidade de dois cadastros já normalizados
+
+    O nome pesa 60%; o contato 40%: cheio quando telefone ou e-mail
+    coincidem, metade quando falta informação em um dos lados e zero
+    quando os dois têm contato e nada coincide (homônimos). Retorna 0
+    sem comparar os nomes quando o contato já impede chegar ao limiar.
+    """
+    nome_a, telefone_a, email_a = normalizado_a
+    nome_b, telefone_b, email_b = normalizado_b
+    if (telefone_a and telefone_a == telefone_b) or (email_a and email_a == email_b):
+        contato = 1.0
+    elif (telefone_a and telefone_b) or (email_a and email_b):
+        contato = 0.0
+    else:
+        contato = 0.5
+    if 0.6 + 0.4 * contato < limiar:
+        return 0.0
+    return round(0.6 * jaro_winkler(nome_a, nome_b) + 0.4 * contato, 3)
+
+
+# Chaves persistidas
+
+def _gravar_chaves(conn, clientes):
+    conn.executemany(
+        "INSERT OR IGNORE INTO clientes_chaves (chave, cliente_id) VALUES (?, ?)",
+        ((chave, cliente_id) for cliente_id, nome, telefone, email in clientes
+         for chave in chaves_cliente(nome, telefone, email))
+    )
+
+
+def _marca_coberta(conn):
+    """Marca da última sincronização das chaves, ou None se o registro de
+    alterações não cobre mais o intervalo (podado, ou nunca sincronizado)"""
+    cursor = conn.cursor()
+    marca = cursor.execute("SELECT ultima_seq FROM chaves_controle WHERE id = 1").fetchone()[0]
+    menor = cursor.execute("SELECT MIN(seq) FROM alteracoes").fetchone()[0]
+    if marca < 0 or (menor is not None and menor > marca + 1):
+        return None
+    return marca
+
+
+def sincronizar_chaves(conn):
+    """Atualizar as chaves dos clientes alterados desde a última sincronização
+
+    Usa o registro de alterações; se ele já foi podado além da marca (ou
+    na primeira vez) todas as chaves são recalculadas. Roda como tarefa de
+    fundo (manutenção e thread de escrita do servidor), nunca durante a
+    digitação. Faz commit; retorna quantos clientes foram processados.
+    """
+    cursor = conn.cursor()
+    ate = ultima_sequencia(conn)
+    marca = _marca_coberta(conn)
+    if marca == ate:
+        return 0
+
+    if marca is None:
+        cursor.execute("DELETE FROM clientes_chaves")
+        processados = 0
+        ultimo_id = 0
+        while True:
+            lote = cursor.execute(
+                "SELECT id, nome, telefone, email FROM clientes WHERE id > ? ORDER BY id LIMIT ?",
+                (ultimo_id, LOTE_CHAVES)
+            ).fetchall()
+            if not lote:
+                break
+            _gravar_chaves(conn, lote)
+            processados += len(lote)
+            ultimo_id = lote[-1][0]
+    else:
+        ids = [row[0] for row in cursor.execute(
+            "SELECT DISTINCT registro_id FROM alteracoes WHERE seq > ? AND seq <= ? AND tabela = 'clientes'",
+            (marca, ate)
+        )]
+        lista = json.dumps(ids)
+        cursor.execute("DELETE FROM clientes_chaves WHERE cliente_id IN (SELECT value FROM json_each(?))", (lista,))
+        _gravar_chaves(conn, cursor.execute(
+            "SELECT id, nome, telefone, email FROM clientes WHERE id IN (SELECT value FROM json_each(?))", (lista,)
+        ).fetchall())
+        processados = len(ids)
+
+    cursor.execute("UPDATE chaves_controle SET ultima_seq = ? WHERE id = 1", (ate,))
+    conn.commit()
+    return processados
+
+
+def _clientes_por_id(conn, ids):
+    cursor = conn.execute(
+        "SELECT id, nome, telefone, email FROM clientes WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(ids)),)
+    )
+    return {row[0]: row for row in cursor}
+
+
+def procurar_duplicados(conn, limiar=LIMIAR_DUPLICADO, limite=LIMITE_PARES):
+    """Pares prováveis de duplicados como (pontuacao, cliente_a, cliente_b)
+
+    Só são comparados clientes que compartilham alguma chave de bloqueio,
+    em grupos de até BLOCO_MAXIMO; pares marcados como distintos ficam de
+    fora. Cada cliente é (id, nome, telefone, email); os mais prováveis
+    vêm primeiro.
+    """
+    sincronizar_chaves(conn)
+    cursor = conn.cursor()
+    cursor.execute('''
+        WITH blocos AS (
+            SELECT chave FROM clientes_chaves GROUP BY chave HAVING COUNT(*) BETWEEN 2 AND ?
+        )
+        SELECT DISTINCT a.cliente_id, b.cliente_id
+        FROM blocos
+        JOIN clientes_chaves a ON a.chave = blocos.chave
+        JOIN clientes_chaves b ON b.chave = blocos.chave AND b.cliente_id > a.cliente_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM clientes_distintos d WHERE d.cliente_a = a.cliente_id AND d.cliente_b = b.cliente_id
+        )
+    ''', (BLOCO_MAXIMO,))
+    pares = cursor.fetchall()
+    clientes = _clientes_por_id(conn, {cliente_id for par in pares for cliente_id in par})
+    normalizados = {cliente_id: normalizar(*cliente[1:]) for cliente_id, cliente in clientes.items()}
+
+    resultado = []
+    for id_a, id_b in pares:
+        if id_a not in clientes or id_b not in clientes:
+            continue
+        pontuacao = pontuar(normalizados[id_a], normalizados[id_b], limiar)
+        if pontuacao >= limiar:
+            resultado.append((pontuacao, clientes[id_a], clientes[id_b]))
+    resultado.sort(key=lambda par: (-par[0], par[1][0], par[2][0]))
+    return resultado[:limite]
+
+
+def _alterados_pendentes(conn):
+    """Clientes alterados desde a última sincronização das chaves
+
+    Vazio se o registro não cobre o intervalo ou se são mais de
+    LOTE_CHAVES: até a tarefa de fundo rodar, valem as chaves gravadas.
+    """
+    marca = _marca_coberta(conn)
+    if marca is None:
+        return set()
+    ids = {row[0] for row in conn.execute(
+        "SELECT DISTINCT registro_id FROM alteracoes WHERE seq > ? AND tabela = 'clientes' LIMIT ?",
+        (marca, LOTE_CHAVES + 1)
+    )}
+    return ids if len(ids) <= LOTE_CHAVES else set()
+
+
+def possiveis_duplicados(conn, nome, telefone, email, ignorar_id=None, limiar=LIMIAR_AVISO):
+    """Clientes já cadastrados parecidos com os dados digitados
+
+    Retorna [(pontuacao, (id, nome, telefone, email))], mais prováveis
+    primeiro. Só lê o banco: roda a cada tecla, no pool de leitura do
+    servidor.
+    """
+    chaves = chaves_cliente(nome, telefone, email)
+    if not chaves:
+        return []
+    ids = set()
+    for chave in chaves:
+        bloco = [row[0] for row in conn.execute(
+            "SELECT cliente_id FROM clientes_chaves WHERE chave = ? LIMIT ?", (chave, BLOCO_MAXIMO + 1))]
+        # Mesmo critério de procurar_duplicados: grupo grande demais não diz nada
+        if len(bloco) <= BLOCO_MAXIMO:
+            ids.update(bloco)
+
+    # Só leitura: os clientes alterados depois da última sincronização
+    # valem pelas chaves calculadas agora, não pelas gravadas
+    alterados = _alterados_pendentes(conn)
+    ids.difference_update(alterados)
+    candidatos = _clientes_por_id(conn, ids)
+    for cliente_id, cliente in _clientes_por_id(conn, alterados).items():
+        if chaves & chaves_cliente(*cliente[1:]):
+            candidatos[cliente_id] = cliente
+    candidatos.pop(ignorar_id, None)
+
+    digitado = normalizar(nome, telefone, email)
+    sugestoes = []
+    for cliente in candidatos.values():
+        pontuacao = pontuar(digitado, normalizar(*cliente[1:]), limiar)
+        if pontuacao >= limiar:
+            sugestoes.append((pontuacao, cliente))
+    sugestoes.sort(key=lambda sugestao: -sugestao[0])
+    return sugestoes[:LIMITE_SUGESTOES]
+
+
+def marcar_distintos(conn, cliente_a, cliente_b):
+    """Registrar que dois cadastros parecidos são pessoas diferentes (sem commit)"""
+    conn.execute("INSERT OR IGNORE INTO clientes_distintos (cliente_a, cliente_b) VALUES (?, ?)",
+                 (min(cliente_a, cliente_b), max(cliente_a, cliente_b)))
+
+
+def mesclar_clientes(conn, manter_id, remover_ids):
+    """Juntar cadastros duplicados em `manter_id` (sem commit)
+
+    Veículos e agendamentos passam em bloco para o cadastro mantido, que
+    herda telefone, e-mail e endereço que não tinha; os triggers de
+    relatorios movem o faturamento agregado das ordens desses
+    agendamentos. Os demais cadastros são apagados. Agendamentos no
+    banco de arquivados mantêm o id antigo, mas o faturamento deles
+    também passa para o cadastro mantido.
+    """
+    remover = json.dumps([cliente_id for cliente_id in remover_ids if cliente_id != manter_id])
+    selecionados = "(SELECT value FROM json_each(?))"
+    cursor = conn.cursor()
+    if cursor.execute("SELECT 1 FROM clientes WHERE id = ?", (manter_id,)).fetchone() is None:
+        raise LookupError("Cliente não encontrado")
+
+    for campo in ('telefone', 'email', 'endereco'):
+        cursor.execute(f'''
+            UPDATE clientes SET {campo} = (
+                SELECT {campo} FROM clientes WHERE id IN {selecionados} AND COALESCE({campo}, '') <> ''
+                ORDER BY id LIMIT 1
+            )
+            WHERE id = ? AND COALESCE({campo}, '') = ''
+        ''', (remover, manter_id))
+    veiculos = cursor.execute(f"UPDATE veiculos SET cliente_id = ? WHERE cliente_id IN {selecionados}",
+                              (manter_id, remover)).rowcount
+    agendamentos = cursor.execute(f"UPDATE agendamentos SET cliente_id = ? WHERE cliente_id IN {selecionados}",
+                                  (manter_id, remover)).rowcount
+    # Sobra nas chaves removidas só o faturamento de ordens arquivadas, cujos
+    # agendamentos estão fora do alcance dos triggers
+    cursor.execute(f'''
+        INSERT INTO rel_faturamento_cliente (mes, cliente_id, ordens, faturamento)
+        SELECT mes, ?, SUM(ordens), SUM(faturamento) FROM rel_faturamento_cliente
+        WHERE cliente_id IN {selecionados} GROUP BY mes
+        ON CONFLICT (mes, cliente_id) DO UPDATE SET
+            ordens = ordens + excluded.ordens,
+            faturamento = faturamento + excluded.faturamento
+    ''', (manter_id, remover))
+    cursor.execute(f"DELETE FROM rel_faturamento_cliente WHERE cliente_id IN {selecionados}", (remover,))
+    # Veículos importados depois da mesclagem vão para o cadastro mantido
+    cursor.execute(f"UPDATE clientes_importados SET cliente_id = ? WHERE cliente_id IN {selecionados}",
+                   (manter_id, remover))
+    cursor.execute(f"DELETE FROM clientes_distintos WHERE cliente_a IN {selecionados} OR cliente_b IN {selecionados}",
+                   (remover, remover))
+    cursor.execute(f"DELETE FROM clientes WHERE id IN {selecionados}", (remover,))
+    return veiculos, agendamentos
@@ -0,0 +1,159 @@
+from datetime import date
+
+STATUS_EM_ANDAMENTO = 'Em Andamento'
+STATUS_CONCLUIDO = 'Concluído'
+
+
+def criar_resumo_diario(conn):
+    """Criar tabela de resumo diário e triggers que a mantêm atualizada"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resumo_diario'")
+    existia = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resumo_diario (
+            data DATE PRIMARY KEY,
+            total_agendamentos INTEGER NOT NULL DEFAULT 0,
+            em_andamento INTEGER NOT NULL DEFAULT 0,
+            concluidos INTEGER NOT NULL DEFAULT 0,
+            faturamento REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Agendamentos: contadores por data_agendamento e status
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS resumo_agendamentos_ai AFTER INSERT ON agendamentos
+        WHEN new.data_agendamento IS NOT NULL BEGIN
+            INSERT OR IGNORE INTO resumo_diario (data) VALUES (new.data_agendamento);
+            UPDATE resumo_diario SET
+                total_agendamentos = total_agendamentos + 1,
+                em_andamento = em_andamento + (new.status = '{STATUS_EM_ANDAMENTO}'),
+                concluidos = concluidos + (new.status = '{STATUS_CONCLUIDO}')
+            WHERE data = new.data_agendamento;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS resumo_agendamentos_ad AFTER DELETE ON agendamentos
+        WHEN old.data_agendamento IS NOT NULL BEGIN
+            UPDATE resumo_diario SET
+                total_agendamentos = total_agendamentos - 1,
+                em_andamento = em_andamento - (old.status = '{STATUS_EM_ANDAMENTO}'),
+                concluidos = concluidos - (old.status = '{STATUS_CONCLUIDO}')
+            WHERE data = old.data_agendamento;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS resumo_agendamentos_au AFTER UPDATE OF data_agendamento, status ON agendamentos BEGIN
+            UPDATE resumo_diario SET
+                total_agendamentos = total_agendamentos - 1,
+                em_andamento = em_andamento - (old.status = '{STATUS_EM_ANDAMENTO}'),
+                concluidos = concluidos - (old.status = '{STATUS_CONCLUIDO}')
+            WHERE data = old.data_agendamento;
+            INSERT OR IGNORE INTO resumo_diario (data)
+            SELECT new.data_agendamento WHERE new.data_agendamento IS NOT NULL;
+            UPDATE resumo_diario SET
+                total_agendamentos = total_agendamentos + 1,
+                em_andamento = em_andamento + (new.status = '{STATUS_EM_ANDAMENTO}'),
+                concluidos = concluidos + (new.status = '{STATUS_CONCLUIDO}')
+            WHERE data = new.data_agendamento;
+        END
+    ''')
+
+    # Ordens de serviço: faturamento pela data de conclusão
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS resumo_ordens_ai AFTER INSERT ON ordens_servico
+        WHEN new.data_conclusao IS NOT NULL BEGIN
+            INSERT OR IGNORE INTO resumo_diario (data) VALUES (new.data_conclusao);
+            UPDATE resumo_diario SET faturamento = faturamento + COALESCE(new.custo_total, 0)
+            WHERE data = new.data_conclusao;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS resumo_ordens_ad AFTER DELETE ON ordens_servico
+        WHEN old.data_conclusao IS NOT NULL BEGIN
+            UPDATE resumo_diario SET faturamento = faturamento - COALESCE(old.custo_total, 0)
+            WHERE data = old.data_conclusao;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS resumo_ordens_au AFTER UPDATE OF data_conclusao, custo_total ON ordens_servico BEGIN
+            UPDATE resumo_diario SET faturamento = faturamento - COALESCE(old.custo_total, 0)
+            WHERE data = old.data_conclusao;
+            INSERT OR IGNORE INTO resumo_diario (data)
+            SELECT new.data_conclusao WHERE new.data_conclusao IS NOT NULL;
+            UPDATE resumo_diario SET faturamento = faturamento + COALESCE(new.custo_total, 0)
+            WHERE data = new.data_conclusao;
+        END
+    ''')
+
+    # Índice usado pela lista de agendamentos do dia
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_data ON agendamentos (data_agendamento, horario)")
+
+    # Bancos com histórico: calcular o resumo uma única vez
+    if not existia:
+        recalcular_resumo(conn)
+    conn.commit()
+
+
+def recalcular_resumo(conn):
+    """Reconstruir o resumo diário a partir do histórico completo"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM resumo_diario")
+    cursor.execute(f'''
+        INSERT INTO resumo_diario (data, total_agendamentos, em_andamento, concluidos)
+        SELECT data_agendamento, COUNT(*),
+               SUM(status = '{STATUS_EM_ANDAMENTO}'), SUM(status = '{STATUS_CONCLUIDO}')
+        FROM agendamentos
+        WHERE data_agendamento IS NOT NULL
+        GROUP BY data_agendamento
+    ''')
+    cursor.execute('''
+        INSERT INTO resumo_diario (data, faturamento)
+        SELECT data_conclusao, SUM(COALESCE(custo_total, 0))
+        FROM ordens_servico
+        WHERE data_conclusao IS NOT NULL
+        GROUP BY data_conclusao
+        ON CONFLICT (data) DO UPDATE SET faturamento = excluded.faturamento
+    ''')
+    conn.commit()
+
+
+def ler_resumo(conn, data=None):
+    """Ler os indicadores de um dia (consulta pela chave primária)"""
+    data = data or date.today().isoformat()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT total_agendamentos, em_andamento, concluidos, faturamento
+        FROM resumo_diario WHERE data = ?
+    ''', (data,))
+    row = cursor.fetchone() or (0, 0, 0, 0.0)
+    return {
+        'agendamentos': row[0],
+        'em_andamento': row[1],
+        'concluidos': row[2],
+        'faturamento': row[3],
+    }
+
+
+def agendamentos_do_dia(conn, data=None):
+    """Agendamentos de um dia para a tabela do dashboard"""
+    data = data or date.today().isoformat()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT c.nome,
+               TRIM(COALESCE(v.modelo, '') || ' ' || COALESCE(v.ano, '')),
+               s.nome, a.horario, a.status
+        FROM agendamentos a
+        LEFT JOIN clientes c ON c.id = a.cliente_id
+        LEFT JOIN veiculos v ON v.id = a.veiculo_id
+        LEFT JOIN servicos s ON s.id = a.servico_id
+        WHERE a.data_agendamento = ?
+        ORDER BY a.horario
+    ''', (data,))
+    return cursor.fetchall()
+
+
+def formatar_moeda(valor):
+    """Formatar valor no padrão brasileiro (R$ 1.234,56)"""
+    texto = f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+    return f"R$ {texto}"
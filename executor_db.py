@@ -0,0 +1,243 @@
+import queue
+import threading
+import time
+import traceback
+
+from diagnostico import CALLBACK, EXECUTOR
+from unidade_trabalho import CommitEmGrupo, UnidadeTrabalho, gravar
+
+# Intervalo em que o loop do Tk recolhe resultados prontos (ms)
+INTERVALO_ENTREGA_MS = 20
+
+
+class Pedido:
+    """Pedido enviado ao executor do banco"""
+
+    __slots__ = ('funcao', 'args', 'ao_concluir', 'ao_falhar', 'canal', 'cancelado', 'unidade', 'valor_unico')
+
+    def __init__(self, funcao, args, ao_concluir, ao_falhar, canal, unidade=None, valor_unico=False):
+        self.funcao = funcao
+        self.args = args
+        self.ao_concluir = ao_concluir
+        self.ao_falhar = ao_falhar
+        self.canal = canal
+        self.cancelado = False
+        # Gravações: unidade de trabalho e se o callback recebe só o primeiro resultado
+        self.unidade = unidade
+        self.valor_unico = valor_unico
+
+
+def _como_unidade(funcao, args):
+    """Unidade de trabalho e se o resultado entregue é a lista ou o único valor"""
+    if isinstance(funcao, UnidadeTrabalho):
+        return funcao, False
+    unidade = UnidadeTrabalho()
+    unidade.adicionar(funcao, *args)
+    return unidade, True
+
+
+def _nome_pedido(pedido):
+    """Nome com que o pedido aparece nas medições"""
+    if pedido.unidade is not None:
+        return 'gravar:' + '+'.join(getattr(funcao, '__name__', 'unidade') for funcao, _ in pedido.unidade.operacoes)
+    return getattr(pedido.funcao, '__name__', repr(pedido.funcao))
+
+
+def _falha_padrao(erro):
+    traceback.print_exception(type(erro), erro, erro.__traceback__)
+
+
+class ExecutorBanco:
+    """Executa funções de banco em uma thread dedicada
+
+    A conexão passa a pertencer à thread do executor (sem conexão, no modo
+    cliente do servidor, a thread só faz as chamadas de rede). As funções enviadas
+    rodam em ordem de chegada e os resultados voltam para o loop do Tk por
+    root.after. Pedidos de um mesmo canal substituem os anteriores: o
+    pendente é descartado e o que estiver rodando é interrompido.
+
+    Gravações enviadas por gravar() são agrupadas por
+    unidade_trabalho.CommitEmGrupo: cada unidade roda em seu próprio
+    savepoint e um único commit confirma todas as que chegarem em até
+    JANELA_COMMIT_MS. O callback de cada gravação só é chamado depois
+    do commit.
+
+    Com um `medidor` (diagnostico.Medidor), registra o tempo de cada
+    pedido na thread do banco e o do seu callback no loop do Tk.
+    """
+
+    def __init__(self, root, conn, medidor=None):
+        self.root = root
+        self.conn = conn
+        self.medidor = medidor
+        self._pedidos = queue.Queue()
+        self._resultados = queue.Queue()
+        self._por_canal = {}
+        self._lock = threading.Lock()
+        self._em_execucao = None
+        self._ativo = True
+        self._grupo = CommitEmGrupo(conn, self._confirmados)
+        self._thread = threading.Thread(target=self._trabalhar, name='executor-banco', daemon=True)
+        self._thread.start()
+        self._entrega_agendada = self.root.after(INTERVALO_ENTREGA_MS, self._entregar)
+
+    def enviar(self, funcao, *args, ao_concluir=None, ao_falhar=None, canal=None):
+        """Enfileirar funcao(*args) para execução na thread do banco"""
+        pedido = Pedido(funcao, args, ao_concluir, ao_falhar or _falha_padrao, canal)
+        if canal is not None:
+            self.cancelar(canal)
+            self._por_canal[canal] = pedido
+        self._pedidos.put(pedido)
+        return pedido
+
+    def gravar(self, funcao, *args, ao_concluir=None, ao_falhar=None):
+        """Enfileirar uma gravação para o próximo commit em grupo
+
+        `funcao` pode ser uma UnidadeTrabalho (o callback recebe a lista de
+        resultados) ou uma função sem commit próprio (recebe o resultado dela).
+        Sem conexão local a gravação é um pedido comum: quem agrupa é o servidor.
+        """
+        if self.conn is None:
+            return self.enviar(funcao, *args, ao_concluir=ao_concluir, ao_falhar=ao_falhar)
+        unidade, valor_unico = _como_unidade(funcao, args)
+        pedido = Pedido(None, (), ao_concluir, ao_falhar or _falha_padrao, None, unidade, valor_unico)
+        self._pedidos.put(pedido)
+        return pedido
+
+    def cancelar(self, canal):
+        """Cancelar o pedido ainda não entregue de um canal"""
+        anterior = self._por_canal.pop(canal, None)
+        if anterior is None:
+            return
+        anterior.cancelado = True
+        with self._lock:
+            if self._em_execucao is anterior and self.conn is not None:
+                self.conn.interrupt()
+
+    def _trabalhar(self):
+        while True:
+            try:
+                pedido = self._pedidos.get(timeout=self._grupo.espera())
+            except queue.Empty:
+                self._grupo.confirmar()
+                continue
+            if pedido is None:
+                break
+            if pedido.cancelado:
+                continue
+
+            if pedido.unidade is not None:
+                inicio = time.perf_counter()
+                try:
+                    self._grupo.aplicar(pedido, pedido.unidade)
+                except Exception as e:
+                    self._resultados.put((pedido, None, e))
+                self._medir(EXECUTOR, pedido, inicio)
+                continue
+
+            # Leituras e operações com commit próprio não entram na transação aberta
+            self._grupo.confirmar()
+            with self._lock:
+                self._em_execucao = pedido
+            inicio = time.perf_counter()
+            try:
+                resultado = pedido.funcao(*pedido.args)
+                self._resultados.put((pedido, resultado, None))
+            except Exception as e:
+                self._resultados.put((pedido, None, e))
+            finally:
+                with self._lock:
+                    self._em_execucao = None
+                self._medir(EXECUTOR, pedido, inicio)
+
+        self._grupo.confirmar()
+        if self.conn is not None:
+            self.conn.close()
+
+    def _medir(self, categoria, pedido, inicio):
+        if self.medidor is not None:
+            self.medidor.registrar(categoria, _nome_pedido(pedido), (time.perf_counter() - inicio) * 1000)
+
+    def _confirmados(self, gravados, erro, duracao_ms):
+        """Entregar os resultados das gravações do grupo confirmado (ou o erro do commit)"""
+        if self.medidor is not None:
+            self.medidor.registrar(EXECUTOR, 'commit', duracao_ms, len(gravados))
+        for pedido, resultados in gravados:
+            resultado = resultados[0] if pedido.valor_unico else resultados
+            self._resultados.put((pedido, None if erro else resultado, erro))
+
+    def _entregar(self):
+        """Chamar os callbacks dos pedidos concluídos (no loop do Tk)
+
+        Um callback que falha é registrado por _falha_padrao e não impede
+        a entrega dos demais nem o próximo agendamento.
+        """
+        try:
+            while True:
+                try:
+                    pedido, resultado, erro = self._resultados.get_nowait()
+                except queue.Empty:
+                    break
+                if pedido.cancelado:
+                    continue
+                if pedido.canal is not None and self._por_canal.get(pedido.canal) is pedido:
+                    del self._por_canal[pedido.canal]
+
+                inicio = time.perf_counter()
+                try:
+                    if erro is not None:
+                        pedido.ao_falhar(erro)
+                    elif pedido.ao_concluir is not None:
+                        pedido.ao_concluir(resultado)
+                except Exception as e:
+                    _falha_padrao(e)
+                self._medir(CALLBACK, pedido, inicio)
+        finally:
+            if self._ativo:
+                self._entrega_agendada = self.root.after(INTERVALO_ENTREGA_MS, self._entregar)
+
+    def encerrar(self):
+        """Processar os pedidos pendentes e fechar a conexão"""
+        if not self._ativo:
+            return
+        self._ativo = False
+        self.root.after_cancel(self._entrega_agendada)
+        self._pedidos.put(None)
+        self._thread.join()
+
+
+class ExecutorSincrono:
+    """Executor com a mesma interface que roda tudo na thread atual
+
+    Útil em scripts, testes e benchmarks sem loop do Tk.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def enviar(self, funcao, *args, ao_concluir=None, ao_falhar=None, canal=None):
+        try:
+            resultado = funcao(*args)
+        except Exception as e:
+            (ao_falhar or _falha_padrao)(e)
+            return None
+        if ao_concluir is not None:
+            ao_concluir(resultado)
+        return None
+
+    def gravar(self, funcao, *args, ao_concluir=None, ao_falhar=None):
+        unidade, valor_unico = _como_unidade(funcao, args)
+        try:
+            resultados = gravar(self.conn, unidade)
+        except Exception as e:
+            (ao_falhar or _falha_padrao)(e)
+            return None
+        if ao_concluir is not None:
+            ao_concluir(resultados[0] if valor_unico else resultados)
+        return None
+
+    def cancelar(self, canal):
+        pass
+
+    def encerrar(self):
+        self.conn.close()
@@ -0,0 +1,343 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from datetime import date
+from itertools import islice
+
+from config import DATABASE_PATH
+from banco import conectar, preparar_banco
+from veiculos import chave_placa, limpar_placa
+
+# Registros gravados por transação
+TAMANHO_LOTE = 5000
+
+# Origem usada quando o arquivo não informa de qual oficina vieram os ids
+ORIGEM_PADRAO = 'importacao'
+
+# Colunas aceitas em cada tabela, na ordem de exportação
+COLUNAS = {
+    'clientes': ('id', 'nome', 'telefone', 'email', 'endereco', 'data_cadastro'),
+    'veiculos': ('id', 'cliente_id', 'marca', 'modelo', 'ano', 'placa', 'quilometragem'),
+}
+
+# O id do arquivo não é gravado: cada registro recebe um id novo. Clientes
+# repetidos são reconhecidos pelo id de origem já importado, veículos pela
+# chave da placa (ABC1234 e ABC1C34 são o mesmo veículo)
+SQL_INSERCAO = {
+    'clientes': '''
+        INSERT INTO clientes (nome, telefone, email, endereco, data_cadastro)
+        VALUES (?, ?, ?, ?, ?)
+    ''',
+    'veiculos': '''
+        INSERT INTO veiculos (cliente_id, marca, modelo, ano, placa, quilometragem)
+        SELECT ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM veiculos WHERE placa_chave = ?)
+    ''',
+}
+SQL_JA_IMPORTADO = "SELECT 1 FROM clientes_importados WHERE origem = ? AND id_origem = ?"
+SQL_MAPEAR = "INSERT INTO clientes_importados (origem, id_origem, cliente_id) VALUES (?, ?, ?)"
+SQL_CLIENTES_IMPORTADOS = '''
+    SELECT m.id_origem, m.cliente_id FROM clientes_importados m
+    JOIN clientes c ON c.id = m.cliente_id
+    WHERE m.origem = ? AND m.id_origem IN (SELECT value FROM json_each(?))
+'''
+
+
+def _formato(caminho):
+    """Formato do arquivo pela extensão: 'csv' ou 'jsonl'
+
+    Um .json comum é um único array e não pode ser lido registro a
+    registro com uma linha por vez, por isso não é aceito.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.csv':
+        return 'csv'
+    if extensao in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Formato não suportado: {extensao or caminho}")
+
+
+def _ler_registros(arquivo, formato):
+    """Gerar dicionários do arquivo, um por vez
+
+    Um registro ilegível vem como a própria exceção, para ser rejeitado
+    sem interromper a leitura do restante do arquivo.
+    """
+    if formato == 'csv':
+        leitor = csv.DictReader(arquivo)
+        while True:
+            try:
+                registro = next(leitor)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                registro = e
+            yield registro
+    else:
+        for linha in arquivo:
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError as e:
+                registro = e
+            yield registro
+
+
+def _vazio_para_none(valor):
+    if isinstance(valor, str):
+        valor = valor.strip()
+        return valor or None
+    return valor
+
+
+def _normalizar(tabela, registro):
+    """Converter um registro lido na tupla de parâmetros da inserção"""
+    valores = {coluna: _vazio_para_none(registro.get(coluna)) for coluna in COLUNAS[tabela]}
+    # Ids do arquivo (da oficina de origem) só servem para ligar veículos aos clientes
+    for coluna in ('id', 'cliente_id'):
+        if valores.get(coluna) is not None:
+            valores[coluna] = int(valores[coluna])
+    if tabela == 'clientes':
+        if not valores['nome']:
+            raise ValueError("nome é obrigatório")
+        valores['data_cadastro'] = valores['data_cadastro'] or date.today().isoformat()
+    else:
+        if not valores['marca'] or not valores['modelo']:
+            raise ValueError("marca e modelo são obrigatórios")
+        if valores['placa']:
+            valores['placa'] = limpar_placa(valores['placa'])
+    return tuple(valores[coluna] for coluna in COLUNAS[tabela])
+
+
+class Importador:
+    """Importação em lotes de clientes ou veículos a partir de CSV/JSON Lines
+
+    Cada chamada de importar_lote lê até tamanho_lote registros e os grava
+    em uma única transação. A memória usada não depende do tamanho do
+    arquivo.
+
+    Os registros recebem ids novos. Os clientes importados ficam em
+    clientes_importados com o id que tinham na `origem`, para que os
+    veículos da mesma origem sejam ligados ao cliente certo e para que
+    importar o mesmo arquivo de novo não duplique os cadastros.
+    """
+
+    def __init__(self, conn, tabela, caminho, tamanho_lote=TAMANHO_LOTE, origem=ORIGEM_PADRAO):
+        if tabela not in COLUNAS:
+            raise ValueError(f"Tabela não suportada: {tabela}")
+        self.conn = conn
+        self.tabela = tabela
+        self.tamanho_lote = tamanho_lote
+        self.origem = origem
+        formato = _formato(caminho)
+        self._arquivo = open(caminho, newline='', encoding='utf-8')
+        self._registros = _ler_registros(self._arquivo, formato)
+        self.tamanho_arquivo = os.path.getsize(caminho)
+        self.processados = 0
+        self.inseridos = 0
+        self.ignorados = 0
+        self.rejeitados = 0
+        self.concluido = False
+
+    @property
+    def bytes_lidos(self):
+        """Posição aproximada no arquivo, para a barra de progresso"""
+        return self._arquivo.buffer.tell() if not self._arquivo.closed else self.tamanho_arquivo
+
+    def importar_lote(self):
+        """Gravar o próximo lote; retorna False quando o arquivo terminou"""
+        if self.concluido:
+            return False
+
+        lote = []
+        lidos = 0
+        for registro in islice(self._registros, self.tamanho_lote):
+            lidos += 1
+            try:
+                if isinstance(registro, Exception):
+                    raise registro
+                lote.append(_normalizar(self.tabela, registro))
+            except (ValueError, TypeError, AttributeError, csv.Error):
+                self.rejeitados += 1
+
+        self.processados += lidos
+        if lote:
+            self._gravar(lote)
+        if lidos < self.tamanho_lote:
+            self.fechar()
+        return not self.concluido
+
+    def _gravar(self, lote):
+        if self.tabela == 'clientes':
+            self._gravar_clientes(lote)
+        else:
+            self._gravar_veiculos(lote)
+
+    def _gravar_clientes(self, lote):
+        """Inserir um a um (cada id novo vai para o mapa) na transação do lote"""
+        try:
+            for id_origem, *dados in lote:
+                if id_origem is not None and self.conn.execute(SQL_JA_IMPORTADO, (self.origem, id_origem)).fetchone():
+                    self.ignorados += 1
+                    continue
+                try:
+                    cliente_id = self.conn.execute(SQL_INSERCAO['clientes'], dados).lastrowid
+                except sqlite3.IntegrityError:
+                    self.rejeitados += 1
+                    continue
+                if id_origem is not None:
+                    self.conn.execute(SQL_MAPEAR, (self.origem, id_origem, cliente_id))
+                self.inseridos += 1
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def _gravar_veiculos(self, lote):
+        """Trocar o cliente de origem pelo id local e inserir com executemany
+
+        Veículo de um cliente que não foi importado da mesma origem é
+        rejeitado.
+        """
+        origens = json.dumps(sorted({linha[1] for linha in lote if linha[1] is not None}))
+        clientes = dict(self.conn.execute(SQL_CLIENTES_IMPORTADOS, (self.origem, origens)).fetchall())
+        parametros = []
+        for _, cliente_origem, marca, modelo, ano, placa, quilometragem in lote:
+            if cliente_origem is not None and cliente_origem not in clientes:
+                self.rejeitados += 1
+                continue
+            parametros.append((clientes.get(cliente_origem), marca, modelo, ano, placa, quilometragem,
+                               chave_placa(placa) if placa else None))
+        if parametros:
+            self._executar_lote(SQL_INSERCAO['veiculos'], parametros)
+
+    def _executar_lote(self, sql, lote):
+        try:
+            cursor = self.conn.executemany(sql, lote)
+            self.conn.commit()
+            self.inseridos += cursor.rowcount
+            self.ignorados += len(lote) - cursor.rowcount
+        except sqlite3.IntegrityError:
+            # Algum registro viola uma restrição (ex.: cliente inexistente):
+            # refazer o lote linha a linha para aproveitar os válidos
+            self.conn.rollback()
+            for parametros in lote:
+                try:
+                    cursor = self.conn.execute(sql, parametros)
+                    self.inseridos += cursor.rowcount
+                    self.ignorados += 1 - cursor.rowcount
+                except sqlite3.IntegrityError:
+                    self.rejeitados += 1
+            self.conn.commit()
+
+    def importar_tudo(self, progresso=None):
+        """Importar o arquivo inteiro chamando progresso(self) a cada lote"""
+        while self.importar_lote():
+            if progresso:
+                progresso(self)
+        if progresso:
+            progresso(self)
+        return self
+
+    def fechar(self):
+        self.concluido = True
+        self._arquivo.close()
+
+
+class Exportador:
+    """Exportação em lotes de clientes ou veículos para CSV/JSON Lines
+
+    Os registros são lidos por chave (id > último exportado), então cada
+    lote é uma consulta curta e nada é acumulado em memória.
+    """
+
+    def __init__(self, conn, tabela, caminho, tamanho_lote=TAMANHO_LOTE):
+        if tabela not in COLUNAS:
+            raise ValueError(f"Tabela não suportada: {tabela}")
+        self.conn = conn
+        self.tabela = tabela
+        self.tamanho_lote = tamanho_lote
+        self.formato = _formato(caminho)
+        self._arquivo = open(caminho, 'w', newline='', encoding='utf-8')
+        self._ultimo_id = 0
+        self.exportados = 0
+        self.concluido = False
+        if self.formato == 'csv':
+            self._escritor = csv.writer(self._arquivo)
+            self._escritor.writerow(COLUNAS[tabela])
+
+    def exportar_lote(self):
+        """Gravar o próximo lote no arquivo; retorna False ao terminar"""
+        if self.concluido:
+            return False
+
+        colunas = COLUNAS[self.tabela]
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(colunas)} FROM {self.tabela} WHERE id > ? ORDER BY id LIMIT ?",
+            (self._ultimo_id, self.tamanho_lote)
+        )
+        linhas = cursor.fetchall()
+        if self.formato == 'csv':
+            self._escritor.writerows(linhas)
+        else:
+            for linha in linhas:
+                self._arquivo.write(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n')
+
+        self.exportados += len(linhas)
+        if linhas:
+            self._ultimo_id = linhas[-1][0]
+        if len(linhas) < self.tamanho_lote:
+            self.fechar()
+        return not self.concluido
+
+    def exportar_tudo(self, progresso=None):
+        """Exportar a tabela inteira chamando progresso(self) a cada lote"""
+        while self.exportar_lote():
+            if progresso:
+                progresso(self)
+        if progresso:
+            progresso(self)
+        return self
+
+    def fechar(self):
+        self.concluido = True
+        self._arquivo.close()
+
+
+def mostrar_progresso(tarefa):
+    if isinstance(tarefa, Importador):
+        print(f"\r{tarefa.processados} lidos, {tarefa.inseridos} inseridos, "
+              f"{tarefa.ignorados} repetidos, {tarefa.rejeitados} rejeitados", end='', flush=True)
+    else:
+        print(f"\r{tarefa.exportados} exportados", end='', flush=True)
+
+
+def main():
+    """Linha de comando: importar/exportar clientes e veículos"""
+    parser = argparse.ArgumentParser(description="Importação e exportação de clientes e veículos")
+    parser.add_argument('operacao', choices=('importar', 'exportar'))
+    parser.add_argument('tabela', choices=tuple(COLUNAS))
+    parser.add_argument('arquivo', help="Arquivo .csv ou .jsonl")
+    parser.add_argument('--banco', default=DATABASE_PATH, help="Caminho do banco de dados")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Registros por transação")
+    parser.add_argument('--origem', default=ORIGEM_PADRAO,
+                        help="Oficina de origem dos ids do arquivo (a mesma para clientes e veículos)")
+    args = parser.parse_args()
+
+    conn = conectar(args.banco)
+    preparar_banco(conn)
+    try:
+        if args.operacao == 'importar':
+            Importador(conn, args.tabela, args.arquivo, args.lote, args.origem).importar_tudo(mostrar_progresso)
+        else:
+            Exportador(conn, args.tabela, args.arquivo, args.lote).exportar_tudo(mostrar_progresso)
+        print()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1609 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+from datetime import datetime, date, timedelta
+import argparse
+import time
+
+from config import SERVIDOR_URL
+from banco import conectar, preparar_banco
+from lista_virtual import ListaVirtual
+from estatisticas import formatar_moeda
+from executor_db import ExecutorBanco
+from importacao import Exportador, Importador
+from agenda import ConflitoAgendamento
+from tecnicos import semana
+from duplicados import sincronizar_chaves
+from notificacoes import BarramentoAlteracoes, SondaAlteracoes, podar_alteracoes
+from manutencao import ManutencaoOciosa, caminho_banco
+from lembretes import ProcessadorLembretes
+from diagnostico import ConexaoMedida, DetectorTravamentos, Medidor, Perfilador, exportar_diagnostico
+from relatorios import RELATORIOS
+from repositorio import Cliente
+from veiculos import limpar_placa
+from nucleo import ErroValidacao, preparar_cliente, preparar_horario, preparar_veiculo
+from operacoes import BackendLocal
+from acesso_remoto import BackendRemoto
+
+# Intervalo de espera após a última tecla antes de pesquisar (ms)
+ATRASO_PESQUISA_MS = 250
+
+# Intervalo de atualização automática do dashboard (ms); as alterações
+# chegam pelo registro de alterações, isto só cobre a virada do dia
+INTERVALO_DASHBOARD_MS = 300000
+
+# Espera para juntar alterações seguidas em uma só atualização do dashboard (ms)
+ATRASO_DASHBOARD_MS = 200
+
+# Intervalo após a última tecla antes de procurar cadastros parecidos (ms)
+ATRASO_DUPLICADOS_MS = 400
+
+class OficinaApp:
+    def __init__(self, root, servidor=SERVIDOR_URL):
+        self.root = root
+        self.root.title("Sistema de Gerenciamento - Oficina Mecânica")
+        self.root.geometry("1200x700")
+        self.root.configure(bg='#f5f7f9')
+        
+        # Tempos de cada etapa da inicialização (ms desde o início)
+        self._inicio = time.perf_counter()
+        self.tempos_inicializacao = {}
+        
+        # Conexão com o banco de dados (ou com o servidor da oficina)
+        self.conectar_banco(servidor)
+        self.root.protocol("WM_DELETE_WINDOW", self.fechar)
+        self.registrar_etapa('banco')
+        
+        # Configurar interface (só a aba visível é construída agora)
+        self.configurar_interface()
+        self.registrar_etapa('interface')
+        
+        # Carregar dados depois que a janela for desenhada
+        self.root.after_idle(self.apos_primeira_pintura)
+    
+    def registrar_etapa(self, etapa):
+        """Guardar o tempo decorrido desde o início até uma etapa"""
+        if etapa not in self.tempos_inicializacao:
+            self.tempos_inicializacao[etapa] = round((time.perf_counter() - self._inicio) * 1000, 1)
+    
+    def apos_primeira_pintura(self):
+        """Iniciar a carga de dados com a janela já visível"""
+        self.registrar_etapa('primeira_pintura')
+        self.carregar_dados()
+        
+        # Acompanhar as alterações feitas por esta e pelas outras estações
+        self.sonda.iniciar()
+        self.detector_travamentos.iniciar()
+        
+        # Backup, arquivamento e otimização quando ninguém estiver usando (só banco local)
+        if self.manutencao is not None:
+            self.manutencao.iniciar()
+        
+        # Lembretes e faltas (no modo multiestação quem processa é o servidor)
+        if self.lembretes is not None:
+            self.lembretes.iniciar()
+        
+        # Atualizar o dashboard periodicamente
+        self.root.after(INTERVALO_DASHBOARD_MS, self.atualizar_dashboard_periodicamente)
+    
+    def conectar_banco(self, servidor=None):
+        """Conectar ao banco de dados SQLite ou ao servidor informado"""
+        # Medições exibidas na aba de diagnóstico (Ctrl+Shift+D)
+        self.medidor = Medidor()
+        self.perfilador = Perfilador()
+        self.detector_travamentos = DetectorTravamentos(self.root, self.medidor)
+        if servidor:
+            self.conn = None
+            self.backend = BackendRemoto(servidor)
+        else:
+            self.conn = conectar(factory=ConexaoMedida)
+            self.conn.medidor = self.medidor
+            preparar_banco(self.conn)
+            sincronizar_chaves(self.conn)
+            podar_alteracoes(self.conn)
+            self.backend = BackendLocal(self.conn)
+        
+        # A partir daqui a conexão pertence à thread do executor
+        self.executor = ExecutorBanco(self.root, self.conn, self.medidor)
+        self.manutencao = ManutencaoOciosa(self.root, self.executor, self.conn) if self.conn is not None else None
+        self.lembretes = ProcessadorLembretes(caminho_banco(self.conn)) if self.conn is not None else None
+        self._pesquisa_agendada = None
+        self._pesquisa_apos = None
+        self._pesquisa_exibidos = 0
+        self.agenda = None
+        self.escala = None
+        self._reserva_provisoria = 0
+        
+        # Alterações no banco entregues às telas abertas
+        self.barramento = BarramentoAlteracoes()
+        self.sonda = SondaAlteracoes(self.root, self.executor, self.backend, self.barramento)
+        self._dashboard_agendado = None
+        self.barramento.assinar('clientes', self.ao_alterar_clientes)
+        self.barramento.assinar('agendamentos', self.ao_alterar_agendamentos)
+        self.barramento.assinar('ordens_servico', self.ao_alterar_ordens)
+        self.barramento.assinar('veiculos', self.ao_alterar_veiculos)
+    
+    def configurar_interface(self):
+        """Configurar a interface gráfica"""
+        # Configurar estilo
+        style = ttk.Style()
+        style.theme_use('clam')
+        
+        # Frame principal
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Configurar grid
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(1, weight=1)
+        
+        # Barra de título
+        title_frame = ttk.Frame(main_frame)
+        title_frame.grid(row=0, column=0, columnspan=2, pady=(0, 10), sticky=(tk.W, tk.E))
+        
+        ttk.Label(
+            title_frame, 
+            text="Sistema de Gerenciamento - Oficina Mecânica", 
+            font=('Helvetica', 16, 'bold'),
+            foreground='#2c3e50'
+        ).pack(side=tk.LEFT)
+        
+        # Notebook (abas)
+        self.notebook = ttk.Notebook(main_frame)
+        self.notebook.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Barra de status
+        self.status_var = tk.StringVar()
+        self.status_var.set("Sistema pronto")
+        status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=2, column=0, sticky=(tk.W, tk.E))
+        
+        # Abas do sistema: os widgets de cada uma são criados na primeira vez
+        # em que ela é selecionada
+        abas = [
+            ("Dashboard", self.criar_aba_dashboard),
+            ("Clientes", self.criar_aba_clientes),
+            ("Veículos", self.criar_aba_veiculos),
+            ("Serviços", self.criar_aba_servicos),
+            ("Agendamentos", self.criar_aba_agendamentos),
+            ("Técnicos", self.criar_aba_tecnicos),
+            ("Relatórios", self.criar_aba_relatorios),
+        ]
+        self._abas_pendentes = {}
+        for titulo, construtor in abas:
+            frame = ttk.Frame(self.notebook, padding="10")
+            self.notebook.add(frame, text=titulo)
+            self._abas_pendentes[str(frame)] = construtor
+        
+        self.notebook.bind('<<NotebookTabChanged>>', self.ao_trocar_aba)
+        self.ao_trocar_aba()
+        
+        # Aba de diagnóstico: oculta até ser pedida
+        self.aba_diagnostico = None
+        self.root.bind_all('<Control-Shift-D>', self.mostrar_diagnostico)
+    
+    def ao_trocar_aba(self, event=None):
+        """Construir a aba selecionada se ainda não foi construída"""
+        aba = self.notebook.select()
+        construtor = self._abas_pendentes.pop(str(aba), None)
+        if construtor is not None:
+            construtor(self.notebook.nametowidget(aba))
+    
+    def aba_construida(self, titulo):
+        """Verificar se a aba com o título informado já foi construída"""
+        for aba in self.notebook.tabs():
+            if self.notebook.tab(aba, 'text') == titulo:
+                return str(aba) not in self._abas_pendentes
+        return False
+    
+    def criar_aba_dashboard(self, frame):
+        """Criar aba do dashboard"""
+        
+        # Configurar grid
+        for i in range(4):
+            frame.columnconfigure(i, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        # Cards de estatísticas (valores preenchidos por carregar_estatisticas)
+        cards_info = [
+            ("agendamentos", "Agendamentos Hoje", "calendar", "#2c3e50"),
+            ("em_andamento", "Serviços em Andamento", "tools", "#f39c12"),
+            ("concluidos", "Serviços Concluídos", "check", "#27ae60"),
+            ("faturamento", "Faturamento do Dia", "dollar", "#e74c3c")
+        ]
+        self.cards_dashboard = {}
+        
+        for i, (chave, title, icon, color) in enumerate(cards_info):
+            card = ttk.Frame(frame, relief=tk.RAISED, borderwidth=1)
+            card.grid(row=0, column=i, padx=5, pady=5, sticky=(tk.W, tk.E))
+            card.columnconfigure(0, weight=1)
+            self.cards_dashboard[chave] = tk.StringVar(value="-")
+            
+            # Ícone (usando texto como placeholder)
+            ttk.Label(
+                card, 
+                textvariable=self.cards_dashboard[chave], 
+                font=('Helvetica', 24, 'bold'),
+                foreground=color
+            ).grid(row=0, column=0, pady=(10, 5))
+            
+            ttk.Label(
+                card, 
+                text=title,
+                font=('Helvetica', 10)
+            ).grid(row=1, column=0, pady=(0, 10))
+        
+        # Tabela de agendamentos do dia
+        agendamentos_frame = ttk.LabelFrame(frame, text="Agendamentos de Hoje", padding="10")
+        agendamentos_frame.grid(row=1, column=0, columnspan=4, pady=10, sticky=(tk.W, tk.E, tk.N, tk.S))
+        agendamentos_frame.columnconfigure(0, weight=1)
+        agendamentos_frame.rowconfigure(0, weight=1)
+        
+        # Colunas
+        columns = ('cliente', 'veiculo', 'servico', 'horario', 'status')
+        self.tree_agendamentos = ttk.Treeview(agendamentos_frame, columns=columns, show='headings', height=10)
+        
+        # Definir cabeçalhos
+        self.tree_agendamentos.heading('cliente', text='Cliente')
+        self.tree_agendamentos.heading('veiculo', text='Veículo')
+        self.tree_agendamentos.heading('servico', text='Serviço')
+        self.tree_agendamentos.heading('horario', text='Horário')
+        self.tree_agendamentos.heading('status', text='Status')
+        
+        # Definir largura das colunas
+        self.tree_agendamentos.column('cliente', width=200)
+        self.tree_agendamentos.column('veiculo', width=150)
+        self.tree_agendamentos.column('servico', width=200)
+        self.tree_agendamentos.column('horario', width=100)
+        self.tree_agendamentos.column('status', width=100)
+        
+        # Scrollbar
+        scrollbar = ttk.Scrollbar(agendamentos_frame, orient=tk.VERTICAL, command=self.tree_agendamentos.yview)
+        self.tree_agendamentos.configure(yscroll=scrollbar.set)
+        
+        self.tree_agendamentos.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        # Botões de ação
+        btn_frame = ttk.Frame(agendamentos_frame)
+        btn_frame.grid(row=1, column=0, columnspan=2, pady=(10, 0), sticky=(tk.E))
+        
+        ttk.Button(btn_frame, text="Atualizar", command=self.atualizar_dashboard).pack(side=tk.RIGHT, padx=5)
+        # Habilitado quando a agenda terminar de carregar (carregar_agenda)
+        self.botao_novo_agendamento = ttk.Button(
+            btn_frame, text="Novo Agendamento", command=self.novo_agendamento,
+            state=tk.DISABLED if self.agenda is None else tk.NORMAL
+        )
+        self.botao_novo_agendamento.pack(side=tk.RIGHT, padx=5)
+    
+    def criar_aba_clientes(self, frame):
+        """Criar aba de clientes"""
+        
+        # Frame de listagem
+        list_frame = ttk.Frame(frame)
+        list_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        
+        # Configurar grid
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(0, weight=1)
+        
+        # Barra de pesquisa
+        search_frame = ttk.Frame(list_frame)
+        search_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(search_frame, text="Pesquisar:").pack(side=tk.LEFT, padx=(0, 5))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=30)
+        search_entry.pack(side=tk.LEFT, padx=(0, 5))
+        search_entry.bind('<KeyRelease>', self.pesquisar_clientes)
+        
+        ttk.Button(search_frame, text="Novo Cliente", command=self.novo_cliente).pack(side=tk.RIGHT)
+        self.btn_mais_resultados = ttk.Button(search_frame, text="Carregar mais", command=self.carregar_mais_resultados)
+        
+        # Tabela de clientes
+        columns = ('id', 'nome', 'telefone', 'email', 'data_cadastro')
+        self.tree_clientes = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
+        
+        # Definir cabeçalhos
+        self.tree_clientes.heading('id', text='ID')
+        self.tree_clientes.heading('nome', text='Nome')
+        self.tree_clientes.heading('telefone', text='Telefone')
+        self.tree_clientes.heading('email', text='E-mail')
+        self.tree_clientes.heading('data_cadastro', text='Data Cadastro')
+        
+        # Ocultar coluna ID
+        self.tree_clientes.column('id', width=0, stretch=False)
+        
+        # Definir largura das colunas
+        self.tree_clientes.column('nome', width=200)
+        self.tree_clientes.column('telefone', width=120)
+        self.tree_clientes.column('email', width=200)
+        self.tree_clientes.column('data_cadastro', width=120)
+        
+        # Scrollbar
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree_clientes.yview)
+        
+        # Lista virtual: só a janela visível (mais margem) fica carregada
+        self.lista_clientes = ListaVirtual(self.tree_clientes, scrollbar, self.backend, self.executor)
+        
+        self.tree_clientes.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        
+        # Botões de ação
+        btn_frame = ttk.Frame(list_frame)
+        btn_frame.grid(row=2, column=0, columnspan=2, pady=(10, 0), sticky=(tk.E))
+        
+        ttk.Button(btn_frame, text="Editar", command=self.editar_cliente).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Excluir", command=self.excluir_cliente).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Atualizar", command=self.carregar_clientes).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Duplicados...", command=self.procurar_duplicados).pack(side=tk.RIGHT, padx=5)
+        
+        # Importação e exportação em massa
+        dados_btn = ttk.Menubutton(btn_frame, text="Importar/Exportar")
+        dados_menu = tk.Menu(dados_btn, tearoff=0)
+        dados_menu.add_command(label="Importar clientes...", command=lambda: self.importar_dados('clientes'))
+        dados_menu.add_command(label="Importar veículos...", command=lambda: self.importar_dados('veiculos'))
+        dados_menu.add_separator()
+        dados_menu.add_command(label="Exportar clientes...", command=lambda: self.exportar_dados('clientes'))
+        dados_menu.add_command(label="Exportar veículos...", command=lambda: self.exportar_dados('veiculos'))
+        dados_btn['menu'] = dados_menu
+        dados_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Bind duplo clique para editar
+        self.tree_clientes.bind('<Double-1>', lambda e: self.editar_cliente())
+        
+        # Dados da aba são carregados só quando ela é aberta
+        self.carregar_clientes()
+    
+    def criar_aba_veiculos(self, frame):
+        """Criar aba de veículos"""
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(2, weight=1)
+        
+        # Busca por placa
+        busca_frame = ttk.Frame(frame)
+        busca_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(busca_frame, text="Placa:").pack(side=tk.LEFT, padx=(0, 5))
+        self.placa_var = tk.StringVar()
+        placa_entry = ttk.Entry(busca_frame, textvariable=self.placa_var, width=12)
+        placa_entry.pack(side=tk.LEFT, padx=(0, 5))
+        placa_entry.bind('<Return>', lambda e: self.buscar_veiculo())
+        ttk.Button(busca_frame, text="Buscar", command=self.buscar_veiculo).pack(side=tk.LEFT, padx=5)
+        ttk.Button(busca_frame, text="Novo Veículo", command=self.novo_veiculo).pack(side=tk.RIGHT)
+        
+        # Ficha: veículo e proprietário
+        ficha_frame = ttk.LabelFrame(frame, text="Ficha do Veículo", padding="10")
+        ficha_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        self.ficha_veiculo_var = tk.StringVar(value="Informe a placa e pressione Enter")
+        self.ficha_cliente_var = tk.StringVar()
+        self.ficha_resumo_var = tk.StringVar()
+        ttk.Label(ficha_frame, textvariable=self.ficha_veiculo_var, font=('Helvetica', 11, 'bold')).grid(row=0, column=0, sticky=tk.W)
+        ttk.Label(ficha_frame, textvariable=self.ficha_cliente_var).grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Label(ficha_frame, textvariable=self.ficha_resumo_var).grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        
+        # Atendimentos recentes
+        columns = ('data', 'horario', 'status', 'servico', 'tecnico', 'valor')
+        self.tree_historico_veiculo = ttk.Treeview(frame, columns=columns, show='headings', height=12)
+        
+        self.tree_historico_veiculo.heading('data', text='Data')
+        self.tree_historico_veiculo.heading('horario', text='Horário')
+        self.tree_historico_veiculo.heading('status', text='Status')
+        self.tree_historico_veiculo.heading('servico', text='Serviço')
+        self.tree_historico_veiculo.heading('tecnico', text='Técnico')
+        self.tree_historico_veiculo.heading('valor', text='Valor')
+        
+        self.tree_historico_veiculo.column('data', width=100)
+        self.tree_historico_veiculo.column('horario', width=80)
+        self.tree_historico_veiculo.column('status', width=120)
+        self.tree_historico_veiculo.column('servico', width=200)
+        self.tree_historico_veiculo.column('tecnico', width=150)
+        self.tree_historico_veiculo.column('valor', width=100)
+        
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree_historico_veiculo.yview)
+        self.tree_historico_veiculo.configure(yscroll=scrollbar.set)
+        
+        self.tree_historico_veiculo.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=2, column=1, sticky=(tk.N, tk.S))
+        
+        # Páginas seguintes do histórico, a partir da última linha exibida;
+        # esgotado o período ativo, segue pelos atendimentos arquivados
+        self._historico_veiculo = None
+        self._historico_esgotado = False
+        self._historico_no_arquivo = False
+        self.btn_mais_historico = ttk.Button(frame, text="Carregar mais", command=self.carregar_mais_historico)
+        
+        placa_entry.focus()
+    
+    def criar_aba_servicos(self, frame):
+        """Criar aba de serviços"""
+        
+        ttk.Label(frame, text="Funcionalidade de serviços em desenvolvimento", 
+                 font=('Helvetica', 12)).pack(expand=True)
+    
+    def criar_aba_agendamentos(self, frame):
+        """Criar aba de agendamentos"""
+        
+        ttk.Label(frame, text="Funcionalidade de agendamentos em desenvolvimento", 
+                 font=('Helvetica', 12)).pack(expand=True)
+    
+    def criar_aba_tecnicos(self, frame):
+        """Criar aba de carga dos técnicos"""
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        opcoes_frame = ttk.Frame(frame)
+        opcoes_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        ttk.Label(opcoes_frame, text="Semana de (AAAA-MM-DD):").pack(side=tk.LEFT, padx=(0, 5))
+        self.escala_data_var = tk.StringVar(value=date.today().isoformat())
+        ttk.Entry(opcoes_frame, textvariable=self.escala_data_var, width=12).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(opcoes_frame, text="Carregar", command=self.carregar_escala).pack(side=tk.LEFT, padx=5)
+        ttk.Button(opcoes_frame, text="Distribuir pendentes", command=self.distribuir_tecnicos).pack(side=tk.LEFT, padx=5)
+        
+        # Minutos atribuídos por dia da semana, total e ocupação do expediente
+        columns = ('tecnico', 'd0', 'd1', 'd2', 'd3', 'd4', 'd5', 'd6', 'total', 'ocupacao')
+        self.tree_tecnicos = ttk.Treeview(frame, columns=columns, show='headings', height=12)
+        self.tree_tecnicos.heading('tecnico', text='Técnico')
+        self.tree_tecnicos.heading('total', text='Total (min)')
+        self.tree_tecnicos.heading('ocupacao', text='Ocupação')
+        self.tree_tecnicos.column('tecnico', width=180)
+        for coluna in columns[1:]:
+            self.tree_tecnicos.column(coluna, width=80, anchor=tk.E)
+        
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree_tecnicos.yview)
+        self.tree_tecnicos.configure(yscroll=scrollbar.set)
+        
+        self.tree_tecnicos.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        
+        # Quem está livre em um horário (consulta só a escala em memória)
+        livres_frame = ttk.Frame(frame)
+        livres_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        ttk.Label(livres_frame, text="Livres em").pack(side=tk.LEFT, padx=(0, 5))
+        self.livres_data_var = tk.StringVar(value=date.today().isoformat())
+        ttk.Entry(livres_frame, textvariable=self.livres_data_var, width=12).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(livres_frame, text="às").pack(side=tk.LEFT, padx=(0, 5))
+        self.livres_horario_var = tk.StringVar(value="14:00")
+        ttk.Entry(livres_frame, textvariable=self.livres_horario_var, width=6).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(livres_frame, text="por (min)").pack(side=tk.LEFT, padx=(0, 5))
+        self.livres_duracao_var = tk.StringVar(value="120")
+        ttk.Entry(livres_frame, textvariable=self.livres_duracao_var, width=5).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(livres_frame, text="Consultar", command=self.consultar_tecnicos_livres).pack(side=tk.LEFT, padx=5)
+        self.livres_var = tk.StringVar()
+        ttk.Label(livres_frame, textvariable=self.livres_var).pack(side=tk.LEFT, padx=5)
+        
+        self.carregar_escala()
+    
+    def criar_aba_relatorios(self, frame):
+        """Criar aba de relatórios"""
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        # Seleção do relatório
+        opcoes_frame = ttk.Frame(frame)
+        opcoes_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.relatorios_por_titulo = {titulo: tipo for tipo, (titulo, _, _) in RELATORIOS.items()}
+        ttk.Label(opcoes_frame, text="Relatório:").pack(side=tk.LEFT, padx=(0, 5))
+        self.relatorio_var = tk.StringVar(value=next(iter(self.relatorios_por_titulo)))
+        ttk.Combobox(
+            opcoes_frame, textvariable=self.relatorio_var,
+            values=list(self.relatorios_por_titulo), state='readonly', width=30
+        ).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(opcoes_frame, text="Gerar", command=self.gerar_relatorio_tela).pack(side=tk.LEFT, padx=5)
+        ttk.Button(opcoes_frame, text="Exportar...", command=self.exportar_relatorio).pack(side=tk.LEFT, padx=5)
+        
+        # Tabela de resultados
+        columns = ('coluna1', 'coluna2', 'coluna3')
+        self.tree_relatorio = ttk.Treeview(frame, columns=columns, show='headings', height=15)
+        self.tree_relatorio.column('coluna1', width=300)
+        self.tree_relatorio.column('coluna2', width=100)
+        self.tree_relatorio.column('coluna3', width=150)
+        
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree_relatorio.yview)
+        self.tree_relatorio.configure(yscroll=scrollbar.set)
+        
+        self.tree_relatorio.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+    
+    def mostrar_diagnostico(self, event=None):
+        """Exibir (criando na primeira vez) a aba de diagnóstico"""
+        if self.aba_diagnostico is None:
+            self.aba_diagnostico = ttk.Frame(self.notebook, padding="10")
+            self.notebook.add(self.aba_diagnostico, text="Diagnóstico")
+            self._abas_pendentes[str(self.aba_diagnostico)] = self.criar_aba_diagnostico
+        self.notebook.select(self.aba_diagnostico)
+    
+    def criar_aba_diagnostico(self, frame):
+        """Criar aba de diagnóstico com as medições de desempenho"""
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        opcoes_frame = ttk.Frame(frame)
+        opcoes_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        ttk.Button(opcoes_frame, text="Atualizar", command=self.exibir_diagnostico).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(opcoes_frame, text="Zerar", command=self.zerar_diagnostico).pack(side=tk.LEFT, padx=5)
+        self.perfil_var = tk.StringVar(value="Iniciar perfil")
+        ttk.Button(opcoes_frame, textvariable=self.perfil_var, command=self.alternar_perfil).pack(side=tk.LEFT, padx=5)
+        ttk.Button(opcoes_frame, text="Exportar JSON...", command=self.exportar_diagnostico).pack(side=tk.LEFT, padx=5)
+        
+        # Medições: SQL por comando, pedidos ao executor, callbacks e intervalos da interface
+        columns = ('categoria', 'nome', 'chamadas', 'total', 'p50', 'p95', 'p99', 'maximo', 'linhas')
+        self.tree_diagnostico = ttk.Treeview(frame, columns=columns, show='headings', height=15)
+        titulos = ('Categoria', 'Nome', 'Chamadas', 'Total (ms)', 'p50', 'p95', 'p99', 'Máx.', 'Linhas')
+        for coluna, titulo in zip(columns, titulos):
+            self.tree_diagnostico.heading(coluna, text=titulo)
+            self.tree_diagnostico.column(coluna, width=80, anchor=tk.E)
+        self.tree_diagnostico.column('categoria', anchor=tk.W)
+        self.tree_diagnostico.column('nome', width=400, anchor=tk.W)
+        
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree_diagnostico.yview)
+        self.tree_diagnostico.configure(yscroll=scrollbar.set)
+        self.tree_diagnostico.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        
+        # Travamentos do loop do Tk e último perfil capturado
+        self.texto_diagnostico = scrolledtext.ScrolledText(frame, height=10, font=('Courier', 9))
+        self.texto_diagnostico.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        
+        self.exibir_diagnostico()
+    
+    def exibir_diagnostico(self):
+        """Preencher a aba de diagnóstico com as medições atuais"""
+        self.tree_diagnostico.delete(*self.tree_diagnostico.get_children())
+        for categoria, nome, valores in self.medidor.resumo():
+            self.tree_diagnostico.insert('', tk.END, values=(
+                categoria, nome, valores['chamadas'], f"{valores['total_ms']:.1f}",
+                f"{valores['p50_ms']:.2f}", f"{valores['p95_ms']:.2f}", f"{valores['p99_ms']:.2f}",
+                f"{valores['maximo_ms']:.1f}", valores['linhas']
+            ))
+        
+        linhas = ["Inicialização: " + ", ".join(f"{etapa} {ms:.0f} ms" for etapa, ms in self.tempos_inicializacao.items())]
+        linhas.append(f"Travamentos do loop (>= {self.detector_travamentos.limite} ms): {len(self.medidor.travamentos)}")
+        linhas.extend(f"  {momento}  {ms:.0f} ms" for momento, ms in reversed(self.medidor.travamentos))
+        if self.perfilador.relatorio:
+            linhas.append("")
+            linhas.append(self.perfilador.relatorio)
+        self.texto_diagnostico.delete('1.0', tk.END)
+        self.texto_diagnostico.insert('1.0', "\n".join(linhas))
+    
+    def zerar_diagnostico(self):
+        """Descartar as medições acumuladas"""
+        self.medidor.zerar()
+        self.exibir_diagnostico()
+    
+    def alternar_perfil(self):
+        """Ligar ou desligar a captura do cProfile no loop do Tk"""
+        if self.perfilador.alternar():
+            self.perfil_var.set("Parar perfil")
+        else:
+            self.perfil_var.set("Iniciar perfil")
+            self.exibir_diagnostico()
+    
+    def exportar_diagnostico(self):
+        """Gravar as medições em JSON"""
+        caminho = filedialog.asksaveasfilename(
+            title="Exportar diagnóstico",
+            defaultextension=".json",
+            initialfile="diagnostico.json",
+            filetypes=[("JSON", "*.json")]
+        )
+        if not caminho:
+            return
+        try:
+            exportar_diagnostico(caminho, self.medidor, self.perfilador, {
+                'inicializacao_ms': self.tempos_inicializacao,
+                'modo': 'servidor' if self.conn is None else 'local',
+            })
+        except OSError as e:
+            messagebox.showerror("Erro", f"Erro ao exportar diagnóstico: {str(e)}")
+            return
+        messagebox.showinfo("Diagnóstico exportado", f"Medições gravadas em {caminho}")
+    
+    def carregar_dados(self):
+        """Carregar dados iniciais"""
+        self.atualizar_dashboard()
+        self.carregar_agenda()
+    
+    def carregar_agenda(self):
+        """Montar o índice de horários ocupados a partir de hoje"""
+        def definir(agenda):
+            self.agenda = agenda
+            self.botao_novo_agendamento.configure(state=tk.NORMAL)
+        self.executor.enviar(self.backend.carregar_agenda, ao_concluir=self.medidor.cronometrar('carregar_agenda', definir))
+    
+    def carregar_clientes(self):
+        """Carregar clientes na tabela"""
+        with self.medidor.intervalo('carregar_clientes'):
+            self.lista_clientes.recarregar()
+    
+    def atualizar_dashboard(self):
+        """Atualizar cards e agendamentos do dia (uma única ida ao banco/servidor)"""
+        self.executor.enviar(
+            self.backend.dados_dashboard,
+            ao_concluir=self.medidor.cronometrar('atualizar_dashboard', self.exibir_dashboard), canal='dashboard'
+        )
+    
+    def exibir_dashboard(self, dados):
+        """Preencher cards e tabela do dashboard"""
+        resumo, agendamentos = dados
+        self.exibir_estatisticas(resumo)
+        self.exibir_agendamentos(agendamentos)
+    
+    def atualizar_dashboard_periodicamente(self):
+        """Atualizar o dashboard e reagendar a próxima atualização"""
+        self.atualizar_dashboard()
+        self.root.after(INTERVALO_DASHBOARD_MS, self.atualizar_dashboard_periodicamente)
+    
+    def agendar_dashboard(self):
+        """Atualizar o dashboard uma vez após uma sequência de alterações"""
+        if self._dashboard_agendado is None:
+            self._dashboard_agendado = self.root.after(ATRASO_DASHBOARD_MS, self._atualizar_dashboard_agendado)
+    
+    def _atualizar_dashboard_agendado(self):
+        self._dashboard_agendado = None
+        self.atualizar_dashboard()
+    
+    def ao_alterar_clientes(self, alterados):
+        """Aplicar à lista de clientes as linhas alteradas (None: recarregar)"""
+        self.agendar_dashboard()
+        if not self.aba_construida("Clientes"):
+            return
+        if alterados is None:
+            if self.search_var.get().strip():
+                self.executar_pesquisa()
+            else:
+                self.carregar_clientes()
+            return
+        
+        pesquisando = self.search_var.get().strip()
+        for cliente_id, operacao in alterados:
+            if operacao == 'D':
+                self.lista_clientes.aplicar_remocao(cliente_id)
+                if self.tree_clientes.exists(str(cliente_id)):
+                    self.tree_clientes.delete(str(cliente_id))
+            elif pesquisando:
+                # Resultado de pesquisa: só as linhas visíveis são atualizadas
+                if self.tree_clientes.exists(str(cliente_id)):
+                    self.executor.enviar(self.backend.linha, cliente_id, ao_concluir=self.atualizar_resultado)
+            else:
+                self.lista_clientes.aplicar_alteracao(cliente_id)
+    
+    def atualizar_resultado(self, cliente):
+        """Atualizar uma linha do resultado de pesquisa, se ainda exibida"""
+        if cliente is not None and self.tree_clientes.exists(str(cliente.id)):
+            self.tree_clientes.item(str(cliente.id), values=cliente.linha())
+    
+    def ao_alterar_agendamentos(self, alterados):
+        """Refletir agendamentos alterados na agenda, na escala e no dashboard"""
+        self.agendar_dashboard()
+        self.atualizar_escala(agendamentos=alterados)
+        if self.agenda is None:
+            return
+        if alterados is None:
+            self.carregar_agenda()
+            return
+        
+        def aplicar(linhas):
+            if self.agenda is None:
+                return
+            por_id = {row[0]: tuple(row[1:]) for row in linhas}
+            for agendamento_id, _ in alterados:
+                self.agenda.atualizar(agendamento_id, por_id.get(agendamento_id))
+        
+        self.executor.enviar(self.backend.agendamentos_por_id, [agendamento_id for agendamento_id, _ in alterados],
+                             ao_concluir=aplicar)
+    
+    def ao_alterar_ordens(self, alterados):
+        """Ordens de serviço alteradas: faturamento do dashboard e escala dos técnicos"""
+        self.agendar_dashboard()
+        self.atualizar_escala(ordens=alterados)
+    
+    def atualizar_escala(self, agendamentos=(), ordens=()):
+        """Aplicar à escala carregada os agendamentos e ordens alterados (None: recarregar)"""
+        if self.escala is None:
+            return
+        if agendamentos is None or ordens is None:
+            self.carregar_escala()
+            return
+        
+        agendamento_ids = {agendamento_id for agendamento_id, _ in agendamentos}
+        # Ordem excluída não aparece mais na consulta: o agendamento dela é relido
+        agendamento_ids.update(self.escala.agendamento_da_ordem(ordem_id) for ordem_id, operacao in ordens if operacao == 'D')
+        agendamento_ids.discard(None)
+        escala = self.escala
+        
+        def aplicar(linhas):
+            if self.escala is not escala:
+                return
+            por_id = {row[0]: tuple(row[1:]) for row in linhas}
+            for agendamento_id in agendamento_ids | set(por_id):
+                escala.atualizar(agendamento_id, por_id.get(agendamento_id))
+            self.exibir_escala(escala)
+        
+        self.executor.enviar(self.backend.escala_por_id, list(agendamento_ids),
+                             [ordem_id for ordem_id, _ in ordens], ao_concluir=aplicar)
+    
+    def carregar_escala(self):
+        """Montar a escala dos técnicos na semana da data informada"""
+        data = self.escala_data_var.get().strip() if self.aba_construida("Técnicos") else date.today().isoformat()
+        try:
+            inicio, fim = semana(data)
+        except ValueError:
+            messagebox.showerror("Erro", "Data inválida. Use o formato AAAA-MM-DD")
+            return
+        self.executor.enviar(self.backend.carregar_escala, inicio, fim,
+                             ao_concluir=self.medidor.cronometrar('carregar_escala', self.exibir_escala), canal='escala')
+    
+    def exibir_escala(self, escala):
+        """Preencher a carga de cada técnico na semana"""
+        self.escala = escala
+        if not self.aba_construida("Técnicos"):
+            return
+        dias = [date.fromisoformat(escala.inicio) + timedelta(days=i) for i in range(7)]
+        nomes_dias = ('Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom')
+        for i, dia in enumerate(dias):
+            self.tree_tecnicos.heading(f'd{i}', text=f"{nomes_dias[i]} {dia.strftime('%d/%m')}")
+        capacidade = sum(escala.capacidade(dia.isoformat()) for dia in dias)
+        
+        self.tree_tecnicos.delete(*self.tree_tecnicos.get_children())
+        for tecnico, minutos in escala.carga(escala.inicio, escala.fim).items():
+            total = sum(minutos)
+            ocupacao = f"{total / capacidade:.0%}" if capacidade else ""
+            self.tree_tecnicos.insert('', tk.END, values=(tecnico, *minutos, total, ocupacao))
+        
+        self.status_var.set(f"Escala de {escala.inicio} a {escala.fim}: {len(escala.pendentes)} serviço(s) sem técnico"
+                            + (f", {len(escala.conflitos)} sobreposto(s)" if escala.conflitos else ""))
+    
+    def distribuir_tecnicos(self):
+        """Atribuir os serviços sem técnico equilibrando a carga da semana"""
+        if self.escala is None:
+            messagebox.showinfo("Aguarde", "A escala ainda está sendo carregada")
+            return
+        if not self.escala.tecnicos:
+            messagebox.showwarning("Técnicos", "Nenhum técnico cadastrado (config.TECNICOS) ou com ordens recentes")
+            return
+        atribuicoes = self.escala.distribuir()
+        if not atribuicoes:
+            messagebox.showinfo("Técnicos", "Nenhum serviço pendente pôde ser atribuído")
+            return
+        self.exibir_escala(self.escala)
+        
+        def falhou(e):
+            messagebox.showerror("Erro", f"Erro ao atribuir técnicos: {str(e)}")
+            self.carregar_escala()
+        
+        self.executor.gravar(
+            self.backend.atribuir_tecnicos, list(atribuicoes.items()),
+            ao_concluir=lambda quantidade: self.status_var.set(f"{quantidade} serviço(s) atribuído(s)"),
+            ao_falhar=falhou
+        )
+    
+    def consultar_tecnicos_livres(self):
+        """Listar os técnicos livres no horário informado"""
+        if self.escala is None:
+            return
+        data = self.livres_data_var.get().strip()
+        if not self.escala.inicio <= data <= self.escala.fim:
+            self.livres_var.set("Data fora da semana carregada")
+            return
+        try:
+            duracao = int(self.livres_duracao_var.get())
+            livres = self.escala.livres(data, self.livres_horario_var.get().strip(), duracao)
+        except ValueError:
+            messagebox.showerror("Erro", "Informe data (AAAA-MM-DD), horário (HH:MM) e duração em minutos")
+            return
+        self.livres_var.set(", ".join(livres) if livres else "Nenhum técnico livre")
+    
+    def ao_alterar_veiculos(self, alterados):
+        """Atualizar a ficha exibida se o veículo foi alterado"""
+        if not self.aba_construida("Veículos") or self._historico_veiculo is None:
+            return
+        if alterados is None or any(veiculo_id == self._historico_veiculo for veiculo_id, _ in alterados):
+            self.buscar_veiculo()
+    
+    def exibir_estatisticas(self, resumo):
+        """Preencher os cards do dashboard"""
+        if 'dados_iniciais' not in self.tempos_inicializacao:
+            self.registrar_etapa('dados_iniciais')
+            self.status_var.set("Sistema pronto - " + ", ".join(
+                f"{etapa}: {ms:.0f} ms" for etapa, ms in self.tempos_inicializacao.items()))
+        self.cards_dashboard['agendamentos'].set(str(resumo['agendamentos']))
+        self.cards_dashboard['em_andamento'].set(str(resumo['em_andamento']))
+        self.cards_dashboard['concluidos'].set(str(resumo['concluidos']))
+        self.cards_dashboard['faturamento'].set(formatar_moeda(resumo['faturamento']))
+    
+    def exibir_agendamentos(self, agendamentos):
+        """Preencher a tabela de agendamentos do dia"""
+        # Limpar tabela
+        self.tree_agendamentos.delete(*self.tree_agendamentos.get_children())
+        
+        # Adicionar à tabela
+        for agendamento in agendamentos:
+            self.tree_agendamentos.insert('', tk.END, values=agendamento)
+    
+    def pesquisar_clientes(self, event=None):
+        """Pesquisar clientes conforme digitação"""
+        # Cancelar a pesquisa pendente e aguardar o usuário parar de digitar
+        if self._pesquisa_agendada is not None:
+            self.root.after_cancel(self._pesquisa_agendada)
+        self.executor.cancelar('pesquisa')
+        self._pesquisa_agendada = self.root.after(ATRASO_PESQUISA_MS, self.executar_pesquisa)
+    
+    def executar_pesquisa(self):
+        """Executar a pesquisa agendada e exibir a primeira página"""
+        self._pesquisa_agendada = None
+        termo = self.search_var.get()
+        if not termo.strip():
+            self.executor.enviar(self.backend.invalidar_busca)
+            self.btn_mais_resultados.pack_forget()
+            self.carregar_clientes()
+            return
+        
+        self._pesquisa_apos = None
+        self._pesquisa_exibidos = 0
+        self.lista_clientes.suspender()
+        self.carregar_mais_resultados()
+    
+    def carregar_mais_resultados(self):
+        """Buscar a próxima página da pesquisa atual"""
+        self.executor.enviar(
+            self.backend.pesquisar_clientes, self.search_var.get(), self._pesquisa_apos,
+            ao_concluir=self.medidor.cronometrar('pesquisar_clientes', self.exibir_resultados), canal='pesquisa'
+        )
+    
+    def exibir_resultados(self, resultado):
+        """Adicionar uma página de resultados à tabela"""
+        linhas, ha_mais = resultado
+        for cliente in linhas:
+            # Um cliente renomeado entre as páginas pode voltar depois da chave
+            if not self.tree_clientes.exists(str(cliente.id)):
+                self.tree_clientes.insert('', tk.END, iid=str(cliente.id), values=cliente.linha())
+                self._pesquisa_exibidos += 1
+        if linhas:
+            self._pesquisa_apos = (linhas[-1].nome, linhas[-1].id)
+        
+        if ha_mais:
+            self.btn_mais_resultados.pack(side=tk.LEFT)
+        else:
+            self.btn_mais_resultados.pack_forget()
+        self.status_var.set(f"{self._pesquisa_exibidos} cliente(s) exibido(s)" + (" - há mais resultados" if ha_mais else ""))
+    
+    def novo_cliente(self):
+        """Abrir formulário para novo cliente"""
+        self.formulario_cliente()
+    
+    def procurar_duplicados(self):
+        """Procurar cadastros de clientes duplicados em segundo plano"""
+        self.status_var.set("Procurando clientes duplicados...")
+        self.executor.enviar(
+            self.backend.procurar_duplicados,
+            ao_concluir=self.medidor.cronometrar('procurar_duplicados', self.janela_duplicados), canal='duplicados'
+        )
+    
+    def janela_duplicados(self, pares):
+        """Lista de pares prováveis de duplicados com mesclagem"""
+        self.status_var.set(f"{len(pares)} par(es) de clientes possivelmente duplicados")
+        if not pares:
+            messagebox.showinfo("Duplicados", "Nenhum cliente duplicado encontrado")
+            return
+        
+        janela = tk.Toplevel(self.root)
+        janela.title("Clientes duplicados")
+        janela.geometry("900x450")
+        janela.transient(self.root)
+        
+        frame = ttk.Frame(janela, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(0, weight=1)
+        
+        columns = ('pontuacao', 'cliente_a', 'cliente_b')
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=15)
+        tree.heading('pontuacao', text='Semelhança')
+        tree.heading('cliente_a', text='Cadastro 1')
+        tree.heading('cliente_b', text='Cadastro 2')
+        tree.column('pontuacao', width=90, anchor=tk.E)
+        tree.column('cliente_a', width=380)
+        tree.column('cliente_b', width=380)
+        
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        def descrever(cliente):
+            cliente_id, nome, telefone, email = cliente
+            return f"{cliente_id} - {nome} | {telefone or ''} | {email or ''}"
+        
+        por_item = {}
+        for pontuacao, cliente_a, cliente_b in pares:
+            item = tree.insert('', tk.END, values=(f"{pontuacao:.0%}", descrever(cliente_a), descrever(cliente_b)))
+            por_item[item] = (cliente_a, cliente_b)
+        
+        def selecionado():
+            selection = tree.selection()
+            if not selection:
+                messagebox.showwarning("Seleção", "Selecione um par de cadastros", parent=janela)
+                return None, None
+            return selection[0], por_item[selection[0]]
+        
+        def mesclar(manter_primeiro):
+            item, par = selecionado()
+            if item is None:
+                return
+            manter, remover = par if manter_primeiro else par[::-1]
+            if not messagebox.askyesno(
+                "Confirmar",
+                f"Manter {manter[1]} (id {manter[0]}) e juntar a ele veículos e agendamentos de "
+                f"{remover[1]} (id {remover[0]})? O segundo cadastro será excluído.", parent=janela
+            ):
+                return
+            
+            def concluido(resultado):
+                veiculos, agendamentos = resultado
+                if tree.exists(item):
+                    tree.delete(item)
+                self.status_var.set(f"Clientes mesclados: {veiculos} veículo(s) e {agendamentos} agendamento(s) transferidos")
+            
+            self.executor.gravar(
+                self.backend.mesclar_clientes, manter[0], [remover[0]],
+                ao_concluir=concluido,
+                ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao mesclar clientes: {str(e)}", parent=janela)
+            )
+        
+        def distintos():
+            item, par = selecionado()
+            if item is None:
+                return
+            tree.delete(item)
+            self.executor.gravar(self.backend.marcar_distintos, par[0][0], par[1][0])
+        
+        btn_frame = ttk.Frame(frame)
+        btn_frame.grid(row=1, column=0, columnspan=2, pady=(10, 0), sticky=tk.E)
+        ttk.Button(btn_frame, text="Fechar", command=janela.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Não são duplicados", command=distintos).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Manter cadastro 2", command=lambda: mesclar(False)).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Manter cadastro 1", command=lambda: mesclar(True)).pack(side=tk.RIGHT, padx=5)
+    
+    def cliente_selecionado(self, ao_obter, aviso):
+        """Entregar a ao_obter o registro do cliente selecionado na lista
+        
+        A lista e a pesquisa exibem registros do repositório: em geral o
+        cliente já está em memória e nada é lido do banco.
+        """
+        selection = self.tree_clientes.selection() if self.aba_construida("Clientes") else ()
+        if not selection:
+            messagebox.showwarning("Seleção", aviso)
+            return
+        
+        cliente_id = int(selection[0])
+        cliente = self.backend.repositorio.em_memoria(Cliente, cliente_id)
+        if cliente is not None:
+            ao_obter(cliente)
+            return
+        
+        def obtido(cliente):
+            if cliente is None:
+                messagebox.showwarning("Seleção", "O cliente selecionado não existe mais")
+            else:
+                ao_obter(cliente)
+        
+        self.executor.enviar(self.backend.ler_cliente, cliente_id, ao_concluir=obtido)
+    
+    def editar_cliente(self):
+        """Abrir formulário para editar cliente selecionado"""
+        self.cliente_selecionado(self.formulario_cliente, "Selecione um cliente para editar")
+    
+    def formulario_cliente(self, cliente=None):
+        """Janela de formulário de cliente (sem `cliente`: novo cadastro)"""
+        cliente_id = cliente.id if cliente is not None else None
+        
+        # Criar janela
+        form_window = tk.Toplevel(self.root)
+        form_window.title("Novo Cliente" if cliente_id is None else "Editar Cliente")
+        form_window.geometry("500x440")
+        form_window.grab_set()  # Modal
+        form_window.transient(self.root)  # Pertence à janela principal
+        
+        # Frame principal
+        main_frame = ttk.Frame(form_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Variáveis do formulário
+        nome_var = tk.StringVar()
+        telefone_var = tk.StringVar()
+        email_var = tk.StringVar()
+        endereco_var = tk.StringVar()
+        
+        # Se estiver editando, carregar dados
+        if cliente is not None:
+            nome_var.set(cliente.nome)
+            telefone_var.set(cliente.telefone or "")
+            email_var.set(cliente.email or "")
+            endereco_var.set(cliente.endereco or "")
+        
+        # Campos do formulário
+        ttk.Label(main_frame, text="Nome *", font=('Helvetica', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        nome_entry = ttk.Entry(main_frame, textvariable=nome_var, width=40)
+        nome_entry.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(main_frame, text="Telefone", font=('Helvetica', 10, 'bold')).grid(row=2, column=0, sticky=tk.W, pady=(0, 5))
+        telefone_entry = ttk.Entry(main_frame, textvariable=telefone_var, width=40)
+        telefone_entry.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(main_frame, text="E-mail", font=('Helvetica', 10, 'bold')).grid(row=4, column=0, sticky=tk.W, pady=(0, 5))
+        email_entry = ttk.Entry(main_frame, textvariable=email_var, width=40)
+        email_entry.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(main_frame, text="Endereço", font=('Helvetica', 10, 'bold')).grid(row=6, column=0, sticky=tk.W, pady=(0, 5))
+        endereco_text = scrolledtext.ScrolledText(main_frame, width=38, height=4)
+        endereco_text.grid(row=7, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        endereco_text.insert('1.0', endereco_var.get())
+        
+        # Aviso de cadastro parecido, verificado quando o usuário para de digitar
+        aviso_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=aviso_var, foreground='#e67e22', wraplength=440).grid(row=8, column=0, columnspan=2, sticky=tk.W)
+        verificacao = [None]
+        
+        def mostrar_parecidos(sugestoes):
+            if not form_window.winfo_exists():
+                return
+            aviso_var.set("Possível duplicado: " + "; ".join(
+                f"{parecido[1]} ({parecido[2] or parecido[3] or 'sem contato'})" for _, parecido in sugestoes
+            ) if sugestoes else "")
+        
+        def verificar_parecidos():
+            verificacao[0] = None
+            nome, telefone, email = nome_var.get().strip(), telefone_var.get().strip(), email_var.get().strip()
+            if len(nome) < 3 and not telefone and not email:
+                aviso_var.set("")
+                return
+            self.executor.enviar(self.backend.possiveis_duplicados, nome, telefone, email, cliente_id,
+                                 ao_concluir=mostrar_parecidos, canal='duplicados_formulario')
+        
+        def agendar_verificacao(event=None):
+            if verificacao[0] is not None:
+                self.root.after_cancel(verificacao[0])
+            verificacao[0] = self.root.after(ATRASO_DUPLICADOS_MS, verificar_parecidos)
+        
+        for entry in (nome_entry, telefone_entry, email_entry):
+            entry.bind('<KeyRelease>', agendar_verificacao)
+        
+        # Botões
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.grid(row=9, column=0, columnspan=2, pady=(20, 0))
+        
+        def salvar_cliente():
+            try:
+                registro, dados = preparar_cliente(
+                    cliente, nome_var.get(), telefone_var.get(), email_var.get(), endereco_text.get('1.0', tk.END)
+                )
+            except ErroValidacao as e:
+                messagebox.showerror("Erro", str(e))
+                return
+            
+            gravado = self.medidor.cronometrar('salvar_cliente')
+            
+            def concluido(registro):
+                gravado()
+                if cliente_id is None:
+                    messagebox.showinfo("Sucesso", "Cliente cadastrado com sucesso")
+                else:
+                    messagebox.showinfo("Sucesso", "Cliente atualizado com sucesso")
+                self.atualizar_cliente_na_lista(registro)
+                form_window.destroy()
+            
+            def falhou(e):
+                # O registro compartilhado só muda depois do commit: nada a desfazer
+                messagebox.showerror("Erro", f"Erro ao salvar cliente: {str(e)}")
+            
+            # Só os campos alterados vão para o UPDATE
+            self.executor.gravar(self.backend.salvar_cliente, registro, dados, ao_concluir=concluido, ao_falhar=falhou)
+        
+        ttk.Button(btn_frame, text="Salvar", command=salvar_cliente).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Cancelar", command=form_window.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        # Configurar grid
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        
+        # Focar no campo nome
+        nome_entry.focus()
+    
+    def excluir_cliente(self):
+        """Excluir cliente selecionado"""
+        self.cliente_selecionado(self.confirmar_exclusao_cliente, "Selecione um cliente para excluir")
+    
+    def confirmar_exclusao_cliente(self, cliente):
+        """Pedir confirmação e excluir o cliente"""
+        cliente_id = cliente.id
+        
+        # Confirmar exclusão
+        if not messagebox.askyesno("Confirmar", f"Tem certeza que deseja excluir o cliente {cliente.nome}?"):
+            return
+        
+        excluido = self.medidor.cronometrar('excluir_cliente')
+        
+        def concluido(_):
+            excluido()
+            self.lista_clientes.aplicar_remocao(cliente_id)
+            if self.tree_clientes.exists(str(cliente_id)):
+                self.tree_clientes.delete(str(cliente_id))
+            messagebox.showinfo("Sucesso", "Cliente excluído com sucesso")
+        
+        # Excluir cliente
+        self.executor.gravar(
+            self.backend.apagar_cliente, cliente_id,
+            ao_concluir=concluido,
+            ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao excluir cliente: {str(e)}")
+        )
+    
+    def buscar_veiculo(self):
+        """Abrir a ficha do veículo pela placa digitada"""
+        placa = self.placa_var.get()
+        if not placa.strip():
+            return
+        self.executor.cancelar('historico_veiculo')
+        
+        # Fichas consultadas há pouco são exibidas sem passar pelo executor
+        ficha = self.backend.ficha_em_cache(placa)
+        if ficha is not None:
+            self.exibir_ficha_veiculo(placa, ficha)
+            return
+        
+        self.executor.enviar(
+            self.backend.ficha_veiculo, placa,
+            ao_concluir=self.medidor.cronometrar('buscar_veiculo', lambda ficha: self.exibir_ficha_veiculo(placa, ficha)),
+            ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao buscar veículo: {str(e)}"),
+            canal='ficha_veiculo'
+        )
+    
+    def exibir_ficha_veiculo(self, placa, ficha):
+        """Preencher a ficha do veículo e seus atendimentos recentes"""
+        self.tree_historico_veiculo.delete(*self.tree_historico_veiculo.get_children())
+        self._historico_veiculo = None
+        self._historico_no_arquivo = False
+        if ficha is None:
+            self.ficha_veiculo_var.set(f"Nenhum veículo com a placa {limpar_placa(placa)}")
+            self.ficha_cliente_var.set("")
+            self.ficha_resumo_var.set("")
+            self.btn_mais_historico.grid_remove()
+            return
+        
+        veiculo = ficha['veiculo']
+        self.ficha_veiculo_var.set(
+            f"{veiculo['placa']} - {veiculo['marca']} {veiculo['modelo']}"
+            + (f" {veiculo['ano']}" if veiculo['ano'] else "")
+            + (f" - {veiculo['quilometragem']} km" if veiculo['quilometragem'] is not None else "")
+        )
+        cliente = ficha['cliente']
+        if cliente is not None:
+            self.ficha_cliente_var.set(
+                f"Proprietário: {cliente['nome']}"
+                + (f" - {cliente['telefone']}" if cliente['telefone'] else "")
+                + (f" - {cliente['email']}" if cliente['email'] else "")
+            )
+        else:
+            self.ficha_cliente_var.set("Proprietário: (não informado)")
+        
+        resumo = ficha['resumo']
+        self.ficha_resumo_var.set(
+            f"{resumo['visitas']} visita(s) concluída(s)"
+            + (f" - última em {resumo['ultima_visita']}" if resumo['ultima_visita'] else "")
+            + f" - total gasto {formatar_moeda(resumo['total_gasto'])}"
+        )
+        
+        self._historico_veiculo = veiculo['id']
+        self.exibir_historico_veiculo((ficha['historico'], ficha['ha_mais']))
+    
+    def exibir_historico_veiculo(self, resultado):
+        """Adicionar uma página do histórico do veículo à tabela"""
+        linhas, ha_mais = resultado
+        for agendamento_id, data, horario, status, servico, tecnico, valor in linhas:
+            self.tree_historico_veiculo.insert('', tk.END, iid=str(agendamento_id), values=(
+                data, horario or "", status or "", servico or "", tecnico or "",
+                formatar_moeda(valor) if valor is not None else ""
+            ))
+        
+        self._historico_esgotado = not ha_mais
+        if ha_mais:
+            self.btn_mais_historico.configure(text="Carregar mais")
+            self.btn_mais_historico.grid(row=3, column=0, sticky=tk.E, pady=(10, 0))
+        elif not self._historico_no_arquivo:
+            self.btn_mais_historico.configure(text="Ver atendimentos arquivados")
+            self.btn_mais_historico.grid(row=3, column=0, sticky=tk.E, pady=(10, 0))
+        else:
+            self.btn_mais_historico.grid_remove()
+            if not linhas:
+                self.status_var.set("Nenhum atendimento arquivado para este veículo")
+    
+    def carregar_mais_historico(self):
+        """Buscar a próxima página do histórico do veículo exibido"""
+        if self._historico_veiculo is None:
+            return
+        itens = self.tree_historico_veiculo.get_children()
+        if self._historico_esgotado:
+            # Fim do período ativo: os atendimentos arquivados são todos mais antigos
+            self._historico_no_arquivo = True
+            antes = None
+        elif itens:
+            ultimo = itens[-1]
+            antes = (self.tree_historico_veiculo.item(ultimo)['values'][0], int(ultimo))
+        else:
+            return
+        funcao = self.backend.historico_arquivado if self._historico_no_arquivo else self.backend.historico_veiculo
+        self.executor.enviar(
+            funcao, self._historico_veiculo, antes,
+            ao_concluir=self.exibir_historico_veiculo, canal='historico_veiculo'
+        )
+    
+    def novo_veiculo(self):
+        """Abrir formulário de veículo para o cliente selecionado"""
+        self.cliente_selecionado(self.formulario_veiculo, "Selecione o proprietário na aba Clientes")
+    
+    def formulario_veiculo(self, cliente):
+        """Janela de formulário de veículo"""
+        form_window = tk.Toplevel(self.root)
+        form_window.title("Novo Veículo")
+        form_window.geometry("500x380")
+        form_window.grab_set()  # Modal
+        form_window.transient(self.root)  # Pertence à janela principal
+        
+        main_frame = ttk.Frame(form_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        campos = [
+            ("Placa *", tk.StringVar()),
+            ("Marca *", tk.StringVar()),
+            ("Modelo *", tk.StringVar()),
+            ("Ano", tk.StringVar()),
+            ("Quilometragem", tk.StringVar()),
+        ]
+        
+        ttk.Label(main_frame, text=f"Proprietário: {cliente.nome}", font=('Helvetica', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=(0, 10))
+        
+        entradas = []
+        for i, (rotulo, variavel) in enumerate(campos):
+            ttk.Label(main_frame, text=rotulo, font=('Helvetica', 10, 'bold')).grid(row=1 + i, column=0, sticky=tk.W, pady=(0, 5))
+            entrada = ttk.Entry(main_frame, textvariable=variavel, width=30)
+            entrada.grid(row=1 + i, column=1, sticky=(tk.W, tk.E), pady=(0, 5))
+            entradas.append(entrada)
+        placa_var, marca_var, modelo_var, ano_var, km_var = (variavel for _, variavel in campos)
+        
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.grid(row=len(campos) + 1, column=0, columnspan=2, pady=(20, 0))
+        
+        def salvar_veiculo():
+            try:
+                registro, dados = preparar_veiculo(
+                    cliente.id, placa_var.get(), marca_var.get(), modelo_var.get(), ano_var.get(), km_var.get()
+                )
+            except ErroValidacao as e:
+                messagebox.showerror("Erro", str(e))
+                return
+            
+            gravado = self.medidor.cronometrar('salvar_veiculo')
+            
+            def concluido(_):
+                gravado()
+                messagebox.showinfo("Sucesso", "Veículo cadastrado com sucesso")
+                form_window.destroy()
+                if self.aba_construida("Veículos"):
+                    self.placa_var.set(dados['placa'])
+                    self.buscar_veiculo()
+            
+            self.executor.gravar(
+                self.backend.salvar_veiculo, registro, dados,
+                ao_concluir=concluido,
+                ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao salvar veículo: {str(e)}")
+            )
+        
+        ttk.Button(btn_frame, text="Salvar", command=salvar_veiculo).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Cancelar", command=form_window.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        main_frame.columnconfigure(1, weight=1)
+        entradas[0].focus()
+    
+    def atualizar_cliente_na_lista(self, cliente):
+        """Refletir um cliente gravado na tabela a partir do registro gravado"""
+        if self.search_var.get().strip():
+            # Resultado de pesquisa: atualizar a linha se ela estiver visível
+            self.atualizar_resultado(cliente)
+        else:
+            self.lista_clientes.aplicar_alteracao(cliente.id, cliente)
+    
+    def importar_dados(self, tabela):
+        """Importar clientes ou veículos de um arquivo CSV/JSON Lines"""
+        if self.conn is None:
+            messagebox.showinfo("Importação", "Com servidor, importe no próprio servidor: python importacao.py importar ...")
+            return
+        caminho = filedialog.askopenfilename(
+            title="Importar dados",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.ndjson")]
+        )
+        if not caminho:
+            return
+        
+        try:
+            importador = Importador(self.conn, tabela, caminho)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Erro", f"Erro ao abrir arquivo: {str(e)}")
+            return
+        
+        def progresso():
+            percentual = 100 * importador.bytes_lidos // max(importador.tamanho_arquivo, 1)
+            self.status_var.set(f"Importando {tabela}: {importador.processados} registros ({percentual}%)")
+        
+        def concluido():
+            self.status_var.set("Sistema pronto")
+            self.executor.enviar(self.backend.limpar_caches)
+            self.carregar_clientes()
+            messagebox.showinfo(
+                "Importação concluída",
+                f"{importador.inseridos} inserido(s), {importador.ignorados} repetido(s), "
+                f"{importador.rejeitados} rejeitado(s)"
+            )
+        
+        self.executar_em_lotes(importador.importar_lote, importador.fechar, progresso, concluido)
+    
+    def exportar_dados(self, tabela):
+        """Exportar clientes ou veículos para CSV/JSON Lines"""
+        if self.conn is None:
+            messagebox.showinfo("Exportação", "Com servidor, exporte no próprio servidor: python importacao.py exportar ...")
+            return
+        caminho = filedialog.asksaveasfilename(
+            title="Exportar dados",
+            defaultextension=".csv",
+            initialfile=f"{tabela}.csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")]
+        )
+        if not caminho:
+            return
+        
+        try:
+            exportador = Exportador(self.conn, tabela, caminho)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Erro", f"Erro ao criar arquivo: {str(e)}")
+            return
+        
+        def progresso():
+            self.status_var.set(f"Exportando {tabela}: {exportador.exportados} registros")
+        
+        def concluido():
+            self.status_var.set("Sistema pronto")
+            messagebox.showinfo("Exportação concluída", f"{exportador.exportados} registro(s) exportado(s)")
+        
+        self.executar_em_lotes(exportador.exportar_lote, exportador.fechar, progresso, concluido)
+    
+    def executar_em_lotes(self, lote, cancelar, progresso, concluido):
+        """Executar lote() repetidamente no executor até retornar False
+        
+        Cada lote é um pedido separado, então pesquisas e gravações da
+        interface continuam sendo atendidas entre um lote e outro.
+        """
+        def falhou(e):
+            cancelar()
+            self.status_var.set("Sistema pronto")
+            messagebox.showerror("Erro", f"Erro ao processar arquivo: {str(e)}")
+        
+        def apos_lote(continua):
+            progresso()
+            if continua:
+                self.executor.enviar(lote, ao_concluir=apos_lote, ao_falhar=falhou)
+            else:
+                concluido()
+        
+        self.executor.enviar(lote, ao_concluir=apos_lote, ao_falhar=falhou)
+    
+    def gerar_relatorio_tela(self):
+        """Atualizar os agregados e exibir o relatório selecionado"""
+        tipo = self.relatorios_por_titulo[self.relatorio_var.get()]
+        _, cabecalhos, _ = RELATORIOS[tipo]
+        
+        def exibir(linhas):
+            self.status_var.set("Sistema pronto")
+            for coluna, cabecalho in zip(self.tree_relatorio['columns'], cabecalhos):
+                self.tree_relatorio.heading(coluna, text=cabecalho)
+            self.tree_relatorio.delete(*self.tree_relatorio.get_children())
+            for ordem, ordens, faturamento in linhas:
+                self.tree_relatorio.insert('', tk.END, values=(ordem, ordens, formatar_moeda(faturamento)))
+        
+        self.status_var.set("Gerando relatório...")
+        self.executor.enviar(self.backend.relatorio_tela, tipo, ao_concluir=exibir, canal='relatorio')
+    
+    def exportar_relatorio(self):
+        """Gravar o relatório selecionado completo em CSV ou HTML"""
+        tipo = self.relatorios_por_titulo[self.relatorio_var.get()]
+        caminho = filedialog.asksaveasfilename(
+            title="Exportar relatório",
+            defaultextension=".csv",
+            initialfile=f"relatorio_{tipo}.csv",
+            filetypes=[("CSV", "*.csv"), ("HTML", "*.html")]
+        )
+        if not caminho:
+            return
+        
+        self.status_var.set("Exportando relatório...")
+        
+        def concluido(linhas):
+            self.status_var.set("Sistema pronto")
+            messagebox.showinfo("Relatório exportado", f"{linhas} linha(s) gravada(s) em {caminho}")
+        
+        def falhou(e):
+            self.status_var.set("Sistema pronto")
+            messagebox.showerror("Erro", f"Erro ao exportar relatório: {str(e)}")
+        
+        self.executor.enviar(self.backend.exportar_relatorio, tipo, caminho, ao_concluir=concluido, ao_falhar=falhou)
+    
+    def novo_agendamento(self):
+        """Abrir formulário para novo agendamento"""
+        def abrir(cliente):
+            if self.agenda is None:
+                messagebox.showinfo("Aguarde", "A agenda ainda está sendo carregada")
+                return
+            self.executor.enviar(
+                self.backend.listar_servicos,
+                ao_concluir=lambda servicos: self.formulario_agendamento(cliente, servicos)
+            )
+        
+        self.cliente_selecionado(abrir, "Selecione um cliente na aba Clientes para agendar")
+    
+    def formulario_agendamento(self, cliente, servicos):
+        """Janela de formulário de agendamento"""
+        form_window = tk.Toplevel(self.root)
+        form_window.title("Novo Agendamento")
+        form_window.geometry("500x420")
+        form_window.grab_set()  # Modal
+        form_window.transient(self.root)  # Pertence à janela principal
+        
+        main_frame = ttk.Frame(form_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        servicos_por_nome = {nome: (servico_id, self.agenda.duracao(servico_id)) for servico_id, nome in servicos}
+        
+        servico_var = tk.StringVar()
+        data_var = tk.StringVar(value=date.today().isoformat())
+        horario_var = tk.StringVar()
+        
+        ttk.Label(main_frame, text=f"Cliente: {cliente.nome}", font=('Helvetica', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=(0, 10))
+        
+        ttk.Label(main_frame, text="Serviço *", font=('Helvetica', 10, 'bold')).grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
+        servico_combo = ttk.Combobox(main_frame, textvariable=servico_var, values=list(servicos_por_nome), state='readonly', width=38)
+        servico_combo.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(main_frame, text="Data * (AAAA-MM-DD)", font=('Helvetica', 10, 'bold')).grid(row=3, column=0, sticky=tk.W, pady=(0, 5))
+        data_entry = ttk.Entry(main_frame, textvariable=data_var, width=40)
+        data_entry.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(main_frame, text="Horário *", font=('Helvetica', 10, 'bold')).grid(row=5, column=0, sticky=tk.W, pady=(0, 5))
+        horario_combo = ttk.Combobox(main_frame, textvariable=horario_var, width=38)
+        horario_combo.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(main_frame, text="Observações", font=('Helvetica', 10, 'bold')).grid(row=7, column=0, sticky=tk.W, pady=(0, 5))
+        observacoes_text = scrolledtext.ScrolledText(main_frame, width=38, height=3)
+        observacoes_text.grid(row=8, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        def sugerir_horarios(event=None):
+            # Consulta só a agenda em memória: pode rodar a cada tecla
+            if servico_var.get() not in servicos_por_nome:
+                return
+            duracao = servicos_por_nome[servico_var.get()][1]
+            try:
+                data = date.fromisoformat(data_var.get().strip())
+            except ValueError:
+                return
+            agora = datetime.now()
+            minuto = agora.hour * 60 + agora.minute if data == agora.date() else 0
+            horarios = self.agenda.horarios_livres(data.isoformat(), duracao, minuto)
+            horario_combo['values'] = horarios
+            if not horarios:
+                proximos = self.agenda.proximos_horarios(duracao, 1, datetime.combine(data, datetime.min.time()))
+                self.status_var.set(f"Sem horários em {data.isoformat()}" + (f"; próximo livre: {proximos[0][0]} {proximos[0][1]}" if proximos else ""))
+        
+        servico_combo.bind('<<ComboboxSelected>>', sugerir_horarios)
+        data_entry.bind('<KeyRelease>', sugerir_horarios)
+        
+        def mostrar_tecnicos_livres(event=None):
+            # Só com a escala da semana já carregada (aba Técnicos)
+            data = data_var.get().strip()
+            if self.escala is None or servico_var.get() not in servicos_por_nome or not self.escala.inicio <= data <= self.escala.fim:
+                return
+            try:
+                livres = self.escala.livres(data, horario_var.get().strip(), servicos_por_nome[servico_var.get()][1])
+            except ValueError:
+                return
+            self.status_var.set(f"Técnicos livres às {horario_var.get().strip()}: " + (", ".join(livres) or "nenhum"))
+        
+        horario_combo.bind('<<ComboboxSelected>>', mostrar_tecnicos_livres)
+        
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.grid(row=9, column=0, columnspan=2, pady=(20, 0))
+        
+        def salvar_agendamento():
+            if servico_var.get() not in servicos_por_nome:
+                messagebox.showerror("Erro", "Selecione o serviço")
+                return
+            servico_id, duracao = servicos_por_nome[servico_var.get()]
+            try:
+                data, horario = preparar_horario(data_var.get(), horario_var.get())
+            except ErroValidacao as e:
+                messagebox.showerror("Erro", str(e))
+                return
+            
+            # Reservar na agenda antes de gravar para barrar conflitos na hora
+            self._reserva_provisoria -= 1
+            reserva = self._reserva_provisoria
+            try:
+                self.agenda.reservar(reserva, data, horario, duracao)
+            except ConflitoAgendamento as e:
+                messagebox.showerror("Horário indisponível", str(e))
+                return
+            
+            gravado = self.medidor.cronometrar('salvar_agendamento')
+            
+            def concluido(agendamento_id):
+                gravado()
+                # A agenda pode ter sido recarregada enquanto gravava, sem a reserva provisória
+                self.agenda.renomear(reserva, agendamento_id, data, horario, duracao)
+                messagebox.showinfo("Sucesso", "Agendamento cadastrado com sucesso")
+                self.atualizar_dashboard()
+                form_window.destroy()
+            
+            def falhou(e):
+                self.agenda.liberar(reserva)
+                # Outra estação gravou o horário antes (conferido na gravação, local ou no servidor)
+                if isinstance(e, ConflitoAgendamento) or getattr(e, 'tipo', None) == 'ConflitoAgendamento':
+                    messagebox.showerror("Horário indisponível", str(e))
+                    return
+                messagebox.showerror("Erro", f"Erro ao salvar agendamento: {str(e)}")
+            
+            observacoes = observacoes_text.get('1.0', tk.END).strip()
+            self.executor.gravar(
+                self.backend.gravar_agendamento, (cliente.id, servico_id, data, horario, observacoes),
+                ao_concluir=concluido, ao_falhar=falhou
+            )
+        
+        ttk.Button(btn_frame, text="Salvar", command=salvar_agendamento).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Cancelar", command=form_window.destroy).pack(side=tk.RIGHT, padx=5)
+        
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        servico_combo.focus()
+    
+    def run(self):
+        """Executar a aplicação"""
+        self.root.mainloop()
+    
+    def fechar(self):
+        """Concluir as gravações pendentes e fechar a janela"""
+        self.sonda.parar()
+        self.detector_travamentos.parar()
+        if self.manutencao is not None:
+            self.manutencao.parar()
+        if self.lembretes is not None:
+            self.lembretes.parar()
+        self.executor.encerrar()
+        if self.conn is None:
+            self.backend.fechar()
+        self.root.destroy()
+    
+    def __del__(self):
+        """Fechar conexão com o banco ao destruir o objeto"""
+        if getattr(self, 'conn', None) is not None:
+            self.conn.close()
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Sistema de Gerenciamento - Oficina Mecânica")
+    parser.add_argument('--servidor', default=SERVIDOR_URL,
+                        help="endereço do servidor da oficina (ex.: http://192.168.0.10:8765); sem ele usa o banco local")
+    args = parser.parse_args()
+    
+    root = tk.Tk()
+    app = OficinaApp(root, args.servidor)
+    app.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from config import ANTECEDENCIA_LEMBRETE_H, DATABASE_PATH, ENVIOS_POR_MINUTO, TOLERANCIA_FALTA_MIN
+from banco import conectar, preparar_banco
+from agenda import STATUS_AGENDADO, STATUS_NAO_COMPARECEU
+from manutencao import registrar_execucao
+
+# Intervalo entre as rodadas do processador (s)
+INTERVALO_LEMBRETES_S = 60
+
+# Lembretes reservados por vez e tempo da reserva (s): se o processo cair
+# durante o envio, o lote volta à fila depois disso
+LOTE_ENVIO = 20
+RESERVA_ENVIO_S = 300
+
+# Tentativas por lembrete; a espera dobra a cada falha a partir de ESPERA_RETENTATIVA_S
+MAX_TENTATIVAS = 5
+ESPERA_RETENTATIVA_S = 60
+
+# Agendamentos marcados como falta por transação
+LOTE_FALTAS = 500
+
+# Além da última verificação de faltas, dias revistos (agendamentos lançados com data passada)
+DIAS_REVISAO_FALTAS = 7
+
+# Lembretes encerrados guardados (dias)
+DIAS_HISTORICO_LEMBRETES = 90
+
+MODELO_MENSAGEM = "Olá, %s! Lembramos do seu agendamento de %s em %s às %s."
+
+# Um lembrete por agendamento e data/horário: remarcar gera outro lembrete
+CHAVE_LEMBRETE = "'lembrete:' || a.id || ':' || a.data_agendamento || 'T' || a.horario"
+
+Lembrete = namedtuple('Lembrete', 'id chave destino mensagem tentativas')
+
+
+def _texto(momento):
+    return momento.isoformat(sep=' ', timespec='seconds')
+
+
+def _minuto(momento):
+    """Momento no formato de data_agendamento || ' ' || horario"""
+    return momento.strftime('%Y-%m-%d %H:%M')
+
+
+def caminho_saida(caminho):
+    """Arquivo do remetente de teste ao lado do banco: oficina.db -> oficina_lembretes.jsonl"""
+    return f"{os.path.splitext(caminho)[0]}_lembretes.jsonl"
+
+
+# Operações sobre a fila
+
+def enfileirar_lembretes(conn, agora=None, antecedencia=ANTECEDENCIA_LEMBRETE_H):
+    """Criar os lembretes dos agendamentos das próximas `antecedencia` horas; retorna quantos
+
+    A varredura usa idx_agendamentos_data_status; agendamentos que já
+    têm lembrete com a mesma chave são ignorados.
+    """
+    agora = agora or datetime.now()
+    limite = agora + timedelta(hours=antecedencia)
+    cursor = conn.execute(f'''
+        INSERT OR IGNORE INTO lembretes (chave, agendamento_id, destino, mensagem, proxima_tentativa, criado_em)
+        SELECT {CHAVE_LEMBRETE}, a.id, COALESCE(NULLIF(c.telefone, ''), c.email),
+               printf(?, c.nome, COALESCE(s.nome, 'serviço'), strftime('%d/%m/%Y', a.data_agendamento),
+                      substr(a.horario, 1, 5)),
+               ?, ?
+        FROM agendamentos a
+        JOIN clientes c ON c.id = a.cliente_id
+        LEFT JOIN servicos s ON s.id = a.servico_id
+        WHERE a.data_agendamento BETWEEN ? AND ?
+          AND a.status = ?
+          AND a.data_agendamento || ' ' || a.horario > ?
+          AND a.data_agendamento || ' ' || a.horario <= ?
+          AND COALESCE(NULLIF(c.telefone, ''), NULLIF(c.email, '')) IS NOT NULL
+    ''', (MODELO_MENSAGEM, _texto(agora), _texto(agora), agora.date().isoformat(), limite.date().isoformat(),
+          STATUS_AGENDADO, _minuto(agora), _minuto(limite)))
+    conn.commit()
+    return cursor.rowcount
+
+
+def marcar_faltas(conn, agora=None, tolerancia=TOLERANCIA_FALTA_MIN, lote=LOTE_FALTAS):
+    """Passar a "Não Compareceu" os agendamentos ainda "Agendado" cujo horário já passou
+
+    Atualização por conjunto, em lotes de `lote` por transação. Só são
+    revistos os dias a partir da verificação anterior (menos
+    DIAS_REVISAO_FALTAS); a primeira verificação percorre todo o passado.
+    Retorna quantos foram marcados.
+    """
+    agora = agora or datetime.now()
+    corte = agora - timedelta(minutes=tolerancia)
+    anterior = conn.execute("SELECT executada_em FROM manutencao WHERE tarefa = 'marcar_faltas'").fetchone()
+    inicio = ''
+    if anterior is not None:
+        inicio = (datetime.fromisoformat(anterior[0]).date() - timedelta(days=DIAS_REVISAO_FALTAS)).isoformat()
+
+    total = 0
+    while True:
+        cursor = conn.execute('''
+            UPDATE agendamentos SET status = ?
+            WHERE id IN (
+                SELECT id FROM agendamentos
+                WHERE data_agendamento BETWEEN ? AND ?
+                  AND status = ?
+                  AND data_agendamento || ' ' || horario < ?
+                LIMIT ?
+            )
+        ''', (STATUS_NAO_COMPARECEU, inicio, corte.date().isoformat(), STATUS_AGENDADO, _minuto(corte), lote))
+        conn.commit()
+        total += cursor.rowcount
+        if cursor.rowcount < lote:
+            break
+    registrar_execucao(conn, 'marcar_faltas', total)
+    return total
+
+
+def reservar_lote(conn, limite, agora=None, reserva=RESERVA_ENVIO_S):
+    """Reservar até `limite` lembretes vencidos para envio
+
+    Antes, cancela os pendentes cujo agendamento foi excluído, cancelado,
+    remarcado (a chave não confere) ou já passou.
+    """
+    agora = agora or datetime.now()
+    conn.execute(f'''
+        UPDATE lembretes SET situacao = 'cancelado'
+        WHERE situacao = 'pendente' AND proxima_tentativa <= ? AND NOT EXISTS (
+            SELECT 1 FROM agendamentos a
+            WHERE a.id = lembretes.agendamento_id
+              AND a.status = ?
+              AND {CHAVE_LEMBRETE} = lembretes.chave
+              AND a.data_agendamento || ' ' || a.horario > ?
+        )
+    ''', (_texto(agora), STATUS_AGENDADO, _minuto(agora)))
+    linhas = conn.execute('''
+        UPDATE lembretes SET proxima_tentativa = ?
+        WHERE id IN (
+            SELECT id FROM lembretes
+            WHERE situacao = 'pendente' AND proxima_tentativa <= ?
+            ORDER BY proxima_tentativa
+            LIMIT ?
+        )
+        RETURNING id, chave, destino, mensagem, tentativas
+    ''', (_texto(agora + timedelta(seconds=reserva)), _texto(agora), limite)).fetchall()
+    conn.commit()
+    return [Lembrete(*linha) for linha in linhas]
+
+
+def registrar_envios(conn, lote, falhas, agora=None):
+    """Gravar o resultado de um lote; `falhas` é {chave: erro}
+
+    Os entregues saem da fila em um único UPDATE; os que falharam voltam
+    com espera crescente ou ficam como 'falhou' após MAX_TENTATIVAS.
+    """
+    agora = agora or datetime.now()
+    enviados = [lembrete.id for lembrete in lote if lembrete.chave not in falhas]
+    conn.execute('''
+        UPDATE lembretes SET situacao = 'enviado', enviado_em = ?, tentativas = tentativas + 1, erro = NULL
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''', (_texto(agora), json.dumps(enviados)))
+    conn.executemany('''
+        UPDATE lembretes
+        SET tentativas = tentativas + 1, erro = ?, proxima_tentativa = ?,
+            situacao = CASE WHEN tentativas + 1 >= ? THEN 'falhou' ELSE 'pendente' END
+        WHERE id = ?
+    ''', [
+        (falhas[lembrete.chave],
+         _texto(agora + timedelta(seconds=ESPERA_RETENTATIVA_S * 2 ** lembrete.tentativas)),
+         MAX_TENTATIVAS, lembrete.id)
+        for lembrete in lote if lembrete.chave in falhas
+    ])
+    conn.commit()
+
+
+def podar_lembretes(conn, dias=DIAS_HISTORICO_LEMBRETES):
+    """Apagar lembretes encerrados mais antigos que `dias`; retorna quantos saíram"""
+    limite = _texto(datetime.now() - timedelta(days=dias))
+    cursor = conn.execute("DELETE FROM lembretes WHERE situacao != 'pendente' AND criado_em < ?", (limite,))
+    conn.commit()
+    return cursor.rowcount
+
+
+def situacao_fila(conn):
+    """{situacao: quantidade} dos lembretes"""
+    return dict(conn.execute("SELECT situacao, COUNT(*) FROM lembretes GROUP BY situacao"))
+
+
+# Envio
+
+class RemetenteArquivo:
+    """Remetente de teste: grava as mensagens em um arquivo JSON Lines
+
+    Ocupa o lugar do envio real (SMS, e-mail, WhatsApp). Qualquer objeto
+    com enviar(lote) -> {chave: erro} serve de remetente; a chave de cada
+    lembrete permite descartar reenvios, como faz este.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._entregues = None
+
+    def _ler_chaves(self):
+        if not os.path.exists(self.caminho):
+            return set()
+        with open(self.caminho, encoding='utf-8') as arquivo:
+            return {json.loads(linha)['chave'] for linha in arquivo if linha.strip()}
+
+    def enviar(self, lote):
+        """Entregar o lote; retorna {chave: erro} das mensagens não entregues"""
+        if self._entregues is None:
+            self._entregues = self._ler_chaves()
+        novos = [lembrete for lembrete in lote if lembrete.chave not in self._entregues]
+        if novos:
+            with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+                for lembrete in novos:
+                    arquivo.write(json.dumps({
+                        'chave': lembrete.chave, 'destino': lembrete.destino, 'mensagem': lembrete.mensagem,
+                        'enviado_em': _texto(datetime.now()),
+                    }, ensure_ascii=False) + '\n')
+            self._entregues.update(lembrete.chave for lembrete in novos)
+        return {}
+
+
+class LimiteTaxa:
+    """Balde de fichas: `por_minuto` envios por minuto, em rajadas de até `rajada`"""
+
+    def __init__(self, por_minuto, rajada=LOTE_ENVIO, relogio=time.monotonic):
+        self.taxa = por_minuto / 60
+        self.rajada = rajada
+        self._relogio = relogio
+        self._fichas = float(rajada)
+        self._ultimo = relogio()
+
+    def _repor(self):
+        agora = self._relogio()
+        self._fichas = min(self.rajada, self._fichas + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def disponiveis(self):
+        self._repor()
+        return int(self._fichas)
+
+    def consumir(self, quantidade):
+        self._repor()
+        self._fichas -= quantidade
+
+    def espera(self):
+        """Segundos até haver uma ficha"""
+        self._repor()
+        return max(0.0, (1 - self._fichas) / self.taxa)
+
+
+class ProcessadorLembretes:
+    """Enfileira lembretes, marca faltas e entrega a fila em uma thread própria
+
+    Usa conexão própria (como o backup) e faz uma rodada a cada
+    `intervalo` segundos. Os envios saem em lotes de até LOTE_ENVIO,
+    dentro do limite de envios por minuto.
+    """
+
+    def __init__(self, caminho, remetente=None, intervalo=INTERVALO_LEMBRETES_S,
+                 envios_por_minuto=ENVIOS_POR_MINUTO):
+        self.caminho = caminho
+        self.remetente = remetente or RemetenteArquivo(caminho_saida(caminho))
+        self.intervalo = intervalo
+        self.limite = LimiteTaxa(envios_por_minuto)
+        self.ultimo_resultado = None
+        self.ultimo_erro = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._trabalhar, name='lembretes', daemon=True)
+        self._thread.start()
+        return self
+
+    def _trabalhar(self):
+        conn = conectar(self.caminho)
+        try:
+            while not self._parar.is_set():
+                try:
+                    self.ultimo_resultado = self.rodada(conn)
+                except Exception as e:
+                    self.ultimo_erro = e
+                    if conn.in_transaction:
+                        conn.rollback()
+                self._parar.wait(self.intervalo)
+        finally:
+            conn.close()
+
+    def rodada(self, conn):
+        """Enfileirar, marcar faltas e enviar o que venceu; retorna as contagens"""
+        resultado = {
+            'enfileirados': enfileirar_lembretes(conn),
+            'faltas': marcar_faltas(conn),
+            'enviados': 0,
+            'falhas': 0,
+        }
+        while not self._parar.is_set():
+            disponiveis = self.limite.disponiveis()
+            if disponiveis < 1:
+                self._parar.wait(self.limite.espera())
+                continue
+            lote = reservar_lote(conn, min(LOTE_ENVIO, disponiveis))
+            if not lote:
+                break
+            self.limite.consumir(len(lote))
+            try:
+                falhas = self.remetente.enviar(lote)
+            except Exception as e:
+                falhas = {lembrete.chave: str(e) for lembrete in lote}
+            registrar_envios(conn, lote, falhas)
+            resultado['enviados'] += len(lote) - len(falhas)
+            resultado['falhas'] += len(falhas)
+        podar_lembretes(conn)
+        return resultado
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    """Linha de comando: uma rodada de lembretes e faltas (ex.: agendada no servidor)"""
+    parser = argparse.ArgumentParser(description="Lembretes de agendamento e marcação de faltas")
+    parser.add_argument('operacao', choices=('processar', 'situacao'))
+    parser.add_argument('--banco', default=DATABASE_PATH, help="Caminho do banco de dados")
+    parser.add_argument('--saida', help="Arquivo JSON Lines das mensagens (padrão: ao lado do banco)")
+    args = parser.parse_args()
+
+    conn = conectar(args.banco)
+    preparar_banco(conn)
+    try:
+        if args.operacao == 'processar':
+            processador = ProcessadorLembretes(args.banco, RemetenteArquivo(args.saida or caminho_saida(args.banco)))
+            resultado = processador.rodada(conn)
+            print(", ".join(f"{nome}: {quantidade}" for nome, quantidade in resultado.items()))
+        for situacao, quantidade in sorted(situacao_fila(conn).items()):
+            print(f"{situacao}: {quantidade}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
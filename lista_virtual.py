@@ -0,0 +1,219 @@
+from bisect import bisect_left
+
+from busca_clientes import COLUNAS_CLIENTE, chave_nocase
+
+# Linhas buscadas a cada acesso ao banco (área visível + margem de pré-carga)
+TAMANHO_PAGINA = 100
+
+# Máximo de linhas mantidas na Treeview ao mesmo tempo
+TAMANHO_JANELA = 500
+
+# Fração da barra de rolagem que dispara a carga da página vizinha
+MARGEM_ROLAGEM = 0.1
+
+
+class PaginadorClientes:
+    """Paginação por chave (keyset) sobre clientes ordenados por (nome, id)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def primeira_pagina(self, limite):
+        """Primeiras linhas da lista"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT {COLUNAS_CLIENTE}
+            FROM clientes c
+            ORDER BY c.nome COLLATE NOCASE, c.id
+            LIMIT ?
+        """, (limite,))
+        return cursor.fetchall()
+
+    def apos(self, nome, cliente_id, limite):
+        """Linhas seguintes à chave (nome, id)"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT {COLUNAS_CLIENTE}
+            FROM clientes c
+            WHERE c.nome COLLATE NOCASE >= ?
+              AND (c.nome COLLATE NOCASE > ? OR c.id > ?)
+            ORDER BY c.nome COLLATE NOCASE, c.id
+            LIMIT ?
+        """, (nome, nome, cliente_id, limite))
+        return cursor.fetchall()
+
+    def antes(self, nome, cliente_id, limite):
+        """Linhas anteriores à chave (nome, id), em ordem crescente"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT {COLUNAS_CLIENTE}
+            FROM clientes c
+            WHERE c.nome COLLATE NOCASE <= ?
+              AND (c.nome COLLATE NOCASE < ? OR c.id < ?)
+            ORDER BY c.nome COLLATE NOCASE DESC, c.id DESC
+            LIMIT ?
+        """, (nome, nome, cliente_id, limite))
+        return cursor.fetchall()[::-1]
+
+    def linha(self, cliente_id):
+        """Linha de um único cliente"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT {COLUNAS_CLIENTE} FROM clientes c WHERE c.id = ?", (cliente_id,))
+        return cursor.fetchone()
+
+
+class ListaVirtual:
+    """Janela deslizante de clientes exibida em uma Treeview
+
+    O paginador entrega registros repositorio.Cliente (os mesmos que os
+    formulários editam); a Treeview recebe só Cliente.linha(). Apenas
+    TAMANHO_JANELA linhas ficam na Treeview; novas páginas são
+    buscadas por chave conforme a rolagem e as linhas do lado oposto
+    são descartadas. Alterações isoladas são aplicadas linha a linha.
+    As consultas rodam no executor do banco (canal 'lista_clientes').
+    """
+
+    def __init__(self, tree, scrollbar, paginador, executor,
+                 tamanho_pagina=TAMANHO_PAGINA, tamanho_janela=TAMANHO_JANELA):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.paginador = paginador
+        self.executor = executor
+        self.tamanho_pagina = tamanho_pagina
+        self.tamanho_janela = tamanho_janela
+        self.ativa = False
+        self._chaves = []
+        self._linhas = []
+        self._inicio_completo = True
+        self._fim_completo = True
+        self._carregando = False
+        self.tree.configure(yscrollcommand=self._ao_rolar)
+
+    def recarregar(self):
+        """Voltar ao início da lista"""
+        self.ativa = True
+        self._carregando = True
+        self.executor.enviar(
+            self.paginador.primeira_pagina, self.tamanho_pagina * 2,
+            ao_concluir=self._exibir_primeira_pagina, canal='lista_clientes'
+        )
+
+    def _exibir_primeira_pagina(self, linhas):
+        self._carregando = False
+        self._limpar()
+        self._inicio_completo = True
+        self._fim_completo = len(linhas) < self.tamanho_pagina * 2
+        self._inserir(0, linhas)
+
+    def suspender(self):
+        """Liberar a Treeview para outro uso (ex.: resultados de pesquisa)"""
+        self.ativa = False
+        self._carregando = False
+        self.executor.cancelar('lista_clientes')
+        self._limpar()
+
+    def _limpar(self):
+        self.tree.delete(*self.tree.get_children())
+        self._chaves = []
+        self._linhas = []
+
+    def _ao_rolar(self, primeiro, ultimo):
+        """Atualizar a barra de rolagem e pré-carregar páginas vizinhas"""
+        self.scrollbar.set(primeiro, ultimo)
+        if not self.ativa or self._carregando or not self._linhas:
+            return
+        if float(ultimo) >= 1 - MARGEM_ROLAGEM and not self._fim_completo:
+            ultima = self._linhas[-1]
+            self._carregando = True
+            self.executor.enviar(
+                self.paginador.apos, ultima.nome, ultima.id, self.tamanho_pagina,
+                ao_concluir=self._exibir_proxima, canal='lista_clientes'
+            )
+        elif float(primeiro) <= MARGEM_ROLAGEM and not self._inicio_completo:
+            primeira = self._linhas[0]
+            self._carregando = True
+            self.executor.enviar(
+                self.paginador.antes, primeira.nome, primeira.id, self.tamanho_pagina,
+                ao_concluir=self._exibir_anterior, canal='lista_clientes'
+            )
+
+    def _exibir_proxima(self, linhas):
+        self._carregando = False
+        self._fim_completo = len(linhas) < self.tamanho_pagina
+        topo = self._indice_visivel()
+        self._inserir(len(self._linhas), linhas)
+
+        excesso = len(self._linhas) - self.tamanho_janela
+        if excesso > 0:
+            self._remover_faixa(0, excesso)
+            self._inicio_completo = False
+            self._mover_para(topo - excesso)
+
+    def _exibir_anterior(self, linhas):
+        self._carregando = False
+        self._inicio_completo = len(linhas) < self.tamanho_pagina
+        topo = self._indice_visivel()
+        self._inserir(0, linhas)
+
+        excesso = len(self._linhas) - self.tamanho_janela
+        if excesso > 0:
+            self._remover_faixa(len(self._linhas) - excesso, len(self._linhas))
+            self._fim_completo = False
+        self._mover_para(topo + len(linhas))
+
+    def _indice_visivel(self):
+        """Índice da primeira linha visível"""
+        return int(round(float(self.tree.yview()[0]) * len(self._linhas)))
+
+    def _mover_para(self, indice):
+        if self._linhas:
+            self.tree.yview_moveto(max(indice, 0) / len(self._linhas))
+
+    def _inserir(self, posicao, linhas):
+        for deslocamento, cliente in enumerate(linhas):
+            self.tree.insert('', posicao + deslocamento, iid=str(cliente.id), values=cliente.linha())
+        self._linhas[posicao:posicao] = linhas
+        self._chaves[posicao:posicao] = [chave_nocase(cliente.nome, cliente.id) for cliente in linhas]
+
+    def _remover_faixa(self, inicio, fim):
+        self.tree.delete(*[str(cliente.id) for cliente in self._linhas[inicio:fim]])
+        del self._linhas[inicio:fim]
+        del self._chaves[inicio:fim]
+
+    def _posicao(self, cliente_id):
+        for indice, cliente in enumerate(self._linhas):
+            if cliente.id == cliente_id:
+                return indice
+        return None
+
+    def aplicar_remocao(self, cliente_id):
+        """Remover um cliente excluído sem recarregar a lista"""
+        indice = self._posicao(cliente_id)
+        if indice is not None:
+            self._remover_faixa(indice, indice + 1)
+
+    def aplicar_alteracao(self, cliente_id, cliente=None):
+        """Inserir ou reposicionar um cliente gravado sem recarregar a lista
+
+        Com `cliente` (registro já gravado) nada é consultado no banco.
+        """
+        if cliente is not None:
+            self._reposicionar(cliente_id, cliente)
+        elif self.ativa:
+            self.executor.enviar(
+                self.paginador.linha, cliente_id,
+                ao_concluir=lambda cliente: self._reposicionar(cliente_id, cliente)
+            )
+
+    def _reposicionar(self, cliente_id, cliente):
+        self.aplicar_remocao(cliente_id)
+        if cliente is None or not self.ativa:
+            return
+
+        chave = chave_nocase(cliente.nome, cliente.id)
+        # Fora da janela carregada: a linha aparecerá quando a rolagem chegar lá
+        if self._chaves and chave < self._chaves[0] and not self._inicio_completo:
+            return
+        if self._chaves and chave > self._chaves[-1] and not self._fim_completo:
+            return
+        self._inserir(bisect_left(self._chaves, chave), [cliente])
@@ -0,0 +1,443 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from config import BACKUPS_MANTIDOS, DATABASE_PATH, IDADE_ARQUIVAMENTO_DIAS
+from banco import conectar, preparar_banco
+from agenda import STATUS_LIVRES
+from duplicados import sincronizar_chaves
+from estatisticas import STATUS_CONCLUIDO
+from notificacoes import podar_alteracoes
+from relatorios import atualizar_agregados, incluir_arquivados
+from veiculos import completar_resumos
+
+# Backup: páginas copiadas por passo e pausa entre passos (s); entre um
+# passo e outro o banco fica livre para a aplicação
+PAGINAS_POR_PASSO = 256
+PAUSA_PASSO = 0.005
+
+# Agendamentos movidos para o arquivo por transação
+LOTE_ARQUIVAMENTO = 500
+
+# Fração de páginas livres a partir da qual o VACUUM completo compensa
+FRACAO_LIVRE_VACUUM = 0.2
+
+# Páginas livres devolvidas ao sistema por etapa da compactação incremental
+PAGINAS_POR_COMPACTACAO = 2048
+
+# Tarefas de manutenção e intervalo mínimo entre execuções (horas); as
+# chaves de duplicados são sincronizadas antes da poda do registro de alterações
+TAREFAS = {
+    'otimizar': 1,
+    'sincronizar_chaves': 1,
+    'completar_resumos': 1,
+    'backup': 24,
+    'podar_alteracoes': 24,
+    'analisar': 24 * 7,
+    'arquivar': 24 * 7,
+    'compactar': 24 * 7,
+}
+
+# Interface: tempo sem uso que conta como ociosidade (s) e intervalo das verificações (ms)
+OCIOSIDADE_S = 300
+INTERVALO_VERIFICACAO_MS = 60000
+
+# Agendamentos que não mudam mais e podem ser arquivados
+STATUS_ENCERRADOS = (STATUS_CONCLUIDO,) + STATUS_LIVRES
+
+TABELAS_ARQUIVADAS = ('agendamentos', 'ordens_servico', 'itens_ordem')
+
+
+# Caminhos derivados do arquivo do banco
+
+def caminho_banco(conn):
+    """Arquivo do banco principal da conexão ('' se em memória)"""
+    for _, nome, arquivo in conn.execute("PRAGMA database_list"):
+        if nome == 'main':
+            return arquivo
+    return ''
+
+
+def caminho_arquivo(caminho):
+    """Banco de arquivados ao lado do principal: oficina.db -> oficina_arquivo.db"""
+    raiz, extensao = os.path.splitext(caminho)
+    return f"{raiz}_arquivo{extensao or '.db'}"
+
+
+def pasta_backups(caminho):
+    return os.path.join(os.path.dirname(os.path.abspath(caminho)), 'backups')
+
+
+# Controle das execuções
+
+def tarefas_pendentes(conn, agora=None):
+    """Tarefas cujo intervalo desde a última execução já passou, em ordem"""
+    agora = agora or datetime.now()
+    executadas = dict(conn.execute("SELECT tarefa, executada_em FROM manutencao"))
+    pendentes = []
+    for tarefa, horas in TAREFAS.items():
+        ultima = executadas.get(tarefa)
+        if ultima is None or datetime.fromisoformat(ultima) + timedelta(hours=horas) <= agora:
+            pendentes.append(tarefa)
+    return pendentes
+
+
+def registrar_execucao(conn, tarefa, resultado=None):
+    conn.execute(
+        "INSERT OR REPLACE INTO manutencao (tarefa, executada_em, resultado) VALUES (?, ?, ?)",
+        (tarefa, datetime.now().isoformat(timespec='seconds'), json.dumps(resultado))
+    )
+    conn.commit()
+
+
+# Backup
+
+def fazer_backup(caminho, pasta=None, manter=BACKUPS_MANTIDOS,
+                 paginas=PAGINAS_POR_PASSO, pausa=PAUSA_PASSO, progresso=None):
+    """Cópia consistente do banco com a API de backup, em passos curtos
+
+    Usa conexões próprias (pode rodar em qualquer thread). A cópia é
+    verificada com quick_check antes de receber o nome definitivo; só os
+    `manter` backups mais recentes são guardados. Retorna o caminho.
+    """
+    pasta = pasta or pasta_backups(caminho)
+    os.makedirs(pasta, exist_ok=True)
+    base = os.path.splitext(os.path.basename(caminho))[0]
+    destino = os.path.join(pasta, f"{base}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    temporario = destino + '.tmp'
+
+    origem = sqlite3.connect(caminho)
+    copia = sqlite3.connect(temporario)
+    try:
+        origem.execute("PRAGMA busy_timeout = 5000")
+        origem.backup(copia, pages=paginas, sleep=pausa,
+                      progress=(lambda status, restantes, total: progresso(total - restantes, total))
+                      if progresso else None)
+        copia.execute("PRAGMA journal_mode = DELETE")
+        verificacao = copia.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        copia.close()
+        origem.close()
+    if verificacao != 'ok':
+        os.remove(temporario)
+        raise sqlite3.DatabaseError(f"Backup inválido: {verificacao}")
+    os.replace(temporario, destino)
+
+    antigos = sorted(nome for nome in os.listdir(pasta) if nome.startswith(base + '-') and nome.endswith('.db'))
+    for nome in antigos[:-manter] if manter else ():
+        os.remove(os.path.join(pasta, nome))
+    return destino
+
+
+# Arquivamento
+
+@contextmanager
+def anexar_arquivo(conn, criar=False):
+    """Anexar o banco de arquivados como `arquivo` durante o bloco
+
+    Retorna False (sem anexar) se o arquivo não existe e `criar` é falso.
+    ATTACH não pode rodar com transação aberta.
+    """
+    caminho = caminho_arquivo(caminho_banco(conn))
+    if not criar and not os.path.exists(caminho):
+        yield False
+        return
+    conn.execute("ATTACH DATABASE ? AS arquivo", (caminho,))
+    try:
+        yield True
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("DETACH DATABASE arquivo")
+
+
+def _preparar_arquivo(conn):
+    """Tabelas do arquivo com as mesmas colunas das principais, sem chaves estrangeiras"""
+    for tabela in TABELAS_ARQUIVADAS:
+        colunas = conn.execute(f"PRAGMA main.table_info({tabela})").fetchall()
+        existentes = {row[1] for row in conn.execute(f"PRAGMA arquivo.table_info({tabela})")}
+        if not existentes:
+            definicoes = ', '.join(
+                f"{nome} INTEGER PRIMARY KEY" if nome == 'id' else f"{nome} {tipo}"
+                for _, nome, tipo, _, _, _ in colunas
+            )
+            conn.execute(f"CREATE TABLE arquivo.{tabela} ({definicoes})")
+        else:
+            for _, nome, tipo, _, _, _ in colunas:
+                if nome not in existentes:
+                    conn.execute(f"ALTER TABLE arquivo.{tabela} ADD COLUMN {nome} {tipo}")
+    conn.execute("CREATE INDEX IF NOT EXISTS arquivo.idx_agendamentos_veiculo_data "
+                 "ON agendamentos (veiculo_id, data_agendamento)")
+    conn.execute("CREATE INDEX IF NOT EXISTS arquivo.idx_ordens_agendamento ON ordens_servico (agendamento_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS arquivo.idx_itens_ordem ON itens_ordem (ordem_id)")
+    conn.commit()
+
+
+def arquivar(conn, idade_dias=IDADE_ARQUIVAMENTO_DIAS, lote=LOTE_ARQUIVAMENTO):
+    """Mover um lote de agendamentos encerrados antigos (e suas ordens e itens) para o arquivo
+
+    Retorna quantos agendamentos foram movidos; 0 quando não há mais.
+    Como o banco principal usa WAL, o commit não é atômico entre os dois
+    arquivos: a cópia usa INSERT OR REPLACE, então repetir um lote
+    interrompido não duplica nada. Os relatórios não mudam (ver
+    relatorios.incluir_arquivados).
+    """
+    limite = (date.today() - timedelta(days=idade_dias)).isoformat()
+    atualizar_agregados(conn)
+    with anexar_arquivo(conn, criar=True):
+        _preparar_arquivo(conn)
+        marcadores = ', '.join('?' for _ in STATUS_ENCERRADOS)
+        ids = [row[0] for row in conn.execute(f'''
+            SELECT id FROM agendamentos
+            WHERE data_agendamento < ? AND status IN ({marcadores})
+            ORDER BY data_agendamento, id LIMIT ?
+        ''', (limite,) + STATUS_ENCERRADOS + (lote,))]
+        if not ids:
+            return 0
+
+        lista = json.dumps(ids)
+        selecionados = "(SELECT value FROM json_each(?))"
+        # Itens pelas ordens já copiadas: continua valendo depois que saem do principal
+        itens = f"ordem_id IN (SELECT id FROM arquivo.ordens_servico WHERE agendamento_id IN {selecionados})"
+        conn.execute("BEGIN")
+        try:
+            for tabela, filtro in (('agendamentos', f"id IN {selecionados}"),
+                                   ('ordens_servico', f"agendamento_id IN {selecionados}"),
+                                   ('itens_ordem', itens)):
+                colunas = ', '.join(row[1] for row in conn.execute(f"PRAGMA main.table_info({tabela})"))
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO arquivo.{tabela} ({colunas})
+                    SELECT {colunas} FROM main.{tabela} WHERE {filtro}
+                ''', (lista,))
+            # Ordens antes dos itens: o trigger do total não tem mais o que atualizar
+            conn.execute(f"DELETE FROM main.ordens_servico WHERE agendamento_id IN {selecionados}", (lista,))
+            conn.execute(f"DELETE FROM main.itens_ordem WHERE {itens}", (lista,))
+            incluir_arquivados(conn, f"o.agendamento_id IN {selecionados}", (lista,))
+            conn.execute(f"DELETE FROM main.agendamentos WHERE id IN {selecionados}", (lista,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(ids)
+
+
+def arquivar_tudo(conn, idade_dias=IDADE_ARQUIVAMENTO_DIAS, lote=LOTE_ARQUIVAMENTO):
+    total = 0
+    while True:
+        movidos = arquivar(conn, idade_dias, lote)
+        total += movidos
+        if movidos < lote:
+            return total
+
+
+# Otimização
+
+def otimizar(conn):
+    conn.execute("PRAGMA optimize")
+
+
+def analisar(conn):
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def _auto_vacuum_incremental(conn):
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def compactar(conn, fracao=FRACAO_LIVRE_VACUUM):
+    """VACUUM completo se houver páginas livres demais; esvazia o WAL. Retorna se compactou
+
+    Reescreve o arquivo inteiro, por isso só roda pela linha de comando.
+    Também converte bancos antigos para auto_vacuum incremental, que a
+    manutenção da interface usa em compactar_passo.
+    """
+    paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+    livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    compactou = paginas > 0 and (livres / paginas >= fracao or not _auto_vacuum_incremental(conn))
+    if compactou:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return compactou
+
+
+def compactar_passo(conn, paginas=PAGINAS_POR_COMPACTACAO):
+    """Devolver ao sistema até `paginas` páginas livres; retorna quantas
+
+    Etapa curta (como um lote do arquivamento) para a manutenção ociosa,
+    que repete enquanto sobrarem páginas livres; a última esvazia o WAL.
+    Banco ainda sem auto_vacuum incremental não é compactado aqui: o
+    VACUUM completo fica para `manutencao.py otimizar`.
+    """
+    livres = conn.execute("PRAGMA freelist_count").fetchone()[0] if _auto_vacuum_incremental(conn) else 0
+    liberar = min(livres, paginas)
+    if liberar:
+        # Só executescript roda o pragma até o fim; execute libera uma página
+        conn.executescript(f"PRAGMA incremental_vacuum({int(liberar)})")
+    if livres <= paginas:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return liberar
+
+
+def executar_tarefa(conn, tarefa):
+    """Executar uma tarefa que usa a conexão (todas menos o backup) e registrá-la
+
+    'arquivar' move um só lote e 'compactar' libera um só passo de
+    páginas; retorna o resultado e se a tarefa terminou.
+    """
+    if tarefa == 'otimizar':
+        resultado = otimizar(conn)
+    elif tarefa == 'analisar':
+        resultado = analisar(conn)
+    elif tarefa == 'compactar':
+        resultado = compactar_passo(conn)
+        if resultado >= PAGINAS_POR_COMPACTACAO:
+            return resultado, False
+    elif tarefa == 'sincronizar_chaves':
+        resultado = sincronizar_chaves(conn)
+    elif tarefa == 'completar_resumos':
+        resultado = completar_resumos(conn)
+    elif tarefa == 'podar_alteracoes':
+        resultado = podar_alteracoes(conn)
+    elif tarefa == 'arquivar':
+        resultado = arquivar(conn)
+        if resultado >= LOTE_ARQUIVAMENTO:
+            return resultado, False
+    else:
+        raise ValueError(f"Tarefa desconhecida: {tarefa}")
+    registrar_execucao(conn, tarefa, resultado)
+    return resultado, True
+
+
+class ManutencaoOciosa:
+    """Roda as tarefas pendentes quando a interface fica sem uso
+
+    Cada tarefa (e cada lote do arquivamento ou passo da compactação) é
+    um pedido separado ao executor, então uma ação do usuário espera no
+    máximo uma etapa; o VACUUM completo nunca roda aqui. O backup roda
+    em uma thread própria, em passos de PAGINAS_POR_PASSO.
+    """
+
+    def __init__(self, root, executor, conn, ociosidade=OCIOSIDADE_S, intervalo=INTERVALO_VERIFICACAO_MS):
+        self.root = root
+        self.executor = executor
+        self.caminho = caminho_banco(conn)
+        self.ociosidade = ociosidade
+        self.intervalo = intervalo
+        self.ultima_atividade = time.monotonic()
+        self.em_execucao = False
+        self.ultimo_erro = None
+        self._pendentes = []
+        self._agendada = None
+        self._backup = None
+
+    def iniciar(self):
+        self.root.bind_all('<KeyPress>', self.registrar_atividade, add='+')
+        self.root.bind_all('<ButtonPress>', self.registrar_atividade, add='+')
+        self._agendada = self.root.after(self.intervalo, self._verificar)
+
+    def registrar_atividade(self, event=None):
+        self.ultima_atividade = time.monotonic()
+
+    def ociosa(self):
+        return time.monotonic() - self.ultima_atividade >= self.ociosidade
+
+    def _verificar(self):
+        self._agendada = self.root.after(self.intervalo, self._verificar)
+        if self.em_execucao or not self.caminho or not self.ociosa():
+            return
+        self.em_execucao = True
+        self.executor.enviar(tarefas_pendentes, self.executor.conn, ao_concluir=self._iniciar_tarefas,
+                             ao_falhar=self._falhou)
+
+    def _iniciar_tarefas(self, pendentes):
+        self._pendentes = pendentes
+        self._proxima()
+
+    def _proxima(self):
+        # Usuário voltou: o restante fica para a próxima ociosidade
+        if not self._pendentes or not self.ociosa():
+            self.em_execucao = False
+            return
+        tarefa = self._pendentes[0]
+        if tarefa == 'backup':
+            self._pendentes.pop(0)
+            if self._backup is None or not self._backup.is_alive():
+                self._backup = threading.Thread(target=self._fazer_backup, name='backup-banco', daemon=True)
+                self._backup.start()
+            self._proxima()
+            return
+        self.executor.enviar(executar_tarefa, self.executor.conn, tarefa,
+                             ao_concluir=self._tarefa_concluida, ao_falhar=self._falhou)
+
+    def _tarefa_concluida(self, retorno):
+        _, terminou = retorno
+        if terminou:
+            self._pendentes.pop(0)
+        self._proxima()
+
+    def _fazer_backup(self):
+        try:
+            destino = fazer_backup(self.caminho)
+            conn = sqlite3.connect(self.caminho, timeout=5)
+            try:
+                registrar_execucao(conn, 'backup', destino)
+            finally:
+                conn.close()
+        except Exception as e:
+            self.ultimo_erro = e
+
+    def _falhou(self, erro):
+        self.ultimo_erro = erro
+        self._pendentes = []
+        self.em_execucao = False
+
+    def parar(self):
+        if self._agendada is not None:
+            self.root.after_cancel(self._agendada)
+            self._agendada = None
+        if self._backup is not None:
+            self._backup.join()
+
+
+def main():
+    """Linha de comando: manutenção agendada pelo sistema (ex.: no servidor)"""
+    parser = argparse.ArgumentParser(description="Backup, arquivamento e otimização do banco")
+    parser.add_argument('operacao', choices=('backup', 'arquivar', 'otimizar', 'tudo', 'pendentes'))
+    parser.add_argument('--banco', default=DATABASE_PATH, help="Caminho do banco de dados")
+    parser.add_argument('--idade', type=int, default=IDADE_ARQUIVAMENTO_DIAS,
+                        help="Idade mínima (dias) dos agendamentos arquivados")
+    args = parser.parse_args()
+
+    conn = conectar(args.banco)
+    preparar_banco(conn)
+    try:
+        if args.operacao in ('backup', 'tudo'):
+            destino = fazer_backup(args.banco)
+            registrar_execucao(conn, 'backup', destino)
+            print(f"Backup gravado em {destino}")
+        if args.operacao in ('arquivar', 'tudo'):
+            movidos = arquivar_tudo(conn, args.idade)
+            registrar_execucao(conn, 'arquivar', movidos)
+            print(f"{movidos} agendamento(s) arquivado(s) em {caminho_arquivo(args.banco)}")
+        if args.operacao in ('otimizar', 'tudo'):
+            for tarefa in ('sincronizar_chaves', 'completar_resumos', 'podar_alteracoes', 'analisar'):
+                print(f"{tarefa}: {executar_tarefa(conn, tarefa)[0]}")
+            compactou = compactar(conn)
+            registrar_execucao(conn, 'compactar', compactou)
+            print(f"compactar: {compactou}")
+            print(f"otimizar: {executar_tarefa(conn, 'otimizar')[0]}")
+        if args.operacao == 'pendentes':
+            print(", ".join(tarefas_pendentes(conn)) or "Nenhuma tarefa pendente")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from collections import defaultdict
+
+# Tabelas cujas alterações são registradas para as telas abertas
+TABELAS_MONITORADAS = ('clientes', 'veiculos', 'servicos', 'agendamentos', 'ordens_servico')
+
+# Eventos lidos por sondagem; um lote cheio indica carga em massa e vira recarga
+LIMITE_EVENTOS = 500
+
+# Intervalo entre sondagens do registro de alterações (ms)
+INTERVALO_SONDAGEM_MS = 1000
+
+# Entradas mantidas no registro de alterações ao podar
+MANTER_ALTERACOES = 100000
+
+OPERACOES_SQL = (('ai', 'INSERT', 'new', 'I'), ('au', 'UPDATE', 'new', 'U'), ('ad', 'DELETE', 'old', 'D'))
+
+
+def criar_registro_alteracoes(conn):
+    """Criar o registro de alterações e os triggers das tabelas monitoradas"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alteracoes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            registro_id INTEGER NOT NULL,
+            operacao TEXT NOT NULL CHECK (operacao IN ('I', 'U', 'D'))
+        )
+    ''')
+    for tabela in TABELAS_MONITORADAS:
+        for sufixo, evento, linha, operacao in OPERACOES_SQL:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS alteracoes_{tabela}_{sufixo} AFTER {evento} ON {tabela} BEGIN
+                    INSERT INTO alteracoes (tabela, registro_id, operacao)
+                    VALUES ('{tabela}', {linha}.id, '{operacao}');
+                END
+            ''')
+    conn.commit()
+
+
+def ultima_sequencia(conn):
+    """Número de sequência da alteração mais recente (0 se não houver)"""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM alteracoes").fetchone()[0]
+
+
+def alteracoes_desde(conn, seq, limite=LIMITE_EVENTOS):
+    """Alterações posteriores a `seq` como (seq, tabela, id, operacao)
+
+    Retorna None se entradas posteriores a `seq` já foram podadas: quem
+    pediu perdeu eventos e deve recarregar tudo.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(seq) FROM alteracoes")
+    menor = cursor.fetchone()[0]
+    if menor is not None and menor > seq + 1:
+        return None
+    cursor.execute(
+        "SELECT seq, tabela, registro_id, operacao FROM alteracoes WHERE seq > ? ORDER BY seq LIMIT ?",
+        (seq, limite)
+    )
+    return cursor.fetchall()
+
+
+def podar_alteracoes(conn, manter=MANTER_ALTERACOES):
+    """Apagar as entradas mais antigas do registro; retorna quantas saíram"""
+    cursor = conn.execute(
+        "DELETE FROM alteracoes WHERE seq <= (SELECT MAX(seq) FROM alteracoes) - ?", (manter,))
+    conn.commit()
+    return cursor.rowcount
+
+
+class BarramentoAlteracoes:
+    """Entrega eventos de alteração às telas e caches que assinaram
+
+    Cada assinante recebe, por lote, a lista [(id, operacao), ...] da sua
+    tabela (a última operação de cada id) ou None quando deve recarregar
+    tudo.
+    """
+
+    def __init__(self):
+        self._assinantes = defaultdict(list)
+
+    def assinar(self, tabela, callback):
+        self._assinantes[tabela].append(callback)
+
+    def publicar(self, eventos):
+        por_tabela = defaultdict(dict)
+        for _, tabela, registro_id, operacao in eventos:
+            por_tabela[tabela][registro_id] = operacao
+        for tabela, alterados in por_tabela.items():
+            for callback in self._assinantes.get(tabela, ()):
+                callback(list(alterados.items()))
+
+    def publicar_recarga(self):
+        for callbacks in self._assinantes.values():
+            for callback in callbacks:
+                callback(None)
+
+
+class SondaAlteracoes:
+    """Lê periodicamente o registro de alterações e publica no barramento
+
+    Só as entradas posteriores à última sequência vista são lidas; a
+    consulta roda no executor e a publicação no loop do Tk.
+    """
+
+    def __init__(self, root, executor, backend, barramento, intervalo=INTERVALO_SONDAGEM_MS):
+        self.root = root
+        self.executor = executor
+        self.backend = backend
+        self.barramento = barramento
+        self.intervalo = intervalo
+        self.seq = None
+        self._agendada = None
+        self._parada = False
+
+    def iniciar(self):
+        """Partir da alteração mais recente, sem reprocessar o histórico"""
+        self.executor.enviar(self.backend.ultima_sequencia, ao_concluir=self._definir_inicio)
+
+    def _definir_inicio(self, seq):
+        self.seq = seq
+        self._agendar()
+
+    def _agendar(self):
+        if self._parada:
+            return
+        self._agendada = self.root.after(self.intervalo, self._sondar)
+
+    def _sondar(self):
+        self._agendada = None
+        self.executor.enviar(
+            self.backend.alteracoes_desde, self.seq, LIMITE_EVENTOS,
+            ao_concluir=self._receber, ao_falhar=lambda e: self._agendar(), canal='alteracoes'
+        )
+
+    def _receber(self, eventos):
+        if eventos is None or len(eventos) >= LIMITE_EVENTOS:
+            # Eventos perdidos ou carga em massa: recarregar a partir do estado atual
+            self.executor.enviar(self.backend.ultima_sequencia, ao_concluir=self._recarregar,
+                                 ao_falhar=lambda e: self._agendar())
+            return
+        if eventos:
+            self.seq = eventos[-1][0]
+            self.barramento.publicar(eventos)
+        self._agendar()
+
+    def _recarregar(self, seq):
+        self.seq = seq
+        self.barramento.publicar_recarga()
+        self._agendar()
+
+    def parar(self):
+        self._parada = True
+        if self._agendada is not None:
+            self.root.after_cancel(self._agendada)
+            self._agendada = None
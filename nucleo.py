@@ -0,0 +1,90 @@
+from datetime import date, datetime
+
+from config import DATABASE_PATH
+from banco import conectar, preparar_banco
+from operacoes import BackendLocal
+from repositorio import Cliente, Veiculo
+from unidade_trabalho import UnidadeTrabalho, gravar as gravar_unidade
+from veiculos import limpar_placa, placa_valida
+
+
+class ErroValidacao(ValueError):
+    """Dados recusados antes de chegar ao banco; a mensagem pode ser mostrada ao usuário"""
+
+
+def abrir(caminho=DATABASE_PATH, servidor=None):
+    """Backend pronto para uso, sem nenhuma dependência de interface
+
+    Com `servidor`, fala com servidor.py; senão abre o banco local e
+    aplica as migrações pendentes.
+    """
+    if servidor:
+        # Só quem usa o servidor paga pela importação do cliente HTTP
+        from acesso_remoto import BackendRemoto
+        return BackendRemoto(servidor)
+    conn = conectar(caminho)
+    preparar_banco(conn)
+    return BackendLocal(conn)
+
+
+def gravar(backend, funcao, *args):
+    """Executar uma gravação do backend e confirmar na hora; retorna o resultado
+
+    Para scripts e linha de comando: a interface grava pelo executor.
+    """
+    if backend.remoto:
+        # O servidor confirma cada chamada de gravação
+        return funcao(*args)
+    unidade = UnidadeTrabalho()
+    unidade.adicionar(funcao, *args)
+    return gravar_unidade(backend.conn, unidade)[0]
+
+
+# Validação dos cadastros (mesmas regras e mensagens na interface e na linha de comando)
+
+def preparar_cliente(cliente, nome, telefone='', email='', endereco=''):
+    """(registro, dados) para backend.salvar_cliente
+
+    Sem `cliente`, prepara um cadastro novo com a data de hoje.
+    """
+    nome = (nome or '').strip()
+    if not nome:
+        raise ErroValidacao("O nome é obrigatório")
+    dados = {
+        'nome': nome, 'telefone': (telefone or '').strip(),
+        'email': (email or '').strip(), 'endereco': (endereco or '').strip(),
+    }
+    if cliente is None:
+        cliente = Cliente()
+        dados['data_cadastro'] = date.today().isoformat()
+    return cliente, dados
+
+
+def preparar_veiculo(cliente_id, placa, marca, modelo, ano='', quilometragem=''):
+    """(registro, dados) de um veículo novo para backend.salvar_veiculo"""
+    placa = limpar_placa(placa or '')
+    marca = (marca or '').strip()
+    modelo = (modelo or '').strip()
+    if not placa_valida(placa):
+        raise ErroValidacao("Informe a placa no padrão ABC1234 ou ABC1D23")
+    if not marca or not modelo:
+        raise ErroValidacao("Marca e modelo são obrigatórios")
+    try:
+        ano = int(ano) if str(ano or '').strip() else None
+        quilometragem = int(quilometragem) if str(quilometragem or '').strip() else None
+    except ValueError:
+        raise ErroValidacao("Ano e quilometragem devem ser números") from None
+    dados = {'cliente_id': cliente_id, 'marca': marca, 'modelo': modelo, 'ano': ano,
+             'placa': placa, 'quilometragem': quilometragem}
+    return Veiculo(), dados
+
+
+def preparar_horario(data, horario):
+    """(data, horario) normalizados de um agendamento"""
+    try:
+        data = date.fromisoformat((data or '').strip()).isoformat()
+        horario = (horario or '').strip()
+        datetime.strptime(horario, '%H:%M')
+    except ValueError:
+        raise ErroValidacao("Informe data (AAAA-MM-DD) e horário (HH:MM) válidos") from None
+    return data, horario
@@ -0,0 +1,231 @@
+import argparse
+import json
+import sqlite3
+import sys
+
+from config import DATABASE_PATH, SERVIDOR_URL
+from importacao import COLUNAS, ORIGEM_PADRAO, TAMANHO_LOTE, Exportador, Importador, mostrar_progresso
+from nucleo import abrir, gravar, preparar_cliente, preparar_veiculo
+from relatorios import RELATORIOS
+
+# Linhas mostradas quando --limite não é informado
+LIMITE_PADRAO = 50
+
+
+def _imprimir(linhas, como_json):
+    """Uma linha por registro, com os campos separados por tabulação"""
+    for linha in linhas:
+        if como_json:
+            print(json.dumps(list(linha), ensure_ascii=False))
+        else:
+            print('\t'.join('' if valor is None else str(valor) for valor in linha))
+
+
+def _cliente(backend, cliente_id):
+    cliente = backend.ler_cliente(cliente_id)
+    if cliente is None:
+        raise LookupError(f"Cliente {cliente_id} não encontrado")
+    return cliente
+
+
+# Subcomandos: cada um recebe o backend e os argumentos já lidos
+
+def listar(backend, args):
+    _imprimir((cliente.linha() for cliente in backend.primeira_pagina(args.limite)), args.json)
+
+
+def pesquisar(backend, args):
+    linhas = []
+    apos = None
+    while len(linhas) < args.limite:
+        pagina, ha_mais = backend.pesquisar_clientes(args.termo, apos)
+        linhas += pagina
+        if not ha_mais or not pagina:
+            break
+        apos = (pagina[-1].nome, pagina[-1].id)
+    _imprimir((cliente.linha() for cliente in linhas[:args.limite]), args.json)
+
+
+def mostrar_cliente(backend, args):
+    cliente = _cliente(backend, args.id)
+    _imprimir([(cliente.id, *cliente.valores())], args.json)
+
+
+def cadastrar_cliente(backend, args):
+    registro, dados = preparar_cliente(None, args.nome, args.telefone, args.email, args.endereco)
+    print(gravar(backend, backend.salvar_cliente, registro, dados).id)
+
+
+def editar_cliente(backend, args):
+    cliente = _cliente(backend, args.id)
+    # Campos não informados continuam como estão; só os alterados vão para o UPDATE
+    registro, dados = preparar_cliente(
+        cliente,
+        cliente.nome if args.nome is None else args.nome,
+        cliente.telefone if args.telefone is None else args.telefone,
+        cliente.email if args.email is None else args.email,
+        cliente.endereco if args.endereco is None else args.endereco,
+    )
+    gravar(backend, backend.salvar_cliente, registro, dados)
+
+
+def cadastrar_veiculo(backend, args):
+    cliente = _cliente(backend, args.cliente)
+    registro, dados = preparar_veiculo(cliente.id, args.placa, args.marca, args.modelo, args.ano, args.km)
+    print(gravar(backend, backend.salvar_veiculo, registro, dados).id)
+
+
+def ficha(backend, args):
+    ficha = backend.ficha_veiculo(args.placa)
+    if ficha is None:
+        raise LookupError(f"Veículo {args.placa} não encontrado")
+    print(json.dumps(ficha, ensure_ascii=False, indent=None if args.json else 2))
+
+
+def mostrar_ordem(backend, args):
+    ordem, itens = backend.ler_ordem(args.id)
+    if ordem is None:
+        raise LookupError(f"Ordem de serviço {args.id} não encontrada")
+    _imprimir([ordem], args.json)
+    _imprimir(itens, args.json)
+
+
+def abrir_ordem(backend, args):
+    print(gravar(backend, backend.abrir_ordem, args.agendamento, args.tecnico))
+
+
+def lancar_peca(backend, args):
+    print(gravar(backend, backend.adicionar_peca, args.ordem, args.peca, args.quantidade))
+
+
+def fechar_dia(backend, args):
+    print(gravar(backend, backend.fechar_dia, args.dia))
+
+
+def pecas_em_falta(backend, args):
+    _imprimir(backend.pecas_em_falta(), args.json)
+
+
+def transferir(backend, args):
+    if backend.remoto:
+        raise ValueError("Importação e exportação usam o banco local (sem --servidor)")
+    if args.comando == 'importar':
+        Importador(backend.conn, args.tabela, args.arquivo, args.lote, args.origem).importar_tudo(mostrar_progresso)
+        backend.limpar_caches()
+    else:
+        Exportador(backend.conn, args.tabela, args.arquivo, args.lote).exportar_tudo(mostrar_progresso)
+    print()
+
+
+def relatorio(backend, args):
+    if args.saida:
+        print(backend.exportar_relatorio(args.tipo, args.saida))
+        return
+    cabecalhos = RELATORIOS[args.tipo][1]
+    if not args.json:
+        _imprimir([cabecalhos], False)
+    _imprimir(backend.relatorio_tela(args.tipo), args.json)
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Sistema de Gerenciamento - Oficina Mecânica (linha de comando)")
+    parser.add_argument('--banco', default=DATABASE_PATH, help="caminho do banco de dados local")
+    parser.add_argument('--servidor', default=SERVIDOR_URL, help="endereço do servidor da oficina; sem ele usa o banco local")
+    parser.add_argument('--json', action='store_true', help="uma linha JSON por registro")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    sub = comandos.add_parser('listar', help="clientes em ordem alfabética")
+    sub.add_argument('--limite', type=int, default=LIMITE_PADRAO)
+    sub.set_defaults(executar=listar)
+
+    sub = comandos.add_parser('pesquisar', help="clientes por nome, telefone ou e-mail")
+    sub.add_argument('termo')
+    sub.add_argument('--limite', type=int, default=LIMITE_PADRAO)
+    sub.set_defaults(executar=pesquisar)
+
+    sub = comandos.add_parser('cliente', help="dados de um cliente")
+    sub.add_argument('id', type=int)
+    sub.set_defaults(executar=mostrar_cliente)
+
+    sub = comandos.add_parser('cadastrar', help="cadastrar cliente; imprime o id")
+    sub.add_argument('nome')
+    for campo in ('telefone', 'email', 'endereco'):
+        sub.add_argument(f'--{campo}', default='')
+    sub.set_defaults(executar=cadastrar_cliente)
+
+    sub = comandos.add_parser('editar', help="alterar campos de um cliente")
+    sub.add_argument('id', type=int)
+    for campo in ('nome', 'telefone', 'email', 'endereco'):
+        sub.add_argument(f'--{campo}')
+    sub.set_defaults(executar=editar_cliente)
+
+    sub = comandos.add_parser('veiculo', help="cadastrar veículo de um cliente; imprime o id")
+    sub.add_argument('cliente', type=int, help="id do cliente")
+    sub.add_argument('placa')
+    sub.add_argument('marca')
+    sub.add_argument('modelo')
+    sub.add_argument('--ano', default='')
+    sub.add_argument('--km', default='')
+    sub.set_defaults(executar=cadastrar_veiculo)
+
+    sub = comandos.add_parser('ficha', help="ficha e histórico de um veículo pela placa")
+    sub.add_argument('placa')
+    sub.set_defaults(executar=ficha)
+
+    sub = comandos.add_parser('ordem', help="ordem de serviço e seus itens")
+    sub.add_argument('id', type=int)
+    sub.set_defaults(executar=mostrar_ordem)
+
+    sub = comandos.add_parser('abrir-ordem', help="abrir a ordem de serviço de um agendamento; imprime o id")
+    sub.add_argument('agendamento', type=int)
+    sub.add_argument('--tecnico')
+    sub.set_defaults(executar=abrir_ordem)
+
+    sub = comandos.add_parser('lancar-peca', help="lançar peça do estoque em uma ordem; imprime o id do item")
+    sub.add_argument('ordem', type=int)
+    sub.add_argument('peca', type=int)
+    sub.add_argument('quantidade', type=float, nargs='?', default=1)
+    sub.set_defaults(executar=lancar_peca)
+
+    sub = comandos.add_parser('fechar-dia', help="concluir as ordens abertas no dia; imprime quantas")
+    sub.add_argument('--dia', help="AAAA-MM-DD (padrão: hoje)")
+    sub.set_defaults(executar=fechar_dia)
+
+    sub = comandos.add_parser('pecas-em-falta', help="peças no estoque mínimo ou abaixo")
+    sub.set_defaults(executar=pecas_em_falta)
+
+    for nome in ('importar', 'exportar'):
+        sub = comandos.add_parser(nome, help=f"{nome} clientes ou veículos em .csv ou .jsonl")
+        sub.add_argument('tabela', choices=tuple(COLUNAS))
+        sub.add_argument('arquivo')
+        sub.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="registros por transação")
+        if nome == 'importar':
+            sub.add_argument('--origem', default=ORIGEM_PADRAO,
+                             help="oficina de origem dos ids do arquivo (a mesma para clientes e veículos)")
+        sub.set_defaults(executar=transferir)
+
+    sub = comandos.add_parser('relatorio', help="relatório de faturamento")
+    sub.add_argument('tipo', choices=tuple(RELATORIOS))
+    sub.add_argument('--saida', help="gravar o relatório completo em .csv ou .html")
+    sub.set_defaults(executar=relatorio)
+    return parser
+
+
+def main(argv=None):
+    """Linha de comando sobre o núcleo, sem carregar a interface gráfica"""
+    parser = _argumentos()
+    args = parser.parse_args(argv)
+    backend = abrir(args.banco, args.servidor)
+    try:
+        args.executar(backend, args)
+    except (LookupError, ValueError, sqlite3.Error) as e:
+        parser.exit(1, f"Erro: {e}\n")
+    except BrokenPipeError:
+        # Saída cortada por head/less
+        sys.stderr.close()
+    finally:
+        backend.fechar()
+
+
+if __name__ == "__main__":
+    main()
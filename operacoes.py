@@ -0,0 +1,366 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from agenda import Agenda, agendamentos_ocupados, ocupacao, verificar_horario
+from busca_clientes import BuscaClientes
+from catalogo import SQL_PRECO_VIGENTE, CatalogoServicos
+from duplicados import marcar_distintos, mesclar_clientes, possiveis_duplicados, procurar_duplicados
+from estatisticas import agendamentos_do_dia, ler_resumo
+from lista_virtual import PaginadorClientes
+from manutencao import anexar_arquivo
+from notificacoes import LIMITE_EVENTOS, alteracoes_desde, ultima_sequencia
+from ordens import (abrir_ordem, adicionar_mao_de_obra, adicionar_peca, alterar_quantidade, cadastrar_peca,
+                    concluir_ordem, fechar_dia, ler_ordem, pecas_em_falta, remover_item, repor_estoque)
+from relatorios import LIMITE_TELA, atualizar_agregados, consultar_relatorio, gerar_relatorio
+from repositorio import Cliente, Repositorio, gravar_campos, inserir_registro, ler_registros
+from tecnicos import EscalaTecnicos, atribuir_tecnicos, escala_por_id, ocupacao_tecnicos
+from veiculos import RegistroVeiculos
+
+# Conexões do servidor com estado de pesquisa guardado, no máximo
+MAXIMO_BUSCAS = 16
+
+# Tipos de operação:
+#   leitura   - só consulta; no servidor roda em qualquer conexão do pool
+#   gravacao  - não faz commit; roda como unidade de trabalho (commit em grupo)
+#   exclusiva - faz o próprio commit; roda sozinha na conexão de escrita
+LEITURA = 'leitura'
+GRAVACAO = 'gravacao'
+EXCLUSIVA = 'exclusiva'
+
+
+# Operações sobre uma conexão (primeiro argumento), usadas localmente e pelo servidor
+
+def apagar_cliente(conn, cliente_id):
+    conn.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
+
+
+def listar_servicos(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, nome FROM servicos ORDER BY nome")
+    return cursor.fetchall()
+
+
+def gravar_agendamento(conn, dados):
+    """Inserir um agendamento com a versão de preço vigente do serviço
+
+    Horário sem box livre entre os agendamentos já gravados levanta
+    ConflitoAgendamento e nada é inserido.
+    """
+    cliente_id, servico_id, data, horario, observacoes = dados
+    verificar_horario(conn, data, horario, servico_id)
+    cursor = conn.execute(
+        "INSERT INTO agendamentos (cliente_id, servico_id, data_agendamento, horario, observacoes, preco_id) "
+        f"VALUES (?, ?, ?, ?, ?, ({SQL_PRECO_VIGENTE.format(servico='?')}))",
+        (cliente_id, servico_id, data, horario, observacoes, servico_id)
+    )
+    return cursor.lastrowid
+
+
+def agendamentos_por_id(conn, ids):
+    """(id, data, horario, servico_id, status) dos agendamentos informados"""
+    marcadores = ', '.join('?' for _ in ids)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT id, data_agendamento, horario, servico_id, status FROM agendamentos WHERE id IN ({marcadores})",
+        tuple(ids)
+    )
+    return cursor.fetchall()
+
+
+def historico_arquivado(conn, veiculo_id, antes=None, veiculos=None):
+    """Página do histórico de um veículo no banco de arquivados (anexado só durante a consulta)"""
+    with anexar_arquivo(conn) as anexado:
+        if not anexado:
+            return [], False
+        return (veiculos or RegistroVeiculos(conn, 0)).historico(veiculo_id, antes, esquema='arquivo')
+
+
+def relatorio_tela(conn, tipo):
+    """Atualizar os agregados e trazer as linhas exibidas na tela"""
+    atualizar_agregados(conn)
+    return consultar_relatorio(conn, tipo, LIMITE_TELA).fetchall()
+
+
+class BuscasPorConexao:
+    """Pesquisa de clientes do servidor, com um BuscaClientes por conexão
+
+    Mantém entre as requisições o refinamento em memória e o termo
+    grande já reconhecido. Antes de cada pesquisa o registro de
+    alterações diz se algum cliente mudou desde a anterior naquela
+    conexão; se mudou, os resultados guardados são descartados, como
+    BackendLocal.alteracoes_desde faz localmente.
+    """
+
+    def __init__(self, maximo=MAXIMO_BUSCAS):
+        self.maximo = maximo
+        # id(conn) -> (conn, busca, seq); a referência à conexão impede reuso do id
+        self._buscas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, termo, apos):
+        with self._lock:
+            _, busca, seq = self._buscas.pop(id(conn), (None, None, None))
+        atual = ultima_sequencia(conn)
+        if busca is None:
+            busca = BuscaClientes(conn)
+        elif atual != seq:
+            eventos = alteracoes_desde(conn, seq, LIMITE_EVENTOS)
+            if eventos is None or len(eventos) >= LIMITE_EVENTOS or \
+                    any(tabela == 'clientes' for _, tabela, _, _ in eventos):
+                busca.invalidar()
+        try:
+            return busca.pesquisar(termo, tuple(apos) if apos else None)
+        finally:
+            with self._lock:
+                self._buscas[id(conn)] = (conn, busca, atual)
+                while len(self._buscas) > self.maximo:
+                    self._buscas.popitem(last=False)
+
+
+# Catálogo exposto pelo servidor: nome -> (função, tipo)
+OPERACOES = {
+    'ler_resumo': (ler_resumo, LEITURA),
+    'agendamentos_do_dia': (agendamentos_do_dia, LEITURA),
+    'clientes_primeira_pagina': (lambda conn, limite: PaginadorClientes(conn).primeira_pagina(limite), LEITURA),
+    'clientes_apos': (lambda conn, nome, cliente_id, limite: PaginadorClientes(conn).apos(nome, cliente_id, limite), LEITURA),
+    'clientes_antes': (lambda conn, nome, cliente_id, limite: PaginadorClientes(conn).antes(nome, cliente_id, limite), LEITURA),
+    'cliente_linha': (lambda conn, cliente_id: PaginadorClientes(conn).linha(cliente_id), LEITURA),
+    'pesquisar_clientes': (BuscasPorConexao(), LEITURA),
+    'ler_registros': (ler_registros, LEITURA),
+    'inserir_registro': (inserir_registro, GRAVACAO),
+    'gravar_campos': (gravar_campos, GRAVACAO),
+    'apagar_cliente': (apagar_cliente, GRAVACAO),
+    'procurar_duplicados': (procurar_duplicados, EXCLUSIVA),
+    'possiveis_duplicados': (possiveis_duplicados, LEITURA),
+    'mesclar_clientes': (mesclar_clientes, GRAVACAO),
+    'marcar_distintos': (marcar_distintos, GRAVACAO),
+    'listar_servicos': (listar_servicos, LEITURA),
+    'gravar_agendamento': (gravar_agendamento, GRAVACAO),
+    'ocupacao_agenda': (ocupacao, LEITURA),
+    'agendamentos_por_id': (agendamentos_por_id, LEITURA),
+    'ultima_sequencia': (ultima_sequencia, LEITURA),
+    'alteracoes_desde': (alteracoes_desde, LEITURA),
+    'ocupacao_tecnicos': (ocupacao_tecnicos, LEITURA),
+    'escala_por_id': (escala_por_id, LEITURA),
+    'atribuir_tecnicos': (atribuir_tecnicos, GRAVACAO),
+    'ficha_veiculo': (lambda conn, placa: RegistroVeiculos(conn, 0).buscar_ficha(placa), LEITURA),
+    'historico_veiculo': (lambda conn, veiculo_id, antes: RegistroVeiculos(conn, 0).historico(veiculo_id, antes), LEITURA),
+    'historico_arquivado': (historico_arquivado, LEITURA),
+    'gravar_veiculo': (lambda conn, veiculo_id, dados: RegistroVeiculos(conn, 0).gravar_veiculo(veiculo_id, tuple(dados)), GRAVACAO),
+    'relatorio_tela': (relatorio_tela, EXCLUSIVA),
+    'atualizar_agregados': (atualizar_agregados, EXCLUSIVA),
+    'abrir_ordem': (abrir_ordem, GRAVACAO),
+    'adicionar_mao_de_obra': (adicionar_mao_de_obra, GRAVACAO),
+    'adicionar_peca': (adicionar_peca, GRAVACAO),
+    'alterar_quantidade': (alterar_quantidade, GRAVACAO),
+    'remover_item': (remover_item, GRAVACAO),
+    'concluir_ordem': (concluir_ordem, GRAVACAO),
+    'fechar_dia': (fechar_dia, GRAVACAO),
+    'ler_ordem': (ler_ordem, LEITURA),
+    'cadastrar_peca': (cadastrar_peca, GRAVACAO),
+    'repor_estoque': (repor_estoque, GRAVACAO),
+    'pecas_em_falta': (pecas_em_falta, LEITURA),
+}
+
+
+class BackendLocal:
+    """Acesso direto ao banco, com os caches mantidos neste processo
+
+    Todos os métodos rodam na thread do executor; os de gravação não
+    fazem commit e devem ser enviados por executor.gravar().
+    """
+
+    remoto = False
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.busca = BuscaClientes(conn)
+        self.veiculos = RegistroVeiculos(conn)
+        self._paginador = PaginadorClientes(conn)
+        self.catalogo = CatalogoServicos(conn)
+        self.repositorio = Repositorio(partial(ler_registros, conn), partial(inserir_registro, conn), partial(gravar_campos, conn))
+
+    # Dashboard e agenda
+
+    def dados_dashboard(self):
+        return ler_resumo(self.conn), agendamentos_do_dia(self.conn)
+
+    def carregar_agenda(self):
+        return Agenda.montar(self.catalogo.atual().duracoes(), agendamentos_ocupados(self.conn))
+
+    def agendamentos_por_id(self, ids):
+        return agendamentos_por_id(self.conn, ids)
+
+    # Escala dos técnicos
+
+    def carregar_escala(self, inicio, fim):
+        return EscalaTecnicos.carregar(self.conn, inicio, fim)
+
+    def escala_por_id(self, agendamento_ids, ordem_ids):
+        return escala_por_id(self.conn, agendamento_ids, ordem_ids)
+
+    def atribuir_tecnicos(self, atribuicoes):
+        return atribuir_tecnicos(self.conn, atribuicoes)
+
+    # Registro de alterações
+
+    def ultima_sequencia(self):
+        return ultima_sequencia(self.conn)
+
+    def alteracoes_desde(self, seq, limite):
+        eventos = alteracoes_desde(self.conn, seq, limite)
+        if eventos is None or len(eventos) >= limite:
+            self.limpar_caches()
+            return eventos
+        # Outros processos (outra estação, importação) podem ter gravado no arquivo
+        self.repositorio.aplicar_alteracoes(eventos)
+        for _, tabela, registro_id, _ in eventos:
+            if tabela == 'clientes':
+                self.busca.invalidar()
+                self.veiculos.invalidar_cliente(registro_id)
+            elif tabela == 'veiculos':
+                self.veiculos.invalidar_veiculo(registro_id)
+            elif tabela in ('agendamentos', 'ordens_servico'):
+                self.veiculos.cache.limpar()
+        return eventos
+
+    # Lista de clientes (interface de paginador da ListaVirtual)
+
+    def primeira_pagina(self, limite):
+        return self.repositorio.incorporar(Cliente, self._paginador.primeira_pagina(limite))
+
+    def apos(self, nome, cliente_id, limite):
+        return self.repositorio.incorporar(Cliente, self._paginador.apos(nome, cliente_id, limite))
+
+    def antes(self, nome, cliente_id, limite):
+        return self.repositorio.incorporar(Cliente, self._paginador.antes(nome, cliente_id, limite))
+
+    def linha(self, cliente_id):
+        row = self._paginador.linha(cliente_id)
+        return self.repositorio.incorporar(Cliente, [row])[0] if row is not None else None
+
+    # Clientes
+
+    def pesquisar_clientes(self, termo, apos=None):
+        linhas, ha_mais = self.busca.pesquisar(termo, apos)
+        return self.repositorio.incorporar(Cliente, linhas), ha_mais
+
+    def invalidar_busca(self):
+        self.busca.invalidar()
+
+    def ler_cliente(self, cliente_id):
+        return self.repositorio.obter_um(Cliente, cliente_id)
+
+    def salvar_cliente(self, cliente, dados):
+        self.repositorio.salvar(cliente, dados)
+        self.busca.invalidar()
+        self.veiculos.invalidar_cliente(cliente.id)
+        return cliente
+
+    def apagar_cliente(self, cliente_id):
+        apagar_cliente(self.conn, cliente_id)
+        self.repositorio.esquecer(Cliente, cliente_id)
+        self.busca.invalidar()
+        self.veiculos.invalidar_cliente(cliente_id)
+
+    # Clientes duplicados
+
+    def procurar_duplicados(self):
+        return procurar_duplicados(self.conn)
+
+    def possiveis_duplicados(self, nome, telefone, email, ignorar_id=None):
+        return possiveis_duplicados(self.conn, nome, telefone, email, ignorar_id)
+
+    def mesclar_clientes(self, manter_id, remover_ids):
+        resultado = mesclar_clientes(self.conn, manter_id, remover_ids)
+        for cliente_id in [manter_id, *remover_ids]:
+            self.repositorio.esquecer(Cliente, cliente_id)
+        self.busca.invalidar()
+        self.veiculos.cache.limpar()
+        return resultado
+
+    def marcar_distintos(self, cliente_a, cliente_b):
+        marcar_distintos(self.conn, cliente_a, cliente_b)
+
+    # Serviços e agendamentos
+
+    def listar_servicos(self):
+        return [(servico.id, servico.nome) for servico in self.catalogo.atual().por_nome]
+
+    def gravar_agendamento(self, dados):
+        return gravar_agendamento(self.conn, dados)
+
+    # Veículos
+
+    def ficha_em_cache(self, placa):
+        return self.veiculos.em_cache(placa)
+
+    def ficha_veiculo(self, placa):
+        return self.veiculos.buscar_ficha(placa)
+
+    def historico_veiculo(self, veiculo_id, antes=None):
+        return self.veiculos.historico(veiculo_id, antes)
+
+    def historico_arquivado(self, veiculo_id, antes=None):
+        return historico_arquivado(self.conn, veiculo_id, antes, self.veiculos)
+
+    def gravar_veiculo(self, veiculo_id, dados):
+        return self.veiculos.gravar_veiculo(veiculo_id, dados)
+
+    def salvar_veiculo(self, veiculo, dados):
+        self.repositorio.salvar(veiculo, dados)
+        self.veiculos.invalidar_veiculo(veiculo.id)
+        return veiculo
+
+    def limpar_caches(self):
+        self.busca.invalidar()
+        self.veiculos.cache.limpar()
+        self.repositorio.limpar()
+
+    def fechar(self):
+        self.conn.close()
+
+    # Ordens de serviço e estoque de peças
+
+    def abrir_ordem(self, agendamento_id, tecnico=None, dia=None):
+        return abrir_ordem(self.conn, agendamento_id, tecnico, dia)
+
+    def adicionar_mao_de_obra(self, ordem_id, descricao, horas, valor_hora):
+        return adicionar_mao_de_obra(self.conn, ordem_id, descricao, horas, valor_hora)
+
+    def adicionar_peca(self, ordem_id, peca_id, quantidade=1, preco=None):
+        return adicionar_peca(self.conn, ordem_id, peca_id, quantidade, preco)
+
+    def alterar_quantidade(self, item_id, quantidade):
+        return alterar_quantidade(self.conn, item_id, quantidade)
+
+    def remover_item(self, item_id):
+        return remover_item(self.conn, item_id)
+
+    def concluir_ordem(self, ordem_id, dia=None):
+        return concluir_ordem(self.conn, ordem_id, dia)
+
+    def fechar_dia(self, dia=None):
+        return fechar_dia(self.conn, dia)
+
+    def ler_ordem(self, ordem_id):
+        return ler_ordem(self.conn, ordem_id)
+
+    def cadastrar_peca(self, codigo, descricao, preco, estoque=0, estoque_minimo=0):
+        return cadastrar_peca(self.conn, codigo, descricao, preco, estoque, estoque_minimo)
+
+    def repor_estoque(self, peca_id, quantidade):
+        return repor_estoque(self.conn, peca_id, quantidade)
+
+    def pecas_em_falta(self):
+        return pecas_em_falta(self.conn)
+
+    # Relatórios
+
+    def relatorio_tela(self, tipo):
+        return relatorio_tela(self.conn, tipo)
+
+    def exportar_relatorio(self, tipo, caminho):
+        atualizar_agregados(self.conn)
+        return gerar_relatorio(self.conn, tipo, caminho)
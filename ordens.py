@@ -0,0 +1,264 @@
+from datetime import date
+
+from estatisticas import STATUS_CONCLUIDO, STATUS_EM_ANDAMENTO
+from agenda import STATUS_AGENDADO
+
+TIPO_MAO_DE_OBRA = 'mao_de_obra'
+TIPO_PECA = 'peca'
+
+
+class EstoqueInsuficiente(ValueError):
+    """Peça sem quantidade suficiente em estoque"""
+
+
+class OrdemConcluida(ValueError):
+    """Tentativa de alterar os itens de uma ordem já concluída"""
+
+
+def criar_itens_e_estoque(conn):
+    """Criar o estoque de peças, os itens das ordens e os triggers do total
+
+    custo_total passa a ser mantido pelos itens: cada inclusão, alteração
+    ou remoção soma só a diferença, sem somar de novo todas as linhas.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pecas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE,
+            descricao TEXT NOT NULL,
+            preco REAL NOT NULL DEFAULT 0,
+            estoque REAL NOT NULL DEFAULT 0,
+            estoque_minimo REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    # Só as peças abaixo do mínimo entram no índice
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_pecas_estoque_baixo ON pecas (descricao) WHERE estoque <= estoque_minimo")
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS itens_ordem (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ordem_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL CHECK (tipo IN ('{TIPO_MAO_DE_OBRA}', '{TIPO_PECA}')),
+            descricao TEXT,
+            peca_id INTEGER,
+            quantidade REAL NOT NULL DEFAULT 1,
+            preco_unitario REAL NOT NULL DEFAULT 0,
+            -- Verificada no commit: o arquivamento apaga a ordem antes dos itens
+            FOREIGN KEY (ordem_id) REFERENCES ordens_servico (id) DEFERRABLE INITIALLY DEFERRED,
+            FOREIGN KEY (peca_id) REFERENCES pecas (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_itens_ordem ON itens_ordem (ordem_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_itens_peca ON itens_ordem (peca_id) WHERE peca_id IS NOT NULL")
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS itens_ordem_total_ai AFTER INSERT ON itens_ordem BEGIN
+            UPDATE ordens_servico SET custo_total = ROUND(COALESCE(custo_total, 0) + new.quantidade * new.preco_unitario, 2)
+            WHERE id = new.ordem_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS itens_ordem_total_ad AFTER DELETE ON itens_ordem BEGIN
+            UPDATE ordens_servico SET custo_total = ROUND(COALESCE(custo_total, 0) - old.quantidade * old.preco_unitario, 2)
+            WHERE id = old.ordem_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS itens_ordem_total_au
+        AFTER UPDATE OF ordem_id, quantidade, preco_unitario ON itens_ordem BEGIN
+            UPDATE ordens_servico SET custo_total = ROUND(COALESCE(custo_total, 0) - old.quantidade * old.preco_unitario, 2)
+            WHERE id = old.ordem_id;
+            UPDATE ordens_servico SET custo_total = ROUND(COALESCE(custo_total, 0) + new.quantidade * new.preco_unitario, 2)
+            WHERE id = new.ordem_id;
+        END
+    ''')
+
+    # Ordens em aberto por data de início, para o fechamento do dia
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ordens_abertas ON ordens_servico (data_inicio) WHERE data_conclusao IS NULL")
+    conn.commit()
+
+
+# Operações sobre uma conexão (primeiro argumento), usadas localmente e pelo servidor.
+# Nenhuma faz commit: rodam como unidade de trabalho.
+
+def _ordem_aberta(conn, ordem_id):
+    row = conn.execute("SELECT data_conclusao FROM ordens_servico WHERE id = ?", (ordem_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"Ordem de serviço {ordem_id} não encontrada")
+    if row[0] is not None:
+        raise OrdemConcluida(f"A ordem de serviço {ordem_id} já foi concluída em {row[0]}")
+
+
+def _baixar_estoque(conn, peca_id, quantidade):
+    """Tirar `quantidade` do estoque (devolve se negativa); retorna (descricao, preco)"""
+    row = conn.execute(
+        "UPDATE pecas SET estoque = estoque - ? WHERE id = ? AND estoque >= ? RETURNING descricao, preco",
+        (quantidade, peca_id, quantidade)
+    ).fetchone()
+    if row is None:
+        existente = conn.execute("SELECT descricao, estoque FROM pecas WHERE id = ?", (peca_id,)).fetchone()
+        if existente is None:
+            raise LookupError(f"Peça {peca_id} não encontrada")
+        raise EstoqueInsuficiente(f"Estoque insuficiente de {existente[0]} (disponível: {existente[1]:g})")
+    return row
+
+
+def abrir_ordem(conn, agendamento_id, tecnico=None, dia=None):
+    """Abrir (ou retomar) a ordem do agendamento; retorna o id
+
+    Aproveita a ordem em aberto criada na escala dos técnicos. Ordem
+    sem itens recebe o serviço agendado como primeira linha de mão de
+    obra, pelo preço da versão gravada no agendamento, e a partir daí o
+    total é a soma das linhas.
+    """
+    dia = dia or date.today().isoformat()
+    row = conn.execute('''
+        SELECT id FROM ordens_servico
+        WHERE agendamento_id = ? AND data_conclusao IS NULL
+        ORDER BY id DESC LIMIT 1
+    ''', (agendamento_id,)).fetchone()
+    if row is None:
+        ordem_id = conn.execute(
+            "INSERT INTO ordens_servico (agendamento_id, tecnico, data_inicio, custo_total) VALUES (?, ?, ?, 0)",
+            (agendamento_id, tecnico, dia)
+        ).lastrowid
+    else:
+        ordem_id = row[0]
+        conn.execute(
+            "UPDATE ordens_servico SET data_inicio = COALESCE(data_inicio, ?), tecnico = COALESCE(?, tecnico) WHERE id = ?",
+            (dia, tecnico, ordem_id)
+        )
+
+    if conn.execute("SELECT 1 FROM itens_ordem WHERE ordem_id = ? LIMIT 1", (ordem_id,)).fetchone() is None:
+        conn.execute("UPDATE ordens_servico SET custo_total = 0 WHERE id = ?", (ordem_id,))
+        conn.execute(f'''
+            INSERT INTO itens_ordem (ordem_id, tipo, descricao, quantidade, preco_unitario)
+            SELECT ?, '{TIPO_MAO_DE_OBRA}', s.nome, 1, p.preco
+            FROM agendamentos a
+            JOIN servicos s ON s.id = a.servico_id
+            JOIN precos_servicos p ON p.id = COALESCE(
+                a.preco_id, (SELECT MIN(id) FROM precos_servicos WHERE servico_id = a.servico_id))
+            WHERE a.id = ?
+        ''', (ordem_id, agendamento_id))
+
+    conn.execute("UPDATE agendamentos SET status = ? WHERE id = ? AND status = ?",
+                 (STATUS_EM_ANDAMENTO, agendamento_id, STATUS_AGENDADO))
+    return ordem_id
+
+
+def adicionar_mao_de_obra(conn, ordem_id, descricao, horas, valor_hora):
+    """Lançar horas de mão de obra; retorna o id do item"""
+    _ordem_aberta(conn, ordem_id)
+    return conn.execute(
+        "INSERT INTO itens_ordem (ordem_id, tipo, descricao, quantidade, preco_unitario) VALUES (?, ?, ?, ?, ?)",
+        (ordem_id, TIPO_MAO_DE_OBRA, descricao, horas, valor_hora)
+    ).lastrowid
+
+
+def adicionar_peca(conn, ordem_id, peca_id, quantidade=1, preco=None):
+    """Lançar uma peça e baixar do estoque; retorna o id do item
+
+    Sem `preco`, usa o preço de cadastro da peça.
+    """
+    if quantidade <= 0:
+        raise ValueError("A quantidade deve ser positiva")
+    _ordem_aberta(conn, ordem_id)
+    descricao, preco_cadastro = _baixar_estoque(conn, peca_id, quantidade)
+    return conn.execute(
+        "INSERT INTO itens_ordem (ordem_id, tipo, descricao, peca_id, quantidade, preco_unitario) VALUES (?, ?, ?, ?, ?, ?)",
+        (ordem_id, TIPO_PECA, descricao, peca_id, quantidade, preco_cadastro if preco is None else preco)
+    ).lastrowid
+
+
+def _item(conn, item_id):
+    row = conn.execute("SELECT ordem_id, peca_id, quantidade FROM itens_ordem WHERE id = ?", (item_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"Item {item_id} não encontrado")
+    _ordem_aberta(conn, row[0])
+    return row
+
+
+def alterar_quantidade(conn, item_id, quantidade):
+    """Mudar a quantidade de um item; peças acertam o estoque pela diferença"""
+    if quantidade <= 0:
+        raise ValueError("A quantidade deve ser positiva")
+    _, peca_id, anterior = _item(conn, item_id)
+    if peca_id is not None and quantidade != anterior:
+        _baixar_estoque(conn, peca_id, quantidade - anterior)
+    conn.execute("UPDATE itens_ordem SET quantidade = ? WHERE id = ?", (quantidade, item_id))
+
+
+def remover_item(conn, item_id):
+    """Tirar um item da ordem; peças voltam ao estoque"""
+    _, peca_id, quantidade = _item(conn, item_id)
+    if peca_id is not None:
+        _baixar_estoque(conn, peca_id, -quantidade)
+    conn.execute("DELETE FROM itens_ordem WHERE id = ?", (item_id,))
+
+
+def concluir_ordem(conn, ordem_id, dia=None):
+    """Concluir uma ordem e o agendamento dela"""
+    _ordem_aberta(conn, ordem_id)
+    conn.execute("UPDATE ordens_servico SET data_conclusao = ? WHERE id = ?",
+                 (dia or date.today().isoformat(), ordem_id))
+    conn.execute('''
+        UPDATE agendamentos SET status = ?
+        WHERE id = (SELECT agendamento_id FROM ordens_servico WHERE id = ?)
+    ''', (STATUS_CONCLUIDO, ordem_id))
+
+
+def fechar_dia(conn, dia=None):
+    """Concluir de uma vez as ordens abertas no dia; retorna quantas
+
+    Dois UPDATEs em conjunto pelo índice parcial de ordens em aberto, na
+    mesma transação, em vez de uma chamada por ordem.
+    """
+    dia = dia or date.today().isoformat()
+    conn.execute('''
+        UPDATE agendamentos SET status = ?
+        WHERE id IN (SELECT agendamento_id FROM ordens_servico WHERE data_conclusao IS NULL AND data_inicio = ?)
+    ''', (STATUS_CONCLUIDO, dia))
+    return conn.execute(
+        "UPDATE ordens_servico SET data_conclusao = ? WHERE data_conclusao IS NULL AND data_inicio = ?", (dia, dia)
+    ).rowcount
+
+
+def ler_ordem(conn, ordem_id):
+    """(ordem, itens) com a ordem como (id, agendamento_id, tecnico, data_inicio, data_conclusao, custo_total)"""
+    ordem = conn.execute('''
+        SELECT id, agendamento_id, tecnico, data_inicio, data_conclusao, custo_total
+        FROM ordens_servico WHERE id = ?
+    ''', (ordem_id,)).fetchone()
+    if ordem is None:
+        return None, []
+    itens = conn.execute('''
+        SELECT id, tipo, descricao, peca_id, quantidade, preco_unitario
+        FROM itens_ordem WHERE ordem_id = ? ORDER BY id
+    ''', (ordem_id,)).fetchall()
+    return ordem, itens
+
+
+# Estoque de peças
+
+def cadastrar_peca(conn, codigo, descricao, preco, estoque=0, estoque_minimo=0):
+    return conn.execute(
+        "INSERT INTO pecas (codigo, descricao, preco, estoque, estoque_minimo) VALUES (?, ?, ?, ?, ?)",
+        (codigo, descricao, preco, estoque, estoque_minimo)
+    ).lastrowid
+
+
+def repor_estoque(conn, peca_id, quantidade):
+    """Somar uma entrada ao estoque; retorna o novo saldo"""
+    row = conn.execute("UPDATE pecas SET estoque = estoque + ? WHERE id = ? RETURNING estoque",
+                       (quantidade, peca_id)).fetchone()
+    if row is None:
+        raise LookupError(f"Peça {peca_id} não encontrada")
+    return row[0]
+
+
+def pecas_em_falta(conn):
+    """Peças no mínimo ou abaixo dele (pelo índice parcial)"""
+    return conn.execute('''
+        SELECT id, codigo, descricao, estoque, estoque_minimo FROM pecas
+        WHERE estoque <= estoque_minimo ORDER BY descricao
+    ''').fetchall()
@@ -0,0 +1,221 @@
+import csv
+import html
+
+# Ordens de serviço processadas por transação na atualização incremental
+TAMANHO_LOTE = 10000
+
+# Linhas exibidas na tela; arquivos exportados trazem tudo
+LIMITE_TELA = 500
+
+# Tabelas de agregados: dimensão -> (tabela, coluna, expressão sobre o/a)
+DIMENSOES = {
+    'mes': ('rel_faturamento_mes', None, None),
+    'servico': ('rel_faturamento_servico', 'servico_id', "COALESCE(a.servico_id, 0)"),
+    'tecnico': ('rel_faturamento_tecnico', 'tecnico', "COALESCE(o.tecnico, '')"),
+    'cliente': ('rel_faturamento_cliente', 'cliente_id', "COALESCE(a.cliente_id, 0)"),
+}
+
+# Relatórios disponíveis: tipo -> (título, cabeçalhos, consulta)
+# A ordem é total (desempate pela chave): duas exportações dos mesmos dados saem iguais
+RELATORIOS = {
+    'mes': (
+        "Faturamento por mês",
+        ('Mês', 'Ordens', 'Faturamento'),
+        "SELECT mes, ordens, faturamento FROM rel_faturamento_mes ORDER BY mes DESC",
+    ),
+    'servico': (
+        "Faturamento por serviço",
+        ('Serviço', 'Ordens', 'Faturamento'),
+        """SELECT COALESCE(s.nome, '(sem serviço)'), SUM(r.ordens), SUM(r.faturamento)
+           FROM rel_faturamento_servico r LEFT JOIN servicos s ON s.id = r.servico_id
+           GROUP BY r.servico_id ORDER BY 3 DESC, r.servico_id""",
+    ),
+    'tecnico': (
+        "Faturamento por técnico",
+        ('Técnico', 'Ordens', 'Faturamento'),
+        """SELECT CASE r.tecnico WHEN '' THEN '(sem técnico)' ELSE r.tecnico END,
+                  SUM(r.ordens), SUM(r.faturamento)
+           FROM rel_faturamento_tecnico r GROUP BY r.tecnico ORDER BY 3 DESC, r.tecnico""",
+    ),
+    'cliente': (
+        "Faturamento por cliente",
+        ('Cliente', 'Ordens', 'Faturamento'),
+        """SELECT COALESCE(c.nome, '(sem cliente)'), SUM(r.ordens), SUM(r.faturamento)
+           FROM rel_faturamento_cliente r LEFT JOIN clientes c ON c.id = r.cliente_id
+           GROUP BY r.cliente_id ORDER BY 3 DESC, r.cliente_id""",
+    ),
+}
+
+
+# Ordens com id até a marca d'água já estão somadas nos agregados
+_JA_AGREGADA = "o.id <= (SELECT ultimo_id FROM rel_controle WHERE id = 1)"
+
+
+def _chaves(dimensao):
+    tabela, coluna, _ = DIMENSOES[dimensao]
+    return ('mes', coluna) if coluna else ('mes',)
+
+
+def _sql_aplicar(dimensao, origem, filtro, sinal='+'):
+    """INSERT ... SELECT que soma (ou subtrai) contribuições em um agregado
+
+    `origem` deve expor as colunas de ordens_servico como `o` e o
+    agendamento correspondente como `a`.
+    """
+    tabela, coluna, expressao = DIMENSOES[dimensao]
+    chaves = _chaves(dimensao)
+    selecao = "substr(o.data_conclusao, 1, 7)" + (f", {expressao}" if coluna else "")
+    return f'''
+        INSERT INTO {tabela} ({', '.join(chaves)}, ordens, faturamento)
+        SELECT {selecao}, {sinal}COUNT(*), {sinal}SUM(COALESCE(o.custo_total, 0))
+        FROM {origem}
+        WHERE o.data_conclusao IS NOT NULL AND {filtro}
+        GROUP BY {', '.join(str(i + 1) for i in range(len(chaves)))}
+        ON CONFLICT ({', '.join(chaves)}) DO UPDATE SET
+            ordens = ordens + excluded.ordens,
+            faturamento = faturamento + excluded.faturamento
+    '''
+
+
+def criar_tabelas_relatorios(conn):
+    """Criar tabelas de agregados, marca d'água e triggers de correção"""
+    cursor = conn.cursor()
+    for dimensao, (tabela, coluna, _) in DIMENSOES.items():
+        definicao_coluna = f"{coluna} {'TEXT' if coluna == 'tecnico' else 'INTEGER'} NOT NULL, " if coluna else ""
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                mes TEXT NOT NULL,
+                {definicao_coluna}ordens INTEGER NOT NULL DEFAULT 0,
+                faturamento REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY ({', '.join(_chaves(dimensao))})
+            )
+        ''')
+
+    # Maior ordens_servico.id já incluído nos agregados
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rel_controle (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO rel_controle (id, ultimo_id) VALUES (1, 0)")
+
+    # Ordens já agregadas que mudam depois (ex.: conclusão) são corrigidas
+    # na hora; ordens novas entram em lote pela marca d'água
+    ja_agregada = _JA_AGREGADA
+    antigo = "(SELECT old.id AS id, old.data_conclusao AS data_conclusao, old.custo_total AS custo_total, " \
+             "old.tecnico AS tecnico, old.agendamento_id AS agendamento_id) o " \
+             "LEFT JOIN agendamentos a ON a.id = o.agendamento_id"
+    novo = antigo.replace('old.', 'new.')
+    remover_antigo = ''.join(_sql_aplicar(d, antigo, ja_agregada, '-') + ';' for d in DIMENSOES)
+    somar_novo = ''.join(_sql_aplicar(d, novo, ja_agregada) + ';' for d in DIMENSOES)
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rel_ordens_au
+        AFTER UPDATE OF data_conclusao, custo_total, tecnico, agendamento_id ON ordens_servico BEGIN
+            {remover_antigo}
+            {somar_novo}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rel_ordens_ad AFTER DELETE ON ordens_servico BEGIN
+            {remover_antigo}
+        END
+    ''')
+    conn.commit()
+
+
+def criar_correcao_agendamentos(conn):
+    """Triggers que movem as ordens já agregadas quando o agendamento muda de serviço ou de cliente
+
+    Sem isso o faturamento ficaria para sempre na chave antiga (ex.:
+    cadastros de cliente mesclados).
+    """
+    for dimensao in ('servico', 'cliente'):
+        _, coluna, _ = DIMENSOES[dimensao]
+        antigo = f"ordens_servico o JOIN (SELECT old.id AS id, old.{coluna} AS {coluna}) a ON a.id = o.agendamento_id"
+        novo = antigo.replace('old.', 'new.')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS rel_agendamentos_{coluna}_au
+            AFTER UPDATE OF {coluna} ON agendamentos WHEN old.{coluna} IS NOT new.{coluna} BEGIN
+                {_sql_aplicar(dimensao, antigo, f"o.agendamento_id = old.id AND {_JA_AGREGADA}", '-')};
+                {_sql_aplicar(dimensao, novo, f"o.agendamento_id = new.id AND {_JA_AGREGADA}")};
+            END
+        ''')
+
+
+def atualizar_agregados(conn, tamanho_lote=TAMANHO_LOTE):
+    """Incluir nos agregados as ordens criadas desde a última atualização
+
+    Processa faixas de ids em transações curtas; retorna quantas ordens
+    novas foram examinadas.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT ultimo_id FROM rel_controle WHERE id = 1")
+    ultimo_id = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ordens_servico")
+    maximo = cursor.fetchone()[0]
+
+    origem = "ordens_servico o LEFT JOIN agendamentos a ON a.id = o.agendamento_id"
+    examinadas = 0
+    while ultimo_id < maximo:
+        limite = min(ultimo_id + tamanho_lote, maximo)
+        try:
+            for dimensao in DIMENSOES:
+                cursor.execute(_sql_aplicar(dimensao, origem, "o.id > ? AND o.id <= ?"), (ultimo_id, limite))
+            cursor.execute("UPDATE rel_controle SET ultimo_id = ? WHERE id = 1", (limite,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        examinadas += limite - ultimo_id
+        ultimo_id = limite
+    return examinadas
+
+
+def incluir_arquivados(conn, filtro, parametros=()):
+    """Devolver aos agregados as ordens movidas para o banco de arquivados
+
+    A exclusão em ordens_servico tira a contribuição delas (rel_ordens_ad);
+    isto a soma de novo a partir de arquivo.ordens_servico, para que os
+    relatórios não mudem com o arquivamento. Não faz commit.
+    """
+    origem = "arquivo.ordens_servico o LEFT JOIN arquivo.agendamentos a ON a.id = o.agendamento_id"
+    filtro = f"({filtro}) AND o.id <= (SELECT ultimo_id FROM rel_controle WHERE id = 1)"
+    for dimensao in DIMENSOES:
+        conn.execute(_sql_aplicar(dimensao, origem, filtro), parametros)
+
+
+def consultar_relatorio(conn, tipo, limite=None):
+    """Cursor com as linhas de um relatório, lidas sob demanda"""
+    _, _, consulta = RELATORIOS[tipo]
+    if limite is not None:
+        return conn.execute(f"SELECT * FROM ({consulta}) LIMIT ?", (limite,))
+    return conn.execute(consulta)
+
+
+def gerar_relatorio(conn, tipo, caminho):
+    """Gravar um relatório em CSV ou HTML linha a linha; retorna o total de linhas"""
+    return escrever_relatorio(tipo, consultar_relatorio(conn, tipo), caminho)
+
+
+def escrever_relatorio(tipo, linhas_relatorio, caminho):
+    """Gravar em CSV ou HTML as linhas de um relatório (qualquer iterável)"""
+    titulo, cabecalhos, _ = RELATORIOS[tipo]
+    linhas = 0
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        if caminho.lower().endswith(('.html', '.htm')):
+            arquivo.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(titulo)}</title></head>\n")
+            arquivo.write(f"<body><h1>{html.escape(titulo)}</h1>\n<table border=\"1\">\n<tr>")
+            arquivo.write(''.join(f"<th>{html.escape(c)}</th>" for c in cabecalhos) + "</tr>\n")
+            for row in linhas_relatorio:
+                arquivo.write("<tr>" + ''.join(f"<td>{html.escape(str(v))}</td>" for v in row) + "</tr>\n")
+                linhas += 1
+            arquivo.write("</table>\n</body></html>\n")
+        else:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(cabecalhos)
+            for row in linhas_relatorio:
+                escritor.writerow(row)
+                linhas += 1
+    return linhas
@@ -0,0 +1,293 @@
+import threading
+from collections import OrderedDict
+
+from unidade_trabalho import ao_confirmar
+
+# Registros mantidos no mapa de identidade, por tabela
+CAPACIDADE_MAPA = 5000
+
+# Ids por consulta ao carregar registros que não estão em memória
+LOTE_LEITURA = 500
+
+
+class Registro:
+    """Linha de uma tabela com os campos em __slots__
+
+    Guarda os valores lidos do banco para saber quais campos mudaram:
+    a gravação atualiza só as colunas que mudaram.
+    """
+
+    __slots__ = ('id', '_salvo')
+    TABELA = None
+    CAMPOS = ()
+
+    def __init__(self, id=None, *valores):
+        self.id = id
+        self._carregar(valores or (None,) * len(self.CAMPOS))
+
+    def _carregar(self, valores):
+        for campo, valor in zip(self.CAMPOS, valores):
+            setattr(self, campo, valor)
+        self._salvo = tuple(valores)
+
+    def valores(self):
+        return tuple(getattr(self, campo) for campo in self.CAMPOS)
+
+    def alterados(self):
+        """Campos diferentes do que foi lido ou gravado por último"""
+        return {campo: valor for campo, valor, salvo in zip(self.CAMPOS, self.valores(), self._salvo) if valor != salvo}
+
+    def aplicar(self, dados):
+        for campo, valor in dados.items():
+            if campo not in self.CAMPOS:
+                raise AttributeError(f"{type(self).__name__} não possui o campo {campo}")
+            setattr(self, campo, valor)
+
+    def valores_com(self, dados):
+        """{campo: valor} atuais com `dados` por cima, sem alterar o registro"""
+        valores = dict(zip(self.CAMPOS, self.valores()))
+        for campo, valor in dados.items():
+            if campo not in valores:
+                raise AttributeError(f"{type(self).__name__} não possui o campo {campo}")
+            valores[campo] = valor
+        return valores
+
+    def confirmar(self):
+        """Marcar os valores atuais como gravados"""
+        self._salvo = self.valores()
+
+    def descartar(self):
+        """Voltar aos valores gravados"""
+        self._carregar(self._salvo)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.id!r}, " + ", ".join(repr(valor) for valor in self.valores()) + ")"
+
+
+class Cliente(Registro):
+    TABELA = 'clientes'
+    # Mesma ordem de busca_clientes.COLUNAS_CLIENTE (depois do id)
+    CAMPOS = ('nome', 'telefone', 'email', 'data_cadastro', 'endereco')
+    __slots__ = CAMPOS
+
+    def linha(self):
+        """Valores exibidos na lista de clientes"""
+        return (self.id, self.nome, self.telefone, self.email, self.data_cadastro)
+
+
+class Veiculo(Registro):
+    TABELA = 'veiculos'
+    CAMPOS = ('cliente_id', 'marca', 'modelo', 'ano', 'placa', 'quilometragem')
+    __slots__ = CAMPOS
+
+
+class Agendamento(Registro):
+    TABELA = 'agendamentos'
+    CAMPOS = ('cliente_id', 'veiculo_id', 'servico_id', 'data_agendamento', 'horario', 'status', 'observacoes', 'preco_id')
+    __slots__ = CAMPOS
+
+
+REGISTROS = {classe.TABELA: classe for classe in (Cliente, Veiculo, Agendamento)}
+
+
+def _classe(tabela):
+    classe = REGISTROS.get(tabela)
+    if classe is None:
+        raise ValueError(f"Tabela sem registro: {tabela}")
+    return classe
+
+
+def _validar_campos(classe, campos):
+    invalidos = set(campos) - set(classe.CAMPOS)
+    if invalidos:
+        raise ValueError(f"Campos inválidos para {classe.TABELA}: {', '.join(sorted(invalidos))}")
+
+
+# Operações sobre uma conexão (primeiro argumento), usadas localmente e pelo servidor
+
+def ler_registros(conn, tabela, ids):
+    """Linhas (id, *CAMPOS) dos ids informados que existem"""
+    classe = _classe(tabela)
+    ids = list(ids)
+    linhas = []
+    for inicio in range(0, len(ids), LOTE_LEITURA):
+        lote = ids[inicio:inicio + LOTE_LEITURA]
+        marcadores = ', '.join('?' for _ in lote)
+        linhas += conn.execute(
+            f"SELECT id, {', '.join(classe.CAMPOS)} FROM {classe.TABELA} WHERE id IN ({marcadores})", lote
+        ).fetchall()
+    return linhas
+
+
+def inserir_registro(conn, tabela, campos):
+    """Inserir uma linha com os campos informados; retorna o id"""
+    classe = _classe(tabela)
+    _validar_campos(classe, campos)
+    if not campos:
+        return conn.execute(f"INSERT INTO {classe.TABELA} DEFAULT VALUES").lastrowid
+    nomes = list(campos)
+    cursor = conn.execute(
+        f"INSERT INTO {classe.TABELA} ({', '.join(nomes)}) VALUES ({', '.join('?' for _ in nomes)})",
+        [campos[nome] for nome in nomes]
+    )
+    return cursor.lastrowid
+
+
+def gravar_campos(conn, tabela, registro_id, campos):
+    """Atualizar só as colunas informadas de uma linha (não faz commit)"""
+    classe = _classe(tabela)
+    _validar_campos(classe, campos)
+    if not campos:
+        return
+    nomes = list(campos)
+    cursor = conn.execute(
+        f"UPDATE {classe.TABELA} SET {', '.join(f'{nome} = ?' for nome in nomes)} WHERE id = ?",
+        [campos[nome] for nome in nomes] + [registro_id]
+    )
+    if cursor.rowcount == 0:
+        raise LookupError(f"Registro {registro_id} não encontrado em {classe.TABELA}")
+
+
+class MapaIdentidade:
+    """Uma instância por id, com descarte da usada há mais tempo
+
+    Telas que ainda seguram um registro descartado continuam com ele;
+    a próxima leitura do mesmo id cria outra instância.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_MAPA):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, registro_id):
+        with self._lock:
+            registro = self._itens.get(registro_id)
+            if registro is not None:
+                self._itens.move_to_end(registro_id)
+            return registro
+
+    def guardar(self, registro):
+        with self._lock:
+            self._guardar(registro)
+
+    def _guardar(self, registro):
+        self._itens[registro.id] = registro
+        self._itens.move_to_end(registro.id)
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    def incorporar(self, classe, linhas):
+        """Registros das linhas lidas; ids já em memória são atualizados no lugar"""
+        registros = []
+        with self._lock:
+            for row in linhas:
+                registro = self._itens.get(row[0])
+                if registro is None:
+                    registro = classe(*row)
+                    self._guardar(registro)
+                else:
+                    registro._carregar(tuple(row[1:]))
+                    self._itens.move_to_end(row[0])
+                registros.append(registro)
+        return registros
+
+    def remover(self, registro_id):
+        with self._lock:
+            self._itens.pop(registro_id, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+class Repositorio:
+    """Clientes, veículos e agendamentos carregados uma vez e compartilhados
+
+    Lista, pesquisa e formulários recebem a mesma instância de cada id.
+    `ler`, `inserir` e `atualizar` têm a assinatura de ler_registros,
+    inserir_registro e gravar_campos sem a conexão, para que o mesmo
+    repositório sirva ao banco local e ao servidor.
+    """
+
+    def __init__(self, ler, inserir, atualizar, capacidade=CAPACIDADE_MAPA):
+        self._ler = ler
+        self._inserir = inserir
+        self._atualizar = atualizar
+        self.mapas = {classe: MapaIdentidade(capacidade) for classe in REGISTROS.values()}
+
+    def incorporar(self, classe, linhas):
+        return self.mapas[classe].incorporar(classe, linhas)
+
+    def em_memoria(self, classe, registro_id):
+        """Registro já carregado, sem acessar o banco (pode ser chamado no loop do Tk)"""
+        return self.mapas[classe].obter(registro_id)
+
+    def obter(self, classe, ids):
+        """{id: registro} dos ids existentes, lendo só os que não estão em memória"""
+        mapa = self.mapas[classe]
+        encontrados = {}
+        faltando = []
+        for registro_id in ids:
+            registro = mapa.obter(registro_id)
+            if registro is None:
+                faltando.append(registro_id)
+            else:
+                encontrados[registro_id] = registro
+        if faltando:
+            for registro in self.incorporar(classe, self._ler(classe.TABELA, faltando)):
+                encontrados[registro.id] = registro
+        return encontrados
+
+    def obter_um(self, classe, registro_id):
+        return self.obter(classe, [registro_id]).get(registro_id)
+
+    def salvar(self, registro, dados=None):
+        """Gravar `dados` só nos campos que mudaram; retorna o registro
+
+        Registro sem id é inserido com todos os campos preenchidos.
+        Não faz commit: deve rodar em uma unidade de trabalho. O registro,
+        que as telas compartilham, só recebe os valores (e o id) depois
+        do commit; se a unidade ou o commit falhar, fica como estava.
+        """
+        dados = dict(dados or {})
+        valores = registro.valores_com(dados)
+        if registro.id is None:
+            registro_id = self._inserir(registro.TABELA, {campo: valor for campo, valor in valores.items() if valor is not None})
+        else:
+            registro_id = registro.id
+            self._atualizar(registro.TABELA, registro.id, {
+                campo: valores[campo] for campo, salvo in zip(registro.CAMPOS, registro._salvo) if valores[campo] != salvo
+            })
+
+        def confirmado():
+            registro.id = registro_id
+            registro.aplicar(dados)
+            registro.confirmar()
+            self.mapas[type(registro)].guardar(registro)
+
+        ao_confirmar(confirmado)
+        return registro
+
+    def esquecer(self, classe, registro_id):
+        self.mapas[classe].remover(registro_id)
+
+    def aplicar_alteracoes(self, eventos):
+        """Descartar os registros alterados por eventos do registro de alterações
+
+        None (eventos perdidos) descarta tudo.
+        """
+        if eventos is None:
+            self.limpar()
+            return
+        for _, tabela, registro_id, _ in eventos:
+            classe = REGISTROS.get(tabela)
+            if classe is not None:
+                self.esquecer(classe, registro_id)
+
+    def limpar(self):
+        for mapa in self.mapas.values():
+            mapa.limpar()
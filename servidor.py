@@ -0,0 +1,358 @@
+import argparse
+import json
+import queue
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from config import DATABASE_PATH, SERVIDOR_HOST, SERVIDOR_PORTA
+from banco import conectar, preparar_banco
+from duplicados import sincronizar_chaves
+from notificacoes import podar_alteracoes
+from lembretes import ProcessadorLembretes
+from operacoes import EXCLUSIVA, LEITURA, OPERACOES
+from relatorios import RELATORIOS, consultar_relatorio
+from unidade_trabalho import CommitEmGrupo, UnidadeTrabalho
+from veiculos import completar_resumos
+
+# Conexões de leitura abertas pelo servidor
+TAMANHO_POOL = 4
+
+# Espera máxima de uma gravação por outras para dividir o mesmo commit (ms);
+# menor que a do executor local porque cada estação aguarda a resposta pela rede
+JANELA_COMMIT_MS = 5
+
+# Tamanho máximo aceito no corpo de uma requisição
+LIMITE_CORPO = 4 * 1024 * 1024
+
+# Linhas de relatório por bloco da resposta em partes (chunked)
+LINHAS_POR_BLOCO = 1000
+
+# Tarefas da thread de escrita quando a fila fica vazia, e intervalo mínimo
+# entre rodadas (s): mantêm as tabelas auxiliares das consultas de leitura
+TAREFAS_FUNDO = (sincronizar_chaves, completar_resumos)
+INTERVALO_FUNDO_S = 60
+
+
+class OperacaoDesconhecida(Exception):
+    """Operação não exposta pelo servidor"""
+
+
+class PoolConexoes:
+    """Conexões de leitura reaproveitadas entre as requisições"""
+
+    def __init__(self, caminho, tamanho=TAMANHO_POOL):
+        self._livres = queue.Queue()
+        self._todas = []
+        for _ in range(tamanho):
+            conn = conectar(caminho)
+            self._todas.append(conn)
+            self._livres.put(conn)
+
+    def executar(self, funcao, *args):
+        conn = self._livres.get()
+        try:
+            return funcao(conn, *args)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._livres.put(conn)
+
+    def fechar(self):
+        for conn in self._todas:
+            conn.close()
+
+
+class Lote:
+    """Chamadas de uma requisição aguardando a thread de escrita"""
+
+    __slots__ = ('chamadas', 'resultados', 'erro', 'pronto')
+
+    def __init__(self, chamadas):
+        self.chamadas = chamadas
+        self.resultados = None
+        self.erro = None
+        self.pronto = threading.Event()
+
+
+class Escritor:
+    """Única conexão que grava no banco, alimentada por uma fila
+
+    Lotes só com leituras e gravações viram uma unidade de trabalho cada
+    e são confirmados juntos (CommitEmGrupo). Lotes com operações
+    exclusivas rodam sozinhos, depois de confirmar o grupo pendente. Com
+    a fila vazia, roda as tarefas de fundo a cada `intervalo` segundos.
+    """
+
+    def __init__(self, caminho, tarefas=TAREFAS_FUNDO, intervalo=INTERVALO_FUNDO_S):
+        self.conn = conectar(caminho)
+        self._grupo = CommitEmGrupo(self.conn, self._confirmados, JANELA_COMMIT_MS)
+        self._fila = queue.Queue()
+        self._tarefas = tarefas
+        self._intervalo = intervalo
+        self._proxima_rodada = time.monotonic() + intervalo
+        self.ultimo_erro = None
+        self._thread = threading.Thread(target=self._trabalhar, name='escritor-banco', daemon=True)
+        self._thread.start()
+
+    def executar(self, chamadas):
+        lote = Lote(chamadas)
+        self._fila.put(lote)
+        lote.pronto.wait()
+        if lote.erro is not None:
+            raise lote.erro
+        return lote.resultados
+
+    def _trabalhar(self):
+        while True:
+            espera = self._grupo.espera()
+            if espera is None and self._tarefas:
+                espera = max(0.0, self._proxima_rodada - time.monotonic())
+            try:
+                lote = self._fila.get(timeout=espera)
+            except queue.Empty:
+                self._grupo.confirmar()
+                if time.monotonic() >= self._proxima_rodada:
+                    self._rodar_fundo()
+                continue
+            if lote is None:
+                break
+
+            if any(tipo == EXCLUSIVA for _, tipo, _ in lote.chamadas):
+                self._grupo.confirmar()
+                self._executar_exclusivo(lote)
+                continue
+
+            unidade = UnidadeTrabalho()
+            for funcao, _, args in lote.chamadas:
+                unidade.adicionar(funcao, self.conn, *args)
+            try:
+                self._grupo.aplicar(lote, unidade)
+            except Exception as e:
+                lote.erro = e
+                lote.pronto.set()
+
+        self._grupo.confirmar()
+        self.conn.close()
+
+    def _executar_exclusivo(self, lote):
+        resultados = []
+        try:
+            for funcao, _, args in lote.chamadas:
+                resultados.append(funcao(self.conn, *args))
+                if self.conn.in_transaction:
+                    self.conn.commit()
+            lote.resultados = resultados
+        except Exception as e:
+            self.conn.rollback()
+            lote.erro = e
+        lote.pronto.set()
+
+    def _rodar_fundo(self):
+        for tarefa in self._tarefas:
+            try:
+                tarefa(self.conn)
+            except Exception as e:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                self.ultimo_erro = e
+                traceback.print_exc()
+        self._proxima_rodada = time.monotonic() + self._intervalo
+
+    def _confirmados(self, pendentes, erro, duracao_ms):
+        for lote, resultados in pendentes:
+            lote.resultados = None if erro else resultados
+            lote.erro = erro
+            lote.pronto.set()
+
+    def encerrar(self):
+        self._fila.put(None)
+        self._thread.join()
+
+
+class ServidorOficina:
+    """Serviço HTTP/JSON que centraliza o acesso ao banco
+
+    POST /chamar com {"chamadas": [["operacao", [args...]], ...]} executa
+    as chamadas em ordem e responde {"resultados": [...]}. Um lote com
+    alguma gravação roda inteiro na thread de escrita, como uma unidade;
+    lotes só de leitura usam o pool. GET /relatorio/<tipo> responde o
+    relatório inteiro em JSON Lines, em partes, e GET /saude responde
+    {"ok": true}.
+    """
+
+    def __init__(self, caminho=DATABASE_PATH, host=SERVIDOR_HOST, porta=SERVIDOR_PORTA,
+                 tamanho_pool=TAMANHO_POOL):
+        conn = conectar(caminho)
+        preparar_banco(conn)
+        sincronizar_chaves(conn)
+        podar_alteracoes(conn)
+        conn.close()
+
+        self.pool = PoolConexoes(caminho, tamanho_pool)
+        self.escritor = Escritor(caminho)
+        self.http = ThreadingHTTPServer((host, porta), _criar_manipulador(self))
+        self.http.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endereco(self):
+        host, porta = self.http.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def executar(self, chamadas):
+        """Resolver e executar um lote de chamadas [(nome, args), ...]"""
+        resolvidas = []
+        for nome, args in chamadas:
+            if nome not in OPERACOES:
+                raise OperacaoDesconhecida(nome)
+            funcao, tipo = OPERACOES[nome]
+            resolvidas.append((funcao, tipo, list(args)))
+
+        if all(tipo == LEITURA for _, tipo, _ in resolvidas):
+            return self.pool.executar(
+                lambda conn: [funcao(conn, *args) for funcao, _, args in resolvidas])
+        return self.escritor.executar(resolvidas)
+
+    def iniciar(self):
+        """Atender requisições em segundo plano"""
+        self._thread = threading.Thread(target=self.http.serve_forever, name='servidor-http', daemon=True)
+        self._thread.start()
+        return self
+
+    def servir(self):
+        """Atender requisições nesta thread até Ctrl+C"""
+        try:
+            self.http.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.encerrar()
+
+    def encerrar(self):
+        if self._thread is not None:
+            self.http.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.http.server_close()
+        self.escritor.encerrar()
+        self.pool.fechar()
+
+
+def _criar_manipulador(servidor):
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Cabeçalho e corpo saem em escritas separadas: sem isso o atraso de ACK custa ~40 ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, formato, *args):
+            pass
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _bloco(self, dados):
+            self.wfile.write(f"{len(dados):X}\r\n".encode('ascii') + dados + b"\r\n")
+
+        def _transmitir_relatorio(self, conn, tipo):
+            """Uma só consulta do começo ao fim: o agrupamento e a ordenação rodam uma vez
+
+            As linhas saem em blocos de LINHAS_POR_BLOCO enquanto o cursor
+            avança, sem montar o relatório em memória. Um erro antes da
+            primeira linha vira resposta 409; depois dela, uma última linha
+            {"erro": ...}.
+            """
+            try:
+                cursor = consultar_relatorio(conn, tipo)
+                linhas = cursor.fetchmany(LINHAS_POR_BLOCO)
+            except Exception as e:
+                self._responder(409, {'erro': {'tipo': type(e).__name__, 'mensagem': str(e)}})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                while linhas:
+                    self._bloco(''.join(json.dumps(linha, ensure_ascii=False) + '\n' for linha in linhas).encode('utf-8'))
+                    linhas = cursor.fetchmany(LINHAS_POR_BLOCO)
+            except ConnectionError:
+                # A estação desistiu da exportação
+                self.close_connection = True
+                return
+            except Exception as e:
+                traceback.print_exc()
+                erro = {'erro': {'tipo': type(e).__name__, 'mensagem': str(e)}}
+                self._bloco((json.dumps(erro, ensure_ascii=False) + '\n').encode('utf-8'))
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_GET(self):
+            if self.path == '/saude':
+                self._responder(200, {'ok': True})
+            elif self.path.startswith('/relatorio/'):
+                tipo = unquote(self.path[len('/relatorio/'):])
+                if tipo not in RELATORIOS:
+                    self._responder(404, {'erro': {'tipo': 'NaoEncontrado', 'mensagem': self.path}})
+                    return
+                servidor.pool.executar(self._transmitir_relatorio, tipo)
+            else:
+                self._responder(404, {'erro': {'tipo': 'NaoEncontrado', 'mensagem': self.path}})
+
+        def do_POST(self):
+            if self.path != '/chamar':
+                self._responder(404, {'erro': {'tipo': 'NaoEncontrado', 'mensagem': self.path}})
+                return
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            if tamanho > LIMITE_CORPO:
+                self._responder(413, {'erro': {'tipo': 'CorpoGrande', 'mensagem': str(tamanho)}})
+                return
+            try:
+                pedido = json.loads(self.rfile.read(tamanho) or b'{}')
+                chamadas = pedido['chamadas']
+            except (ValueError, KeyError, TypeError) as e:
+                self._responder(400, {'erro': {'tipo': 'PedidoInvalido', 'mensagem': str(e)}})
+                return
+
+            try:
+                resultados = servidor.executar(chamadas)
+            except OperacaoDesconhecida as e:
+                self._responder(400, {'erro': {'tipo': 'OperacaoDesconhecida', 'mensagem': str(e)}})
+            except Exception as e:
+                if not isinstance(e, (LookupError, ValueError)) and type(e).__module__ != 'sqlite3':
+                    traceback.print_exc()
+                self._responder(409, {'erro': {'tipo': type(e).__name__, 'mensagem': str(e)}})
+            else:
+                self._responder(200, {'resultados': resultados})
+
+    return Manipulador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor do banco para várias estações")
+    parser.add_argument('--banco', default=DATABASE_PATH, help="arquivo do banco SQLite")
+    parser.add_argument('--host', default=SERVIDOR_HOST)
+    parser.add_argument('--porta', type=int, default=SERVIDOR_PORTA)
+    parser.add_argument('--conexoes', type=int, default=TAMANHO_POOL, help="conexões de leitura")
+    parser.add_argument('--sem-lembretes', action='store_true', help="não enviar lembretes nem marcar faltas")
+    args = parser.parse_args()
+
+    servidor = ServidorOficina(args.banco, args.host, args.porta, args.conexoes)
+    # As estações remotas não processam lembretes: o servidor faz isso por todas
+    lembretes = None if args.sem_lembretes else ProcessadorLembretes(args.banco).iniciar()
+    print(f"Servidor da oficina em {servidor.endereco} (banco: {args.banco})")
+    try:
+        servidor.servir()
+    finally:
+        if lembretes is not None:
+            lembretes.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+
+from agenda import DURACAO_PADRAO_MIN, STATUS_LIVRES, para_horario, para_minutos
+from config import DIAS_FUNCIONAMENTO, HORARIO_ABERTURA, HORARIO_FECHAMENTO, TECNICOS
+from estatisticas import STATUS_CONCLUIDO
+
+# Técnico com ordem de serviço nos últimos N dias ainda faz parte da equipe
+DIAS_TECNICO_ATIVO = 90
+
+# Agendamento e a sua ordem de serviço mais recente
+SQL_ESCALA = """
+    SELECT a.id, a.data_agendamento, a.horario, a.servico_id, a.status,
+           o.id, o.tecnico, o.data_conclusao
+    FROM agendamentos a
+    LEFT JOIN ordens_servico o ON o.id = (
+        SELECT MAX(id) FROM ordens_servico WHERE agendamento_id = a.id
+    )
+    WHERE {filtro}
+"""
+
+
+def semana(data):
+    """(segunda-feira, domingo) da semana de uma data ISO"""
+    dia = date.fromisoformat(data)
+    inicio = dia - timedelta(days=dia.weekday())
+    return inicio.isoformat(), (inicio + timedelta(days=6)).isoformat()
+
+
+def equipe(conn, hoje=None):
+    """Técnicos configurados mais os que tiveram ordens de serviço recentes"""
+    desde = ((hoje or date.today()) - timedelta(days=DIAS_TECNICO_ATIVO)).isoformat()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT DISTINCT o.tecnico
+        FROM agendamentos a
+        JOIN ordens_servico o ON o.agendamento_id = a.id
+        WHERE a.data_agendamento >= ? AND o.tecnico IS NOT NULL AND o.tecnico <> ''
+    """, (desde,))
+    return sorted(set(TECNICOS) | {row[0] for row in cursor})
+
+
+def ocupacao_tecnicos(conn, inicio, fim):
+    """Equipe, durações dos serviços e agendamentos que ocupam horário entre duas datas (inclusive)"""
+    marcadores = ', '.join('?' for _ in STATUS_LIVRES)
+    cursor = conn.cursor()
+    cursor.execute(
+        SQL_ESCALA.format(filtro=f"a.data_agendamento BETWEEN ? AND ? AND a.horario IS NOT NULL "
+                                 f"AND a.status NOT IN ({marcadores})"),
+        (inicio, fim) + STATUS_LIVRES
+    )
+    linhas = cursor.fetchall()
+    duracoes = cursor.execute("SELECT id, tempo_estimado FROM servicos").fetchall()
+    return equipe(conn), duracoes, linhas
+
+
+def escala_por_id(conn, agendamento_ids=(), ordem_ids=()):
+    """Linhas da escala dos agendamentos informados ou das ordens de serviço informadas"""
+    marcadores_agendamentos = ', '.join('?' for _ in agendamento_ids) or 'NULL'
+    marcadores_ordens = ', '.join('?' for _ in ordem_ids) or 'NULL'
+    cursor = conn.cursor()
+    cursor.execute(
+        SQL_ESCALA.format(filtro=f"a.id IN ({marcadores_agendamentos}) OR a.id IN "
+                                 f"(SELECT agendamento_id FROM ordens_servico WHERE id IN ({marcadores_ordens}))"),
+        tuple(agendamento_ids) + tuple(ordem_ids)
+    )
+    return cursor.fetchall()
+
+
+def atribuir_tecnicos(conn, atribuicoes):
+    """Gravar o técnico de cada agendamento na ordem de serviço em aberto
+
+    Agendamento sem ordem em aberto ganha uma, ainda sem data de início.
+    Não faz commit.
+    """
+    for agendamento_id, tecnico in atribuicoes:
+        cursor = conn.execute("""
+            UPDATE ordens_servico SET tecnico = ?
+            WHERE id = (SELECT MAX(id) FROM ordens_servico WHERE agendamento_id = ?)
+              AND data_conclusao IS NULL
+        """, (tecnico, agendamento_id))
+        if cursor.rowcount == 0:
+            conn.execute("INSERT INTO ordens_servico (agendamento_id, tecnico) VALUES (?, ?)",
+                         (agendamento_id, tecnico))
+    return len(atribuicoes)
+
+
+class EscalaTecnicos:
+    """Serviços atribuídos a cada técnico por dia e as janelas livres de cada um
+
+    Para cada (técnico, dia) guarda os serviços em aberto como lista
+    ordenada (inicio, fim, agendamento_id) e a lista complementar de
+    janelas livres (inicio, fim) dentro do expediente. Atribuir ou
+    concluir um serviço só divide ou junta as janelas vizinhas; saber se
+    um técnico está livre é uma busca binária nessas janelas.
+    """
+
+    def __init__(self, tecnicos, duracoes=None, inicio=None, fim=None, abertura=HORARIO_ABERTURA,
+                 fechamento=HORARIO_FECHAMENTO, dias_funcionamento=DIAS_FUNCIONAMENTO):
+        self.tecnicos = sorted(tecnicos)
+        self.duracoes = dict(duracoes or {})
+        self.inicio = inicio
+        self.fim = fim
+        self.abertura = para_minutos(abertura)
+        self.fechamento = para_minutos(fechamento)
+        self.dias_funcionamento = tuple(dias_funcionamento)
+        self._ocupados = {}
+        self._livres = {}
+        # Minutos atribuídos por (técnico, dia), incluindo serviços já concluídos
+        self._carga = {}
+        # agendamento_id -> (tecnico, data, inicio, fim, concluido)
+        self._servicos = {}
+        self._ordens = {}
+        # Dias com serviços sobrepostos ou fora do expediente: janelas recalculadas
+        self._irregulares = set()
+        # Agendamentos sem técnico: agendamento_id -> (data, inicio, fim)
+        self.pendentes = {}
+        self.conflitos = []
+
+    @classmethod
+    def carregar(cls, conn, inicio, fim, **opcoes):
+        """Montar a escala dos agendamentos entre duas datas"""
+        return cls.montar(*ocupacao_tecnicos(conn, inicio, fim), inicio, fim, **opcoes)
+
+    @classmethod
+    def montar(cls, tecnicos, duracoes, linhas, inicio, fim, **opcoes):
+        """Montar a escala a partir do resultado de ocupacao_tecnicos()"""
+        escala = cls(tecnicos, duracoes, inicio, fim, **opcoes)
+        for linha in linhas:
+            escala.atualizar(linha[0], tuple(linha[1:]))
+        return escala
+
+    def duracao(self, servico_id):
+        """Duração estimada de um serviço em minutos"""
+        return self.duracoes.get(servico_id) or DURACAO_PADRAO_MIN
+
+    def capacidade(self, data):
+        """Minutos de expediente de um técnico no dia"""
+        if date.fromisoformat(data).weekday() not in self.dias_funcionamento:
+            return 0
+        return self.fechamento - self.abertura
+
+    # Janelas livres
+
+    def _janelas(self, chave):
+        janelas = self._livres.get(chave)
+        if janelas is None:
+            janelas = self._livres[chave] = [(self.abertura, self.fechamento)] if self.capacidade(chave[1]) else []
+        return janelas
+
+    def _janela_de(self, janelas, inicio, fim):
+        """Índice da janela que contém [inicio, fim), ou None"""
+        i = bisect_right(janelas, (inicio, float('inf'))) - 1
+        if i >= 0 and janelas[i][1] >= fim:
+            return i
+        return None
+
+    def _recalcular(self, chave):
+        """Refazer as janelas livres de um dia a partir dos serviços em aberto"""
+        janelas = []
+        livre_desde = self.abertura
+        if self.capacidade(chave[1]):
+            for inicio, fim, _ in self._ocupados.get(chave, []) + [(self.fechamento, self.fechamento, None)]:
+                inicio = min(inicio, self.fechamento)
+                if inicio > livre_desde:
+                    janelas.append((livre_desde, inicio))
+                livre_desde = max(livre_desde, fim)
+        self._livres[chave] = janelas
+
+    def _ocupar_janela(self, chave, inicio, fim):
+        janelas = self._janelas(chave)
+        i = self._janela_de(janelas, inicio, fim)
+        if i is None:
+            return False
+        janela_inicio, janela_fim = janelas[i]
+        janelas[i:i + 1] = [(a, b) for a, b in ((janela_inicio, inicio), (fim, janela_fim)) if b > a]
+        return True
+
+    def _liberar_janela(self, chave, inicio, fim):
+        if chave in self._irregulares:
+            self._recalcular(chave)
+            return
+        janelas = self._janelas(chave)
+        i = bisect_left(janelas, (inicio,))
+        if i > 0 and janelas[i - 1][1] >= inicio:
+            i -= 1
+            inicio = janelas[i][0]
+            del janelas[i]
+        if i < len(janelas) and janelas[i][0] <= fim:
+            fim = janelas[i][1]
+            del janelas[i]
+        janelas.insert(i, (inicio, fim))
+
+    # Serviços
+
+    def ocupar(self, agendamento_id, tecnico, data, horario, duracao, concluido=False):
+        """Atribuir um serviço a um técnico (já verificado ou vindo do banco)"""
+        inicio = para_minutos(horario)
+        fim = inicio + duracao
+        chave = (tecnico, data)
+        if tecnico not in self.tecnicos:
+            insort(self.tecnicos, tecnico)
+        self.pendentes.pop(agendamento_id, None)
+        self._servicos[agendamento_id] = (tecnico, data, inicio, fim, concluido)
+        self._carga[chave] = self._carga.get(chave, 0) + duracao
+        if concluido:
+            return
+        insort(self._ocupados.setdefault(chave, []), (inicio, fim, agendamento_id))
+        if not self._ocupar_janela(chave, inicio, fim):
+            self.conflitos.append(agendamento_id)
+            self._irregulares.add(chave)
+            self._recalcular(chave)
+
+    def _desocupar(self, agendamento_id, tecnico, data, inicio, fim):
+        chave = (tecnico, data)
+        ocupados = self._ocupados[chave]
+        del ocupados[bisect_left(ocupados, (inicio, fim, agendamento_id))]
+        self._liberar_janela(chave, inicio, fim)
+
+    def concluir(self, agendamento_id):
+        """Serviço terminado: o técnico fica livre, a carga do dia continua contada"""
+        servico = self._servicos.get(agendamento_id)
+        if servico is None or servico[4]:
+            return
+        tecnico, data, inicio, fim, _ = servico
+        self._desocupar(agendamento_id, tecnico, data, inicio, fim)
+        self._servicos[agendamento_id] = (tecnico, data, inicio, fim, True)
+
+    def liberar(self, agendamento_id):
+        """Tirar um agendamento da escala (cancelado, remarcado ou sem técnico)"""
+        self.pendentes.pop(agendamento_id, None)
+        servico = self._servicos.pop(agendamento_id, None)
+        if servico is None:
+            return
+        tecnico, data, inicio, fim, concluido = servico
+        self._carga[(tecnico, data)] -= fim - inicio
+        if not concluido:
+            self._desocupar(agendamento_id, tecnico, data, inicio, fim)
+
+    def atualizar(self, agendamento_id, linha):
+        """Refletir um agendamento ou a sua ordem de serviço alterados
+
+        `linha` é (data, horario, servico_id, status, ordem_id, tecnico,
+        data_conclusao), ou None se o agendamento foi excluído.
+        """
+        self.liberar(agendamento_id)
+        if linha is None:
+            return
+        data, horario, servico_id, status, ordem_id, tecnico, data_conclusao = linha
+        if ordem_id is not None:
+            self._ordens[ordem_id] = agendamento_id
+        if data is None or horario is None or status in STATUS_LIVRES:
+            return
+        if (self.inicio and data < self.inicio) or (self.fim and data > self.fim):
+            return
+        duracao = self.duracao(servico_id)
+        concluido = data_conclusao is not None or status == STATUS_CONCLUIDO
+        if tecnico:
+            self.ocupar(agendamento_id, tecnico, data, horario, duracao, concluido)
+        elif not concluido:
+            inicio = para_minutos(horario)
+            self.pendentes[agendamento_id] = (data, inicio, inicio + duracao)
+
+    def agendamento_da_ordem(self, ordem_id):
+        """Agendamento de uma ordem de serviço já vista pela escala"""
+        return self._ordens.get(ordem_id)
+
+    # Consultas
+
+    def esta_livre(self, tecnico, data, horario, duracao):
+        inicio = para_minutos(horario)
+        return self._janela_de(self._janelas((tecnico, data)), inicio, inicio + duracao) is not None
+
+    def livres(self, data, horario, duracao):
+        """Técnicos livres no horário, os menos carregados no dia primeiro"""
+        return sorted((tecnico for tecnico in self.tecnicos if self.esta_livre(tecnico, data, horario, duracao)),
+                      key=lambda tecnico: self._carga.get((tecnico, data), 0))
+
+    def janelas_livres(self, tecnico, data):
+        """Janelas livres de um técnico no dia como ('HH:MM', 'HH:MM')"""
+        return [(para_horario(inicio), para_horario(fim)) for inicio, fim in self._janelas((tecnico, data))]
+
+    def carga(self, inicio, fim=None):
+        """{tecnico: [minutos por dia]} de `inicio` a `fim` (inclusive)"""
+        primeiro = date.fromisoformat(inicio)
+        dias = [(primeiro + timedelta(days=i)).isoformat()
+                for i in range(((date.fromisoformat(fim) - primeiro).days if fim else 0) + 1)]
+        return {tecnico: [self._carga.get((tecnico, dia), 0) for dia in dias] for tecnico in self.tecnicos}
+
+    # Atribuição
+
+    def atribuir(self, agendamento_id, data, horario, duracao):
+        """Dar o serviço ao técnico livre menos carregado no dia; retorna o técnico ou None"""
+        livres = self.livres(data, horario, duracao)
+        if not livres:
+            return None
+        self.liberar(agendamento_id)
+        self.ocupar(agendamento_id, livres[0], data, horario, duracao)
+        return livres[0]
+
+    def distribuir(self):
+        """Atribuir os pendentes equilibrando a carga; retorna {agendamento_id: tecnico}
+
+        Por dia, os serviços mais longos saem primeiro e cada um vai para o
+        técnico de menor carga que estiver livre (fila de prioridade pela
+        carga). Os que não cabem em ninguém continuam pendentes.
+        """
+        por_dia = {}
+        for agendamento_id, (data, inicio, fim) in self.pendentes.items():
+            por_dia.setdefault(data, []).append((inicio - fim, inicio, agendamento_id))
+
+        atribuicoes = {}
+        for data, servicos in sorted(por_dia.items()):
+            fila = [(self._carga.get((tecnico, data), 0), tecnico) for tecnico in self.tecnicos]
+            heapq.heapify(fila)
+            for duracao_negativa, inicio, agendamento_id in sorted(servicos):
+                ocupados = []
+                while fila:
+                    carga, tecnico = heapq.heappop(fila)
+                    if self._janela_de(self._janelas((tecnico, data)), inicio, inicio - duracao_negativa) is None:
+                        ocupados.append((carga, tecnico))
+                        continue
+                    self.ocupar(agendamento_id, tecnico, data, para_horario(inicio), -duracao_negativa)
+                    atribuicoes[agendamento_id] = tecnico
+                    ocupados.append((carga - duracao_negativa, tecnico))
+                    break
+                for item in ocupados:
+                    heapq.heappush(fila, item)
+        return atribuicoes
@@ -0,0 +1,703 @@
+"""Núcleo do sistema sem Tk: agenda, servidor, escala, ordens de serviço, importação, registros,
+consultas, duplicados, relatórios, registro de alterações, arquivamento
+lembretes e catálogo de SQL"""
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from acesso_remoto import BackendRemoto, ErroServidor
+from agenda import Agenda, ConflitoAgendamento, verificar_horario
+from banco import conectar, preparar_banco
+from catalogo_sql import CUSTO_FOLGA, CatalogoSQL, comparar, plano, varreduras
+from config import NUMERO_BOXES
+from duplicados import (chaves_cliente, jaro_winkler, marcar_distintos, mesclar_clientes, normalizar,
+                         possiveis_duplicados, pontuar, sincronizar_chaves)
+from importacao import Importador
+from lembretes import (MAX_TENTATIVAS, enfileirar_lembretes, marcar_faltas, registrar_envios, reservar_lote,
+                       situacao_fila)
+from manutencao import anexar_arquivo, arquivar
+from notificacoes import (BarramentoAlteracoes, SondaAlteracoes, alteracoes_desde, podar_alteracoes,
+                          ultima_sequencia)
+from nucleo import gravar, preparar_cliente
+from operacoes import LEITURA, OPERACOES, BackendLocal
+from ordens import (EstoqueInsuficiente, OrdemConcluida, abrir_ordem, adicionar_peca, alterar_quantidade,
+                    cadastrar_peca, concluir_ordem, ler_ordem, remover_item)
+from relatorios import atualizar_agregados, gerar_relatorio
+from servidor import LINHAS_POR_BLOCO, ServidorOficina
+from tecnicos import EscalaTecnicos
+from unidade_trabalho import CommitEmGrupo, UnidadeTrabalho, gravar as gravar_unidade
+from veiculos import RegistroVeiculos, completar_resumos
+
+# Segunda-feira
+DIA = '2026-10-19'
+
+
+def _agenda(boxes=1):
+    return Agenda(boxes=boxes, abertura='08:00', fechamento='12:00', passo=30, dias_funcionamento=range(7))
+
+
+def test_reservar_recusa_conflito_no_mesmo_box():
+    agenda = _agenda()
+    assert agenda.reservar(1, DIA, '09:00', 60) == 0
+    with pytest.raises(ConflitoAgendamento):
+        agenda.reservar(2, DIA, '09:30', 30)
+    # Encostado no fim do anterior não é conflito
+    assert agenda.reservar(3, DIA, '10:00', 30) == 0
+
+
+def test_reservar_usa_o_proximo_box_livre():
+    agenda = _agenda(boxes=2)
+    assert agenda.reservar(1, DIA, '09:00', 60) == 0
+    assert agenda.reservar(2, DIA, '09:30', 60) == 1
+    with pytest.raises(ConflitoAgendamento):
+        agenda.reservar(3, DIA, '09:45', 15)
+
+
+def test_reservar_fora_do_expediente():
+    agenda = _agenda()
+    with pytest.raises(ConflitoAgendamento):
+        agenda.reservar(1, DIA, '11:30', 60)
+    with pytest.raises(ConflitoAgendamento):
+        agenda.reservar(2, DIA, '07:30', 30)
+
+
+def test_renomear_reserva_provisoria():
+    agenda = _agenda()
+    agenda.reservar(-1, DIA, '09:00', 60)
+    agenda.renomear(-1, 10, DIA, '09:00', 60)
+    assert agenda.horarios_livres(DIA, 60) == ['08:00', '10:00', '10:30', '11:00']
+    agenda.liberar(10)
+    assert '09:00' in agenda.horarios_livres(DIA, 60)
+
+    # Agenda recarregada enquanto gravava: sem a provisória, reserva o id gravado
+    recarregada = _agenda()
+    recarregada.renomear(-2, 11, DIA, '09:00', 60)
+    assert '09:00' not in recarregada.horarios_livres(DIA, 60)
+    # Se a carga já trouxe o id gravado, nada muda
+    recarregada.renomear(-2, 11, DIA, '09:00', 60)
+    assert recarregada.conflitos == []
+
+
+def test_horarios_livres_em_volta_das_reservas():
+    agenda = _agenda()
+    agenda.reservar(1, DIA, '09:00', 60)
+    assert agenda.horarios_livres(DIA, 60) == ['08:00', '10:00', '10:30', '11:00']
+    assert agenda.horarios_livres(DIA, 60, a_partir_minuto=10 * 60 + 10) == ['10:30', '11:00']
+
+    agenda.liberar(1)
+    assert agenda.horarios_livres(DIA, 60) == ['08:00', '08:30', '09:00', '09:30', '10:00', '10:30', '11:00']
+
+
+def test_horarios_livres_em_dia_sem_funcionamento():
+    agenda = Agenda(dias_funcionamento=(0, 1, 2, 3, 4))
+    assert agenda.horarios_livres('2026-10-18', 30) == []
+
+
+@pytest.fixture
+def remoto(tmp_path):
+    """Servidor em porta livre de localhost e um cliente falando com ele"""
+    servidor = ServidorOficina(str(tmp_path / 'oficina.db'), '127.0.0.1', 0).iniciar()
+    backend = BackendRemoto(servidor.endereco)
+    yield backend
+    backend.fechar()
+    servidor.encerrar()
+
+
+def test_servidor_salva_e_pesquisa_cliente(remoto):
+    registro, dados = preparar_cliente(None, 'Marta Quintanilha', '(11) 98888-7777', 'marta@exemplo.com.br')
+    cliente = gravar(remoto, remoto.salvar_cliente, registro, dados)
+    assert cliente.id
+
+    linhas, ha_mais = remoto.pesquisar_clientes('quintan')
+    assert [(c.id, c.nome) for c in linhas] == [(cliente.id, 'Marta Quintanilha')]
+    assert not ha_mais
+    # Mesmo registro do mapa de identidade do cliente
+    assert remoto.ler_cliente(cliente.id) is linhas[0]
+
+    remoto.limpar_caches()
+    assert remoto.ler_cliente(cliente.id).telefone == '(11) 98888-7777'
+
+
+def test_servidor_executa_lote_em_uma_requisicao(remoto):
+    requisicoes = []
+    enviar = remoto._enviar
+    remoto._enviar = lambda chamadas: requisicoes.append(chamadas) or enviar(chamadas)
+
+    servicos, resumo = remoto.lote(('listar_servicos', ()), ('ler_resumo', ()), cache=False)
+    assert servicos and resumo is not None
+    primeiro, segundo = remoto.lote(
+        ('inserir_registro', ('clientes', {'nome': 'Ana', 'data_cadastro': '2026-10-19'})),
+        ('inserir_registro', ('clientes', {'nome': 'Bia', 'data_cadastro': '2026-10-19'})),
+        cache=False,
+    )
+    assert segundo == primeiro + 1
+    assert len(requisicoes) == 2
+
+    # Lote com gravação é uma unidade: a operação inválida desfaz o cadastro
+    with pytest.raises(ErroServidor):
+        remoto.lote(
+            ('inserir_registro', ('clientes', {'nome': 'Caio', 'data_cadastro': '2026-10-19'})),
+            ('apagar_cliente', ('não é um id', 'sobra')),
+            cache=False,
+        )
+    assert remoto.pesquisar_clientes('caio') == ([], False)
+
+
+
+def test_servidor_exporta_relatorio_em_partes(remoto, tmp_path):
+    conn = conectar(str(tmp_path / 'oficina.db'))
+    # Mais linhas que um bloco da resposta, com faturamentos repetidos
+    conn.executemany("INSERT INTO rel_faturamento_cliente (mes, cliente_id, ordens, faturamento) VALUES (?, ?, 1, ?)",
+                     [('2026-10', cliente_id, cliente_id % 7) for cliente_id in range(1, LINHAS_POR_BLOCO * 2 + 500)])
+    conn.commit()
+    local = tmp_path / 'local.csv'
+    gerar_relatorio(conn, 'cliente', str(local))
+    conn.close()
+
+    exportado = tmp_path / 'remoto.csv'
+    assert remoto.exportar_relatorio('cliente', str(exportado)) == LINHAS_POR_BLOCO * 2 + 499
+    assert exportado.read_text(encoding='utf-8') == local.read_text(encoding='utf-8')
+
+
+def test_gravacao_recusa_horario_sem_box_no_banco(remoto):
+    # Cada estação conferiu só a própria agenda: quem confere é a gravação no servidor
+    cliente = gravar(remoto, remoto.salvar_cliente, *preparar_cliente(None, 'Otávio Box'))
+    servico_id = remoto.listar_servicos()[0][0]
+    for _ in range(NUMERO_BOXES):
+        remoto.gravar_agendamento((cliente.id, servico_id, DIA, '09:00', ''))
+    with pytest.raises(ErroServidor) as erro:
+        remoto.gravar_agendamento((cliente.id, servico_id, DIA, '09:00', ''))
+    assert erro.value.tipo == 'ConflitoAgendamento'
+    assert remoto.gravar_agendamento((cliente.id, servico_id, '2026-10-20', '09:00', ''))
+
+
+def test_verificar_horario_conta_so_o_que_se_sobrepoe(conn):
+    servico_id = conn.execute("INSERT INTO servicos (nome, tempo_estimado) VALUES ('Teste', 60)").lastrowid
+    conn.executemany("INSERT INTO agendamentos (servico_id, data_agendamento, horario, status) VALUES (?, ?, ?, ?)",
+                     [(servico_id, DIA, horario, status) for horario, status in (
+                         ('08:00', 'Agendado'), ('08:30', 'Agendado'), ('09:00', 'Agendado'),
+                         ('10:00', 'Agendado'), ('10:00', 'Agendado'), ('10:00', 'Cancelado'))])
+    # Das 08:30 às 09:00 há dois ao mesmo tempo
+    verificar_horario(conn, DIA, '08:15', servico_id, boxes=3)
+    with pytest.raises(ConflitoAgendamento):
+        verificar_horario(conn, DIA, '08:15', servico_id, boxes=2)
+    # Terminar quando o primeiro começa não é sobreposição
+    verificar_horario(conn, DIA, '07:00', servico_id, boxes=1)
+    # O cancelado não ocupa box
+    verificar_horario(conn, DIA, '10:00', servico_id, boxes=3)
+    with pytest.raises(ConflitoAgendamento):
+        verificar_horario(conn, DIA, '10:00', servico_id, boxes=2)
+
+
+# Escala de técnicos
+
+def _escala():
+    return EscalaTecnicos(['Ana', 'Bruno'], abertura='08:00', fechamento='12:00', dias_funcionamento=range(7))
+
+
+def test_escala_divide_e_junta_janelas():
+    escala = _escala()
+    escala.ocupar(1, 'Ana', DIA, '09:00', 60)
+    assert escala.janelas_livres('Ana', DIA) == [('08:00', '09:00'), ('10:00', '12:00')]
+    escala.ocupar(2, 'Ana', DIA, '10:30', 30)
+    assert escala.janelas_livres('Ana', DIA) == [('08:00', '09:00'), ('10:00', '10:30'), ('11:00', '12:00')]
+    assert not escala.esta_livre('Ana', DIA, '09:30', 30)
+    assert escala.livres(DIA, '09:30', 30) == ['Bruno']
+
+    escala.liberar(1)
+    assert escala.janelas_livres('Ana', DIA) == [('08:00', '10:30'), ('11:00', '12:00')]
+    # Concluir libera a janela mas a carga do dia continua contada
+    escala.concluir(2)
+    assert escala.janelas_livres('Ana', DIA) == [('08:00', '12:00')]
+    assert escala.carga(DIA) == {'Ana': [30], 'Bruno': [0]}
+
+
+def test_escala_distribui_pelo_menos_carregado():
+    escala = _escala()
+    escala.ocupar(1, 'Ana', DIA, '08:00', 60)
+    escala.atualizar(2, (DIA, '10:00', None, 'Agendado', None, None, None))
+    escala.atualizar(3, (DIA, '10:00', None, 'Agendado', None, None, None))
+    escala.atualizar(4, (DIA, '08:30', None, 'Agendado', None, None, None))
+    assert set(escala.pendentes) == {2, 3, 4}
+
+    atribuicoes = escala.distribuir()
+    # O das 08:30 só cabe em Bruno; com as cargas empatadas, os das 10:00
+    # ficam um para cada técnico
+    assert atribuicoes == {4: 'Bruno', 2: 'Ana', 3: 'Bruno'}
+    assert escala.pendentes == {}
+    assert escala.carga(DIA) == {'Ana': [120], 'Bruno': [120]}
+
+    escala.atualizar(5, (DIA, '10:00', None, 'Agendado', None, None, None))
+    assert escala.distribuir() == {}
+    assert 5 in escala.pendentes
+
+
+# Ordens de serviço
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = conectar(str(tmp_path / 'oficina.db'))
+    preparar_banco(conn)
+    yield conn
+    conn.close()
+
+
+def _total_e_estoque(conn, ordem_id, peca_id):
+    total = conn.execute("SELECT custo_total FROM ordens_servico WHERE id = ?", (ordem_id,)).fetchone()[0]
+    estoque = conn.execute("SELECT estoque FROM pecas WHERE id = ?", (peca_id,)).fetchone()[0]
+    return total, estoque
+
+
+def test_ordem_acompanha_total_e_estoque(conn):
+    servico_id, preco = conn.execute(
+        "SELECT s.id, p.preco FROM servicos s JOIN precos_servicos p ON p.servico_id = s.id ORDER BY s.id LIMIT 1"
+    ).fetchone()
+    agendamento_id = conn.execute(
+        "INSERT INTO agendamentos (servico_id, data_agendamento, horario) VALUES (?, ?, '09:00')", (servico_id, DIA)
+    ).lastrowid
+    peca_id = cadastrar_peca(conn, 'FO-01', 'Filtro de óleo', 35.5, estoque=10)
+    ordem_id = abrir_ordem(conn, agendamento_id, 'Ana', DIA)
+    assert _total_e_estoque(conn, ordem_id, peca_id) == (preco, 10)
+
+    item_id = adicionar_peca(conn, ordem_id, peca_id, 2)
+    assert _total_e_estoque(conn, ordem_id, peca_id) == (round(preco + 71, 2), 8)
+
+    alterar_quantidade(conn, item_id, 5)
+    assert _total_e_estoque(conn, ordem_id, peca_id) == (round(preco + 177.5, 2), 5)
+    alterar_quantidade(conn, item_id, 1)
+    assert _total_e_estoque(conn, ordem_id, peca_id) == (round(preco + 35.5, 2), 9)
+
+    # Sem estoque nada muda
+    with pytest.raises(EstoqueInsuficiente):
+        alterar_quantidade(conn, item_id, 11)
+    with pytest.raises(EstoqueInsuficiente):
+        adicionar_peca(conn, ordem_id, peca_id, 10)
+    assert _total_e_estoque(conn, ordem_id, peca_id) == (round(preco + 35.5, 2), 9)
+
+    remover_item(conn, item_id)
+    assert _total_e_estoque(conn, ordem_id, peca_id) == (preco, 10)
+    ordem, itens = ler_ordem(conn, ordem_id)
+    assert ordem[5] == sum(quantidade * preco_unitario for *_, quantidade, preco_unitario in itens)
+
+    concluir_ordem(conn, ordem_id, DIA)
+    with pytest.raises(OrdemConcluida):
+        adicionar_peca(conn, ordem_id, peca_id, 1)
+
+
+# Importação
+
+def _jsonl(caminho, registros):
+    caminho.write_text(''.join(json.dumps(registro, ensure_ascii=False) + '\n' for registro in registros),
+                       encoding='utf-8')
+    return str(caminho)
+
+
+def test_importacao_da_ids_novos_e_liga_veiculos_pela_origem(conn, tmp_path):
+    existente = conn.execute("INSERT INTO clientes (nome, data_cadastro) VALUES ('Cliente Antigo', ?)", (DIA,)).lastrowid
+    conn.execute("INSERT INTO veiculos (cliente_id, marca, modelo, placa) VALUES (?, 'Fiat', 'Uno', 'ABC1234')",
+                 (existente,))
+    conn.commit()
+    clientes = _jsonl(tmp_path / 'clientes.jsonl', [
+        {'id': existente, 'nome': 'Ana A'}, {'id': 2, 'nome': 'Bia B'}, {'id': 3, 'nome': ''}, '{quebrado',
+    ])
+    importador = Importador(conn, 'clientes', clientes).importar_tudo()
+    assert (importador.inseridos, importador.ignorados, importador.rejeitados) == (2, 0, 2)
+    nomes = [nome for nome, in conn.execute("SELECT nome FROM clientes ORDER BY id")]
+    assert nomes == ['Cliente Antigo', 'Ana A', 'Bia B']
+
+    # Importar de novo o mesmo arquivo não duplica
+    importador = Importador(conn, 'clientes', clientes).importar_tudo()
+    assert (importador.inseridos, importador.ignorados) == (0, 2)
+
+    veiculos = _jsonl(tmp_path / 'veiculos.jsonl', [
+        {'id': 1, 'cliente_id': 2, 'marca': 'VW', 'modelo': 'Gol', 'placa': 'xyz-9876'},
+        # Mesma placa do veículo já cadastrado, em Mercosul
+        {'id': 2, 'cliente_id': existente, 'marca': 'Fiat', 'modelo': 'Uno', 'placa': 'ABC1C34'},
+        {'id': 3, 'cliente_id': 99, 'marca': 'Ford', 'modelo': 'Ka', 'placa': 'KAA1111'},
+    ])
+    importador = Importador(conn, 'veiculos', veiculos).importar_tudo()
+    assert (importador.inseridos, importador.ignorados, importador.rejeitados) == (1, 1, 1)
+    dono = conn.execute("SELECT c.nome FROM veiculos v JOIN clientes c ON c.id = v.cliente_id WHERE v.placa = 'XYZ9876'")
+    assert dono.fetchone() == ('Bia B',)
+
+
+# Registros compartilhados
+
+def _unidade(*operacoes):
+    unidade = UnidadeTrabalho()
+    for funcao, *args in operacoes:
+        unidade.adicionar(funcao, *args)
+    return unidade
+
+
+def test_registro_so_muda_depois_do_commit(conn):
+    backend = BackendLocal(conn)
+    cliente = gravar(backend, backend.salvar_cliente, *preparar_cliente(None, 'Rosa Antiga'))
+    assert backend.ler_cliente(cliente.id) is cliente
+
+    entregues = []
+    grupo = CommitEmGrupo(conn, lambda pendentes, erro, _: entregues.append(erro))
+    grupo.aplicar('renomear', _unidade((backend.salvar_cliente, *preparar_cliente(cliente, 'Rosa Nova'))))
+    assert cliente.nome == 'Rosa Antiga'
+    # Item de ordem inexistente: a chave estrangeira adiada derruba o commit do grupo
+    grupo.aplicar('item', _unidade((conn.execute, "INSERT INTO itens_ordem (ordem_id, tipo) VALUES (999, 'peca')")))
+    grupo.confirmar()
+    assert isinstance(entregues.pop(), sqlite3.IntegrityError)
+    assert cliente.nome == 'Rosa Antiga'
+    assert backend.ler_cliente(cliente.id) is cliente
+
+    grupo.aplicar('renomear', _unidade((backend.salvar_cliente, *preparar_cliente(cliente, 'Rosa Nova'))))
+    grupo.confirmar()
+    assert entregues.pop() is None
+    assert cliente.nome == 'Rosa Nova'
+    assert conn.execute("SELECT nome FROM clientes WHERE id = ?", (cliente.id,)).fetchone() == ('Rosa Nova',)
+
+
+def test_cadastro_desfeito_na_unidade_nao_recebe_id(conn):
+    backend = BackendLocal(conn)
+    registro, dados = preparar_cliente(None, 'Caio Desfeito')
+
+    def falhar():
+        raise LookupError("falhou depois do cadastro")
+
+    with pytest.raises(LookupError):
+        gravar_unidade(conn, _unidade((backend.salvar_cliente, registro, dados), (falhar,)))
+    assert registro.id is None and registro.nome is None
+    assert conn.execute("SELECT COUNT(*) FROM clientes WHERE nome = 'Caio Desfeito'").fetchone() == (0,)
+
+
+# Consultas de leitura
+
+def test_sugestoes_e_ficha_so_leem_o_banco(conn):
+    assert OPERACOES['possiveis_duplicados'][1] == OPERACOES['ficha_veiculo'][1] == LEITURA
+    sincronizar_chaves(conn)
+    cliente_id = conn.execute("INSERT INTO clientes (nome, telefone, data_cadastro) VALUES ('Helena Prado', ?, ?)",
+                              ('(11) 97777-1234', DIA)).lastrowid
+    conn.execute("INSERT INTO veiculos (cliente_id, marca, modelo, placa) VALUES (?, 'Fiat', 'Uno', 'HEL1234')",
+                 (cliente_id,))
+    conn.commit()
+
+    gravadas = conn.total_changes
+    # Cadastro posterior à sincronização: encontrado pelas chaves calculadas na hora
+    sugestoes = possiveis_duplicados(conn, 'Helena Pardo', '11 97777-1234', '')
+    assert [cliente[0] for _, cliente in sugestoes] == [cliente_id]
+    ficha = RegistroVeiculos(conn, 0).buscar_ficha('hel-1234')
+    assert ficha['resumo'] == {'visitas': 0, 'ultima_visita': None, 'total_gasto': 0}
+    assert conn.total_changes == gravadas and not conn.in_transaction
+
+    # A tarefa de fundo grava o que as consultas calcularam
+    assert sincronizar_chaves(conn) == 1
+    assert completar_resumos(conn) == 1
+    assert conn.execute("SELECT COUNT(*) FROM resumo_veiculos").fetchone() == (1,)
+    assert possiveis_duplicados(conn, 'Helena Pardo', '11 97777-1234', '') == sugestoes
+
+
+# Duplicados
+
+def _cliente(conn, nome, telefone=None, email=None):
+    return conn.execute("INSERT INTO clientes (nome, telefone, email, data_cadastro) VALUES (?, ?, ?, ?)",
+                        (nome, telefone, email, DIA)).lastrowid
+
+
+def test_jaro_winkler_e_pontuacao():
+    assert jaro_winkler('martha', 'marhta') == pytest.approx(0.961, abs=0.001)
+    assert jaro_winkler('dixon', 'dicksonx') == pytest.approx(0.813, abs=0.001)
+    assert jaro_winkler('ana', 'ana') == 1.0
+    assert jaro_winkler('', 'ana') == jaro_winkler('abc', 'xyz') == 0.0
+
+    ana = normalizar('Ana Silva', '(11) 99999-8888', '')
+    assert pontuar(ana, normalizar('ANA  SILVA', '9999-8888', '')) == 1.0
+    # Falta contato de um lado: metade do peso; contatos diferentes: homônimos
+    assert pontuar(ana, normalizar('Ana Silva', '', '')) == 0.8
+    assert pontuar(ana, normalizar('Ana Silva', '(11) 97777-6666', '')) == 0.6
+    assert pontuar(ana, normalizar('Ana Silva', '(11) 97777-6666', ''), limiar=0.7) == 0.0
+
+
+def test_chaves_cliente_juntam_grafias_e_contatos():
+    assert chaves_cliente('Thiago de Souza', '+55 (11) 91234-5678', 'Thiago+oficina@Exemplo.com') == {
+        'nome:tg s', 'tel:12345678', 'email:thiago@exemplo.com'}
+    assert chaves_cliente('Tiago Sousa', '', None) == {'nome:tg s'}
+    # Telefone genérico e e-mail inválido não viram chave
+    assert chaves_cliente('', '0000-0000', 'sem-arroba') == set()
+
+
+def test_sincronizar_chaves_segue_o_registro_de_alteracoes(conn):
+    luiz = _cliente(conn, 'Luiz Souza')
+    conn.commit()
+    assert sincronizar_chaves(conn) == 1
+    assert sincronizar_chaves(conn) == 0
+
+    conn.execute("UPDATE clientes SET telefone = '(11) 91234-5678' WHERE id = ?", (luiz,))
+    conn.commit()
+    assert sincronizar_chaves(conn) == 1
+    chaves = {chave for chave, in conn.execute("SELECT chave FROM clientes_chaves WHERE cliente_id = ?", (luiz,))}
+    assert chaves == {'nome:ls s', 'tel:12345678'}
+
+    # Registro podado além da marca: todas as chaves são recalculadas
+    _cliente(conn, 'Maria Lima')
+    _cliente(conn, 'Mario Lima')
+    conn.commit()
+    podar_alteracoes(conn, manter=1)
+    assert sincronizar_chaves(conn) == 3
+    assert conn.execute("SELECT COUNT(DISTINCT cliente_id) FROM clientes_chaves").fetchone() == (3,)
+
+
+def test_mesclar_clientes_move_veiculos_agendamentos_e_faturamento(conn):
+    manter = _cliente(conn, 'Luiz Souza')
+    remover = _cliente(conn, 'Luis Sousa', '(11) 91234-5678', 'luis@exemplo.com')
+    outro = _cliente(conn, 'Luís Souza')
+    conn.execute("INSERT INTO veiculos (cliente_id, marca, modelo, placa) VALUES (?, 'Fiat', 'Uno', 'LUI1234')",
+                 (remover,))
+    servico_id = conn.execute("SELECT id FROM servicos ORDER BY id LIMIT 1").fetchone()[0]
+    agendamento_id = conn.execute(
+        "INSERT INTO agendamentos (cliente_id, servico_id, data_agendamento, horario) VALUES (?, ?, ?, '09:00')",
+        (remover, servico_id, DIA)).lastrowid
+    concluir_ordem(conn, abrir_ordem(conn, agendamento_id, 'Ana', DIA), DIA)
+    atualizar_agregados(conn)
+    # Faturamento de ordens já arquivadas: só existe no agregado
+    conn.execute("INSERT INTO rel_faturamento_cliente (mes, cliente_id, ordens, faturamento) "
+                 "VALUES ('2020-01', ?, 2, 50)", (remover,))
+    marcar_distintos(conn, remover, outro)
+    faturamento = conn.execute("SELECT SUM(ordens), SUM(faturamento) FROM rel_faturamento_cliente").fetchone()
+    conn.commit()
+
+    assert mesclar_clientes(conn, manter, [remover, manter]) == (1, 1)
+    conn.commit()
+    assert conn.execute("SELECT id, telefone, email FROM clientes WHERE id IN (?, ?) ORDER BY id",
+                        (manter, remover)).fetchall() == [(manter, '(11) 91234-5678', 'luis@exemplo.com')]
+    assert conn.execute("SELECT DISTINCT cliente_id FROM rel_faturamento_cliente").fetchall() == [(manter,)]
+    assert conn.execute("SELECT SUM(ordens), SUM(faturamento) FROM rel_faturamento_cliente").fetchone() == faturamento
+    assert conn.execute("SELECT COUNT(*) FROM clientes_distintos").fetchone() == (0,)
+    with pytest.raises(LookupError):
+        mesclar_clientes(conn, remover, [outro])
+
+
+# Relatórios
+
+def _agregado_por_servico(conn):
+    return conn.execute(
+        "SELECT mes, servico_id, ordens, faturamento FROM rel_faturamento_servico WHERE ordens <> 0 ORDER BY 1, 2"
+    ).fetchall()
+
+
+def _recalculado_por_servico(conn):
+    return conn.execute('''
+        SELECT substr(o.data_conclusao, 1, 7), COALESCE(a.servico_id, 0), COUNT(*), SUM(COALESCE(o.custo_total, 0))
+        FROM ordens_servico o LEFT JOIN agendamentos a ON a.id = o.agendamento_id
+        WHERE o.data_conclusao IS NOT NULL
+        GROUP BY 1, 2 ORDER BY 1, 2
+    ''').fetchall()
+
+
+def test_agregados_incrementais_acompanham_as_ordens(conn):
+    servico_a, servico_b = [row[0] for row in conn.execute("SELECT id FROM servicos ORDER BY id LIMIT 2")]
+    cliente_id = _cliente(conn, 'Rui Relatório')
+    ordens = []
+    for servico_id, dia in ((servico_a, DIA), (servico_a, '2026-09-30'), (servico_b, DIA)):
+        agendamento_id = conn.execute(
+            "INSERT INTO agendamentos (cliente_id, servico_id, data_agendamento, horario) VALUES (?, ?, ?, '09:00')",
+            (cliente_id, servico_id, dia)).lastrowid
+        ordens.append(abrir_ordem(conn, agendamento_id, 'Ana', dia))
+    concluir_ordem(conn, ordens[0], DIA)
+    concluir_ordem(conn, ordens[1], '2026-09-30')
+    conn.commit()
+
+    # Ordens novas entram em lotes pela marca d'água
+    assert atualizar_agregados(conn, tamanho_lote=1) == 3
+    assert atualizar_agregados(conn) == 0
+    assert _agregado_por_servico(conn) == _recalculado_por_servico(conn)
+
+    # Ordens já agregadas são corrigidas pelos triggers, sem nova atualização
+    concluir_ordem(conn, ordens[2], DIA)
+    conn.execute("UPDATE ordens_servico SET custo_total = custo_total + 100 WHERE id = ?", (ordens[0],))
+    conn.execute("UPDATE agendamentos SET servico_id = ? WHERE id = "
+                 "(SELECT agendamento_id FROM ordens_servico WHERE id = ?)", (servico_b, ordens[1]))
+    conn.execute("DELETE FROM itens_ordem WHERE ordem_id = ?", (ordens[2],))
+    conn.execute("DELETE FROM ordens_servico WHERE id = ?", (ordens[2],))
+    conn.commit()
+    assert _agregado_por_servico(conn) == _recalculado_por_servico(conn)
+    total_mes = conn.execute("SELECT SUM(ordens), SUM(faturamento) FROM rel_faturamento_mes").fetchone()
+    assert total_mes == conn.execute("SELECT SUM(ordens), SUM(faturamento) FROM rel_faturamento_servico").fetchone()
+
+
+# Registro de alterações
+
+class _ExecutorImediato:
+    """Executor que roda o pedido na hora, e raiz do Tk que não agenda nada"""
+
+    def enviar(self, funcao, *args, ao_concluir=None, ao_falhar=None, canal=None):
+        ao_concluir(funcao(*args))
+
+    def after(self, intervalo, funcao):
+        return 'agendada'
+
+
+def test_alteracoes_desde_detecta_eventos_podados(conn):
+    inicio = ultima_sequencia(conn)
+    ana = _cliente(conn, 'Ana Alterada')
+    conn.execute("UPDATE clientes SET telefone = '1199998888' WHERE id = ?", (ana,))
+    bia = _cliente(conn, 'Bia Alterada')
+    conn.commit()
+    eventos = alteracoes_desde(conn, inicio)
+    assert [(tabela, registro_id, operacao) for _, tabela, registro_id, operacao in eventos] == [
+        ('clientes', ana, 'I'), ('clientes', ana, 'U'), ('clientes', bia, 'I')]
+    assert alteracoes_desde(conn, eventos[0][0], limite=1) == eventos[1:2]
+
+    podar_alteracoes(conn, manter=1)
+    # Quem já tinha visto até o penúltimo não perdeu nada; quem parou antes perdeu
+    assert alteracoes_desde(conn, eventos[1][0]) == eventos[2:]
+    assert alteracoes_desde(conn, inicio) is None
+
+
+def test_sonda_publica_lotes_e_recarrega_quando_perde_eventos(conn):
+    backend = BackendLocal(conn)
+    barramento = BarramentoAlteracoes()
+    recebidos = []
+    barramento.assinar('clientes', recebidos.append)
+    executor = _ExecutorImediato()
+    sonda = SondaAlteracoes(executor, executor, backend, barramento)
+    sonda.iniciar()
+
+    ana = _cliente(conn, 'Ana Sondada')
+    conn.execute("UPDATE clientes SET nome = 'Ana Sondada Silva' WHERE id = ?", (ana,))
+    conn.commit()
+    sonda._sondar()
+    # Última operação de cada id
+    assert recebidos.pop() == [(ana, 'U')]
+
+    _cliente(conn, 'Bia Sondada')
+    _cliente(conn, 'Caio Sondado')
+    conn.commit()
+    podar_alteracoes(conn, manter=1)
+    sonda._sondar()
+    assert recebidos.pop() is None
+    assert sonda.seq == ultima_sequencia(conn)
+
+
+# Arquivamento
+
+def _faturamento_total(conn):
+    return conn.execute("SELECT SUM(ordens), SUM(faturamento) FROM rel_faturamento_cliente").fetchone()
+
+
+def test_arquivar_move_encerrados_antigos_sem_mudar_os_relatorios(conn):
+    servico_id = conn.execute("SELECT id FROM servicos ORDER BY id LIMIT 1").fetchone()[0]
+    cliente_id = _cliente(conn, 'Ana Arquivo')
+    agendamentos = {}
+    for dia in ('2020-03-02', '2020-03-09', '2020-03-16', DIA):
+        agendamentos[dia] = conn.execute(
+            "INSERT INTO agendamentos (cliente_id, servico_id, data_agendamento, horario) VALUES (?, ?, ?, '09:00')",
+            (cliente_id, servico_id, dia)).lastrowid
+        # O de 16/03/2020 continua em aberto
+        if dia != '2020-03-16':
+            concluir_ordem(conn, abrir_ordem(conn, agendamentos[dia], 'Ana', dia), dia)
+    conn.commit()
+    atualizar_agregados(conn)
+    faturamento = _faturamento_total(conn)
+    assert faturamento[0] == 3
+
+    assert arquivar(conn, idade_dias=365, lote=1) == 1
+    assert arquivar(conn, idade_dias=365, lote=1) == 1
+    assert arquivar(conn, idade_dias=365, lote=1) == 0
+    restantes = [row[0] for row in conn.execute("SELECT data_agendamento FROM agendamentos ORDER BY 1")]
+    assert restantes == ['2020-03-16', DIA]
+    assert conn.execute("SELECT COUNT(*) FROM ordens_servico").fetchone() == (1,)
+    assert _faturamento_total(conn) == faturamento
+
+    with anexar_arquivo(conn) as anexado:
+        assert anexado
+        assert conn.execute("SELECT id FROM arquivo.agendamentos ORDER BY id").fetchall() == [
+            (agendamentos['2020-03-02'],), (agendamentos['2020-03-09'],)]
+        assert conn.execute("SELECT COUNT(*) FROM arquivo.ordens_servico").fetchone() == (2,)
+        assert conn.execute("SELECT COUNT(*) FROM arquivo.itens_ordem").fetchone() == (2,)
+
+
+# Lembretes e faltas
+
+def _agendar(conn, cliente_id, dia, horario, status='Agendado'):
+    return conn.execute(
+        "INSERT INTO agendamentos (cliente_id, data_agendamento, horario, status) VALUES (?, ?, ?, ?)",
+        (cliente_id, dia, horario, status)).lastrowid
+
+
+def _status(conn, agendamento_id):
+    return conn.execute("SELECT status FROM agendamentos WHERE id = ?", (agendamento_id,)).fetchone()[0]
+
+
+def test_marcar_faltas_so_depois_da_tolerancia(conn):
+    cliente_id = _cliente(conn, 'Fábio Falta')
+    antigo = _agendar(conn, cliente_id, '2026-10-01', '10:00')
+    cedo = _agendar(conn, cliente_id, DIA, '08:00')
+    tolerado = _agendar(conn, cliente_id, DIA, '08:50')
+    futuro = _agendar(conn, cliente_id, DIA, '10:00')
+    concluido = _agendar(conn, cliente_id, '2026-10-01', '11:00', 'Concluído')
+    conn.commit()
+
+    agora = datetime(2026, 10, 19, 9, 0)
+    assert marcar_faltas(conn, agora, tolerancia=15, lote=1) == 2
+    assert marcar_faltas(conn, agora, tolerancia=15) == 0
+    assert [_status(conn, agendamento_id) for agendamento_id in (antigo, cedo, tolerado, futuro, concluido)] == [
+        'Não Compareceu', 'Não Compareceu', 'Agendado', 'Agendado', 'Concluído']
+
+
+def test_registrar_envios_tira_entregues_e_reagenda_falhas(conn):
+    cliente_id = _cliente(conn, 'Lia Lembrete', '(11) 95555-4444')
+    _agendar(conn, cliente_id, DIA, '10:00')
+    _agendar(conn, cliente_id, DIA, '11:00')
+    conn.commit()
+
+    agora = datetime(2026, 10, 19, 8, 0)
+    assert enfileirar_lembretes(conn, agora) == 2
+    assert enfileirar_lembretes(conn, agora) == 0
+    entregue, falho = reservar_lote(conn, 10, agora)
+    registrar_envios(conn, [entregue, falho], {falho.chave: 'sem sinal'}, agora)
+    assert situacao_fila(conn) == {'enviado': 1, 'pendente': 1}
+    # A falha espera antes da próxima tentativa
+    assert reservar_lote(conn, 10, agora) == []
+
+    for tentativa in range(1, MAX_TENTATIVAS):
+        momento = agora + timedelta(minutes=20 * tentativa)
+        lote = reservar_lote(conn, 10, momento)
+        assert [(lembrete.chave, lembrete.tentativas) for lembrete in lote] == [(falho.chave, tentativa)]
+        registrar_envios(conn, lote, {falho.chave: 'sem sinal'}, momento)
+    assert situacao_fila(conn) == {'enviado': 1, 'falhou': 1}
+    assert conn.execute("SELECT tentativas, erro FROM lembretes WHERE id = ?", (falho.id,)).fetchone() == (
+        MAX_TENTATIVAS, 'sem sinal')
+
+
+# Catálogo de SQL
+
+def test_comparar_acusa_varreduras_e_custos_novos(conn):
+    catalogo = CatalogoSQL()
+    catalogo.registrar("SELECT id FROM clientes c WHERE lower(c.nome) LIKE ?", ('%ana%',))
+    catalogo.registrar("SELECT id FROM clientes WHERE id = ?", (1,))
+    catalogo.registrar("SELECT id FROM clientes WHERE id = ?", (2,))
+    catalogo.registrar("PRAGMA optimize")
+    instrucoes = {'lower' in instrucao.sql: instrucao for instrucao in catalogo}
+    assert len(catalogo) == 2 and instrucoes[False].chamadas == 2
+    varredura, busca = instrucoes[True].sql, instrucoes[False].sql
+
+    linhas_por_tabela = {'clientes': 5000}
+    atual = {instrucao.sql: {'origem': instrucao.origem, 'custo': 100,
+                             'varreduras': varreduras(instrucao, plano(conn, instrucao), linhas_por_tabela)}
+             for instrucao in instrucoes.values()}
+    # O apelido c é resolvido para a tabela
+    assert atual[varredura]['varreduras'] == ['clientes'] and atual[busca]['varreduras'] == []
+    assert varreduras(instrucoes[True], plano(conn, instrucoes[True]), {'clientes': 10}) == []
+
+    # Sem base, toda varredura de tabela grande é problema
+    assert [(problema['tipo'], problema['sql']) for problema in comparar(atual, {})] == [('varredura', varredura)]
+    base = {varredura: {'varreduras': ['clientes'], 'custo': 100}, busca: {'varreduras': [], 'custo': 100}}
+    assert comparar(atual, base) == []
+
+    # Custo só é regressão acima da tolerância e da folga
+    atual[busca]['custo'] = 100 + CUSTO_FOLGA
+    assert comparar(atual, base) == []
+    atual[busca]['custo'] = 101 + CUSTO_FOLGA
+    assert [(problema['tipo'], problema['base'], problema['atual']) for problema in comparar(atual, base)] == [
+        ('custo', 100, 101 + CUSTO_FOLGA)]
+    base[busca]['custo'] = 10000
+    atual[busca]['custo'] = 14000
+    assert comparar(atual, base) == []
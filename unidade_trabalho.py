@@ -0,0 +1,189 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Tempo máximo que uma gravação aguarda outras para dividir o mesmo commit (ms)
+JANELA_COMMIT_MS = 30
+
+# Unidades de trabalho confirmadas por commit, no máximo
+MAXIMO_POR_COMMIT = 100
+
+# Unidade sendo aplicada em cada thread (para ao_confirmar)
+_atual = threading.local()
+
+
+class Resultado:
+    """Referência ao resultado de uma operação anterior da mesma unidade"""
+
+    __slots__ = ('indice',)
+
+    def __init__(self, indice):
+        self.indice = indice
+
+
+def _resolver(valor, resultados):
+    if isinstance(valor, Resultado):
+        return resultados[valor.indice]
+    if isinstance(valor, tuple):
+        return tuple(_resolver(item, resultados) for item in valor)
+    return valor
+
+
+class UnidadeTrabalho:
+    """Gravações relacionadas aplicadas juntas ou não aplicadas
+
+    As operações não fazem commit: a unidade roda dentro de um savepoint
+    e quem a executa decide quando confirmar. Um argumento (ou item de
+    tupla) pode ser o Resultado de uma operação anterior, como o id do
+    cliente recém-criado usado no cadastro do veículo. O que as operações
+    registram com ao_confirmar() só roda depois do commit (confirmada()).
+    """
+
+    def __init__(self):
+        self.operacoes = []
+        self._ao_confirmar = []
+
+    def adicionar(self, funcao, *args):
+        """Incluir funcao(*args) na unidade; retorna a referência ao seu resultado"""
+        self.operacoes.append((funcao, args))
+        return Resultado(len(self.operacoes) - 1)
+
+    def aplicar(self, conn):
+        """Executar as operações em um savepoint; retorna a lista de resultados"""
+        conn.execute("SAVEPOINT unidade_trabalho")
+        resultados = []
+        anterior = getattr(_atual, 'unidade', None)
+        _atual.unidade = self
+        try:
+            for funcao, args in self.operacoes:
+                resultados.append(funcao(*_resolver(args, resultados)))
+        except BaseException:
+            self._ao_confirmar.clear()
+            conn.execute("ROLLBACK TO unidade_trabalho")
+            conn.execute("RELEASE unidade_trabalho")
+            raise
+        finally:
+            _atual.unidade = anterior
+        conn.execute("RELEASE unidade_trabalho")
+        return resultados
+
+    def confirmada(self):
+        """Rodar o que as operações deixaram para depois do commit"""
+        pendentes, self._ao_confirmar = self._ao_confirmar, []
+        for funcao in pendentes:
+            funcao()
+
+    def desfeita(self):
+        """Commit falhou: esquecer o que ficou para depois dele"""
+        self._ao_confirmar.clear()
+
+
+def ao_confirmar(funcao):
+    """Chamar funcao() depois do commit da unidade em execução nesta thread
+
+    Fora de uma unidade (gravação remota, já confirmada pelo servidor, ou
+    scripts que fazem o próprio commit) chama na hora.
+    """
+    unidade = getattr(_atual, 'unidade', None)
+    if unidade is None:
+        funcao()
+    else:
+        unidade._ao_confirmar.append(funcao)
+
+
+@contextmanager
+def transacao(conn):
+    """Transação explícita; dentro de outra transação apenas participa dela"""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+class CommitEmGrupo:
+    """Unidades de trabalho de vários pedidos confirmadas por um só commit
+
+    A primeira unidade abre a transação; cada uma roda no seu savepoint
+    e, se falhar, só ela é desfeita. O grupo é confirmado quando chega a
+    `maximo` unidades ou quando o dono chama confirmar(): ao vencer o
+    prazo (espera() é o timeout da fila de pedidos) ou antes de um
+    pedido que não entra no grupo. `ao_confirmar(pendentes, erro,
+    duracao_ms)` recebe os pares (pedido, resultados) depois do commit
+    e de UnidadeTrabalho.confirmada() de cada unidade; se o commit
+    falhar, tudo volta atrás e `erro` vale para todos.
+
+    Usado pela thread do executor (executor_db) e pelo escritor do
+    servidor (servidor.py).
+    """
+
+    def __init__(self, conn, ao_confirmar, janela_ms=JANELA_COMMIT_MS, maximo=MAXIMO_POR_COMMIT):
+        self.conn = conn
+        self.ao_confirmar = ao_confirmar
+        self.janela_ms = janela_ms
+        self.maximo = maximo
+        self._pendentes = []
+        self._unidades = []
+        self._prazo = None
+        self._aberta = False
+
+    def espera(self):
+        """Segundos até o prazo do grupo aberto; None sem grupo aberto"""
+        if not self._aberta:
+            return None
+        return max(0.0, self._prazo - time.monotonic())
+
+    def aplicar(self, pedido, unidade):
+        """Aplicar a unidade no grupo; exceção da unidade sobe sem afetar as demais"""
+        if not self._aberta:
+            self._prazo = time.monotonic() + self.janela_ms / 1000
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            self._aberta = True
+        self._pendentes.append((pedido, unidade.aplicar(self.conn)))
+        self._unidades.append(unidade)
+        if len(self._pendentes) >= self.maximo:
+            self.confirmar()
+
+    def confirmar(self):
+        """Commit do grupo aberto e entrega dos resultados"""
+        if not self._aberta:
+            return
+        self._aberta = False
+        pendentes, self._pendentes = self._pendentes, []
+        unidades, self._unidades = self._unidades, []
+        if not pendentes:
+            # Só houve unidades com erro: não deixar a transação aberta
+            self.conn.rollback()
+            return
+        inicio = time.perf_counter()
+        try:
+            self.conn.commit()
+            erro = None
+        except Exception as e:
+            self.conn.rollback()
+            erro = e
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        for unidade in unidades:
+            if erro is None:
+                unidade.confirmada()
+            else:
+                unidade.desfeita()
+        self.ao_confirmar(pendentes, erro, duracao_ms)
+
+
+def gravar(conn, unidade):
+    """Aplicar e confirmar uma unidade de trabalho imediatamente"""
+    try:
+        with transacao(conn):
+            resultados = unidade.aplicar(conn)
+    except BaseException:
+        unidade.desfeita()
+        raise
+    unidade.confirmada()
+    return resultados
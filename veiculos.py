@@ -0,0 +1,342 @@
+import re
+import threading
+from collections import OrderedDict
+
+from estatisticas import STATUS_CONCLUIDO
+
+# Fichas de veículos mantidas em memória
+CAPACIDADE_CACHE = 256
+
+# Atendimentos por página do histórico (a primeira vem junto com a ficha)
+TAMANHO_PAGINA_HISTORICO = 50
+
+# Linhas de resumo_veiculos repostas por commit na tarefa de fundo
+LOTE_RESUMOS = 500
+
+# Colunas de uma linha do histórico: id, data, horário, status, serviço, técnico, valor
+# ({esquema}: 'main' ou 'arquivo', o banco de atendimentos arquivados)
+COLUNAS_HISTORICO = """
+    a.id, a.data_agendamento, a.horario, a.status, s.nome,
+    (SELECT group_concat(DISTINCT tecnico) FROM {esquema}.ordens_servico WHERE agendamento_id = a.id),
+    (SELECT SUM(custo_total) FROM {esquema}.ordens_servico WHERE agendamento_id = a.id)
+"""
+
+PADRAO_ANTIGO = re.compile(r'^[A-Z]{3}[0-9]{4}$')
+PADRAO_MERCOSUL = re.compile(r'^[A-Z]{3}[0-9][A-Z][0-9]{2}$')
+
+# Mesma normalização de chave_placa em SQL: sem separadores, maiúsculas e
+# a letra da 5ª posição do Mercosul (A-J) convertida no dígito do padrão antigo
+_PLACA_LIMPA = "upper(replace(replace(replace(placa, '-', ''), ' ', ''), '.', ''))"
+EXPRESSAO_CHAVE_PLACA = f"""
+    CASE WHEN length({_PLACA_LIMPA}) = 7 AND substr({_PLACA_LIMPA}, 5, 1) BETWEEN 'A' AND 'J'
+         THEN substr({_PLACA_LIMPA}, 1, 4) || (unicode(substr({_PLACA_LIMPA}, 5, 1)) - 65)
+              || substr({_PLACA_LIMPA}, 6)
+         ELSE {_PLACA_LIMPA} END
+"""
+
+
+def limpar_placa(placa):
+    """Placa sem hífen/espaços e em maiúsculas"""
+    return re.sub(r'[-\s.]', '', placa or '').upper()
+
+
+def placa_valida(placa):
+    """Verificar se a placa segue o padrão antigo (ABC1234) ou Mercosul (ABC1D23)"""
+    placa = limpar_placa(placa)
+    return bool(PADRAO_ANTIGO.match(placa) or PADRAO_MERCOSUL.match(placa))
+
+
+def chave_placa(placa):
+    """Chave de busca que trata ABC-1234, abc1234 e ABC1C34 como a mesma placa"""
+    placa = limpar_placa(placa)
+    if len(placa) == 7 and 'A' <= placa[4] <= 'J':
+        placa = placa[:4] + str(ord(placa[4]) - ord('A')) + placa[5:]
+    return placa
+
+
+def criar_indices_veiculos(conn):
+    """Adicionar a chave normalizada da placa e seu índice"""
+    cursor = conn.cursor()
+    colunas = [row[1] for row in cursor.execute("PRAGMA table_xinfo(veiculos)")]
+    if 'placa_chave' not in colunas:
+        cursor.execute(f"ALTER TABLE veiculos ADD COLUMN placa_chave TEXT GENERATED ALWAYS AS ({EXPRESSAO_CHAVE_PLACA}) VIRTUAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_veiculos_placa_chave ON veiculos (placa_chave)")
+    conn.commit()
+
+
+def criar_resumo_veiculos(conn):
+    """Criar o resumo por veículo, o índice do histórico e os triggers de invalidação
+
+    O resumo é calculado na primeira leitura; qualquer gravação que afete
+    os atendimentos de um veículo apaga a linha dele.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resumo_veiculos (
+            veiculo_id INTEGER PRIMARY KEY,
+            visitas INTEGER NOT NULL,
+            ultima_visita DATE,
+            total_gasto REAL NOT NULL
+        )
+    ''')
+
+    # Histórico paginado por (data_agendamento, id); substitui o índice só de veiculo_id
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agendamentos_veiculo_data ON agendamentos (veiculo_id, data_agendamento)")
+    cursor.execute("DROP INDEX IF EXISTS idx_agendamentos_veiculo")
+
+    invalidar_agendamento = "DELETE FROM resumo_veiculos WHERE veiculo_id = {}.veiculo_id;"
+    invalidar_ordem = (
+        "DELETE FROM resumo_veiculos WHERE veiculo_id = "
+        "(SELECT veiculo_id FROM agendamentos WHERE id = {}.agendamento_id);"
+    )
+    triggers = [
+        ("resumo_veiculos_agendamentos_ai", "AFTER INSERT ON agendamentos",
+         invalidar_agendamento.format('new')),
+        ("resumo_veiculos_agendamentos_ad", "AFTER DELETE ON agendamentos",
+         invalidar_agendamento.format('old')),
+        ("resumo_veiculos_agendamentos_au", "AFTER UPDATE OF veiculo_id, data_agendamento, status ON agendamentos",
+         invalidar_agendamento.format('old') + invalidar_agendamento.format('new')),
+        ("resumo_veiculos_ordens_ai", "AFTER INSERT ON ordens_servico",
+         invalidar_ordem.format('new')),
+        ("resumo_veiculos_ordens_ad", "AFTER DELETE ON ordens_servico",
+         invalidar_ordem.format('old')),
+        ("resumo_veiculos_ordens_au", "AFTER UPDATE OF agendamento_id, custo_total ON ordens_servico",
+         invalidar_ordem.format('old') + invalidar_ordem.format('new')),
+        ("resumo_veiculos_ad", "AFTER DELETE ON veiculos",
+         "DELETE FROM resumo_veiculos WHERE veiculo_id = old.id;"),
+    ]
+    for nome, evento, corpo in triggers:
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {evento} BEGIN {corpo} END")
+    cursor.execute("ANALYZE agendamentos")
+    conn.commit()
+
+
+class CacheLRU:
+    """Cache com descarte do item usado há mais tempo, seguro entre threads"""
+
+    def __init__(self, capacidade=CAPACIDADE_CACHE):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def remover_se(self, condicao):
+        """Remover os itens cujo valor satisfaz condicao(valor)"""
+        with self._lock:
+            for chave in [c for c, v in self._itens.items() if condicao(v)]:
+                del self._itens[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+def calcular_resumo(conn, veiculo_id):
+    """(visitas, ultima_visita, total_gasto) pelos atendimentos do veículo"""
+    return conn.execute('''
+        SELECT COALESCE(SUM(a.status = ?), 0),
+               MAX(CASE WHEN a.status = ? THEN a.data_agendamento END),
+               COALESCE(SUM((SELECT SUM(custo_total) FROM ordens_servico WHERE agendamento_id = a.id)), 0)
+        FROM agendamentos a
+        WHERE a.veiculo_id = ?
+    ''', (STATUS_CONCLUIDO, STATUS_CONCLUIDO, veiculo_id)).fetchone()
+
+
+def completar_resumos(conn, lote=LOTE_RESUMOS):
+    """Repor as linhas de resumo_veiculos apagadas pelos triggers
+
+    Tarefa de fundo (manutenção e thread de escrita do servidor): percorre
+    os veículos pela chave, `lote` linhas faltantes por vez, com commit a
+    cada lote. Retorna quantas linhas foram repostas.
+    """
+    cursor = conn.cursor()
+    repostas = 0
+    ultimo_id = 0
+    while True:
+        ids = [row[0] for row in cursor.execute('''
+            SELECT v.id FROM veiculos v
+            WHERE v.id > ? AND NOT EXISTS (SELECT 1 FROM resumo_veiculos r WHERE r.veiculo_id = v.id)
+            ORDER BY v.id
+            LIMIT ?
+        ''', (ultimo_id, lote))]
+        if not ids:
+            break
+        cursor.executemany(
+            "INSERT OR REPLACE INTO resumo_veiculos (veiculo_id, visitas, ultima_visita, total_gasto) VALUES (?, ?, ?, ?)",
+            [(veiculo_id,) + tuple(calcular_resumo(conn, veiculo_id)) for veiculo_id in ids]
+        )
+        conn.commit()
+        repostas += len(ids)
+        ultimo_id = ids[-1]
+    return repostas
+
+
+class RegistroVeiculos:
+    """Consulta de veículos por placa com cache das fichas mais acessadas
+
+    A ficha (veículo, proprietário, resumo e primeira página do histórico)
+    vem de uma única consulta; acessos repetidos à mesma placa não tocam
+    o banco.
+    """
+
+    def __init__(self, conn, capacidade=CAPACIDADE_CACHE):
+        self.conn = conn
+        self.cache = CacheLRU(capacidade)
+
+    def em_cache(self, placa):
+        """Ficha já carregada, sem acessar o banco (pode ser chamada no loop do Tk)"""
+        return self.cache.obter(chave_placa(placa))
+
+    def buscar_ficha(self, placa):
+        """Ficha do veículo pela placa, ou None se não cadastrado"""
+        chave = chave_placa(placa)
+        ficha = self.cache.obter(chave)
+        if ficha is None:
+            ficha = self._consultar_ficha(chave)
+            if ficha is not None:
+                self.cache.guardar(chave, ficha)
+        return ficha
+
+    def _consultar_ficha(self, chave):
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT v.id, v.placa, v.marca, v.modelo, v.ano, v.quilometragem,
+                   c.id, c.nome, c.telefone, c.email,
+                   r.visitas, r.ultima_visita, r.total_gasto,
+                   {COLUNAS_HISTORICO.format(esquema='main')}
+            FROM veiculos v
+            LEFT JOIN clientes c ON c.id = v.cliente_id
+            LEFT JOIN resumo_veiculos r ON r.veiculo_id = v.id
+            LEFT JOIN agendamentos a ON a.id IN (
+                SELECT id FROM agendamentos
+                WHERE veiculo_id = v.id
+                ORDER BY data_agendamento DESC, id DESC
+                LIMIT ?
+            )
+            LEFT JOIN servicos s ON s.id = a.servico_id
+            WHERE v.placa_chave = ?
+            ORDER BY v.id, a.data_agendamento DESC, a.id DESC
+        ''', (TAMANHO_PAGINA_HISTORICO + 1, chave))
+        linhas = cursor.fetchall()
+        if not linhas:
+            return None
+
+        # Placas iguais em formatos diferentes: fica o primeiro cadastro
+        primeira = linhas[0]
+        historico = [linha[13:] for linha in linhas if linha[0] == primeira[0] and linha[13] is not None]
+        if primeira[10] is not None:
+            resumo = {'visitas': primeira[10], 'ultima_visita': primeira[11], 'total_gasto': primeira[12]}
+        else:
+            resumo = self.resumo(primeira[0])
+        return {
+            'veiculo': {
+                'id': primeira[0], 'placa': primeira[1], 'marca': primeira[2],
+                'modelo': primeira[3], 'ano': primeira[4], 'quilometragem': primeira[5],
+            },
+            'cliente': {
+                'id': primeira[6], 'nome': primeira[7], 'telefone': primeira[8], 'email': primeira[9],
+            } if primeira[6] is not None else None,
+            'resumo': resumo,
+            'historico': historico[:TAMANHO_PAGINA_HISTORICO],
+            'ha_mais': len(historico) > TAMANHO_PAGINA_HISTORICO,
+        }
+
+    def resumo(self, veiculo_id):
+        """Visitas concluídas, última visita e total gasto de um veículo
+
+        Lido de resumo_veiculos; se a linha foi invalidada, é calculado
+        pelos atendimentos do próprio veículo sem gravar (quem repõe a
+        linha é completar_resumos, em segundo plano).
+        """
+        linha = self.conn.execute(
+            "SELECT visitas, ultima_visita, total_gasto FROM resumo_veiculos WHERE veiculo_id = ?",
+            (veiculo_id,)
+        ).fetchone()
+        if linha is None:
+            linha = calcular_resumo(self.conn, veiculo_id)
+        return {'visitas': linha[0], 'ultima_visita': linha[1], 'total_gasto': linha[2]}
+
+    def historico(self, veiculo_id, antes=None, limite=TAMANHO_PAGINA_HISTORICO, esquema='main'):
+        """Página do histórico, do mais recente para o mais antigo
+
+        `antes` é a chave (data_agendamento, id) da última linha já exibida.
+        Com esquema='arquivo' lê o banco de arquivados, que deve estar
+        anexado (manutencao.anexar_arquivo). Retorna (linhas, ha_mais).
+        """
+        cursor = self.conn.cursor()
+        if antes is None:
+            filtro, parametros = "", ()
+        else:
+            data, agendamento_id = antes
+            filtro = "AND a.data_agendamento <= ? AND (a.data_agendamento < ? OR a.id < ?)"
+            parametros = (data, data, agendamento_id)
+        cursor.execute(f'''
+            SELECT {COLUNAS_HISTORICO.format(esquema=esquema)}
+            FROM {esquema}.agendamentos a
+            LEFT JOIN main.servicos s ON s.id = a.servico_id
+            WHERE a.veiculo_id = ? {filtro}
+            ORDER BY a.data_agendamento DESC, a.id DESC
+            LIMIT ?
+        ''', (veiculo_id,) + parametros + (limite + 1,))
+        linhas = cursor.fetchall()
+        return linhas[:limite], len(linhas) > limite
+
+    def veiculos_do_cliente(self, cliente_id):
+        """Veículos de um cliente (pelo índice idx_veiculos_cliente)"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT id, placa, marca, modelo, ano, quilometragem
+            FROM veiculos WHERE cliente_id = ? ORDER BY id
+        ''', (cliente_id,))
+        return cursor.fetchall()
+
+    def gravar_veiculo(self, veiculo_id, dados):
+        """Inserir ou atualizar um veículo; retorna o id
+
+        `dados` = (cliente_id, marca, modelo, ano, placa, quilometragem).
+        Não faz commit: deve rodar em uma unidade de trabalho.
+        """
+        cursor = self.conn.cursor()
+        if veiculo_id is None:
+            cursor.execute('''
+                INSERT INTO veiculos (cliente_id, marca, modelo, ano, placa, quilometragem)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', dados)
+            veiculo_id = cursor.lastrowid
+        else:
+            cursor.execute('''
+                UPDATE veiculos SET cliente_id = ?, marca = ?, modelo = ?, ano = ?, placa = ?, quilometragem = ?
+                WHERE id = ?
+            ''', dados + (veiculo_id,))
+        self.invalidar_veiculo(veiculo_id)
+        return veiculo_id
+
+    def invalidar_veiculo(self, veiculo_id):
+        """Descartar do cache a ficha de um veículo alterado"""
+        self.cache.remover_se(lambda ficha: ficha['veiculo']['id'] == veiculo_id)
+
+    def invalidar_cliente(self, cliente_id):
+        """Descartar do cache as fichas de um cliente alterado"""
+        self.cache.remover_se(lambda ficha: ficha['cliente'] is not None and ficha['cliente']['id'] == cliente_id)